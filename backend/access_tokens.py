@@ -0,0 +1,121 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+import uuid
+from collections import namedtuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL = int(os.getenv('ACCESS_TOKEN_TTL', 15 * 60))
+REFRESH_TOKEN_TTL = int(os.getenv('REFRESH_TOKEN_TTL', 30 * 24 * 3600))
+TOKEN_ISSUER = 'finlit'
+
+# Every user route needs a verified bearer token. AUTH_REQUIRED=false is a
+# development opt-out: requests without a token then fall back to the user_id
+# they name, unchecked. Requests with a token are always checked.
+AUTH_REQUIRED = os.getenv('AUTH_REQUIRED', 'true').lower() != 'false'
+
+# Verified caller, attached to flask.g by the auth blueprint's before-request hook
+Principal = namedtuple('Principal', ['user_id', 'email', 'name'])
+
+_HEADER = base64.urlsafe_b64encode(json.dumps({'alg': 'HS256', 'typ': 'JWT'}, separators=(',', ':')).encode()).rstrip(b'=')
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+class TokenSigner:
+    """Compact HS256 JWTs; the keyed HMAC state is built once and copied per token"""
+
+    def __init__(self, secret):
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+    def _sign(self, signing_input):
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, claims):
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+        signing_input = _HEADER + b'.' + payload
+        return (signing_input + b'.' + _b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token, expected_type):
+        try:
+            header, payload, signature = token.encode().split(b'.')
+        except ValueError:
+            raise InvalidToken('Malformed token')
+        if header != _HEADER:
+            raise InvalidToken('Unsupported token header')
+        if not hmac.compare_digest(self._sign(header + b'.' + payload), _b64decode(signature)):
+            raise InvalidToken('Bad signature')
+
+        claims = json.loads(_b64decode(payload))
+        if claims.get('iss') != TOKEN_ISSUER:
+            raise InvalidToken('Wrong token issuer')
+        if claims.get('typ') != expected_type:
+            raise InvalidToken('Wrong token type')
+        if claims.get('exp', 0) < time.time():
+            raise InvalidToken('Token expired')
+        return claims
+
+
+def load_secret():
+    """The token signing key; a per-process random one in development, startup failure when auth is required"""
+    secret = os.getenv('AUTH_TOKEN_SECRET') or os.getenv('FLASK_SECRET_KEY')
+    if secret:
+        return secret
+    if AUTH_REQUIRED:
+        raise RuntimeError('AUTH_TOKEN_SECRET must be set (or AUTH_REQUIRED=false for local development)')
+    log.warning("AUTH_TOKEN_SECRET is not set; tokens are signed with a random key and only valid in this process")
+    return secrets.token_urlsafe(32)
+
+
+signer = TokenSigner(load_secret())
+
+
+def issue_tokens(user_id, email, name, refresh_id=None):
+    """Return a short-lived access token and a long-lived refresh token (jti `refresh_id`) for a user"""
+    now = int(time.time())
+    access_token = signer.encode({
+        'iss': TOKEN_ISSUER, 'typ': 'access', 'sub': user_id,
+        'email': email, 'name': name, 'iat': now, 'exp': now + ACCESS_TOKEN_TTL
+    })
+    refresh_token = signer.encode({
+        'iss': TOKEN_ISSUER, 'typ': 'refresh', 'sub': user_id,
+        'email': email, 'name': name, 'iat': now, 'exp': now + REFRESH_TOKEN_TTL,
+        'jti': refresh_id or uuid.uuid4().hex
+    })
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': ACCESS_TOKEN_TTL
+    }
+
+
+def verify_access_token(token):
+    claims = signer.decode(token, 'access')
+    return Principal(claims['sub'], claims.get('email'), claims.get('name'))
+
+
+def verify_refresh_token(token):
+    return signer.decode(token, 'refresh')
@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Blueprint, request, jsonify, g
+
+from observability import Counter, Gauge
+from quotes import TokenBucket
+
+log = logging.getLogger(__name__)
+
+# In-flight scan cost allowed at once, in "cores" (one image scan keeps about one core busy)
+CPU_BUDGET = float(os.getenv('ADMISSION_CPU_BUDGET', os.cpu_count() or 2))
+# Request threads per process, and how many of them only cheap reads may use
+WORKER_THREADS = int(os.getenv('ADMISSION_WORKER_THREADS', 8))
+READ_RESERVED_THREADS = int(os.getenv('ADMISSION_READ_RESERVED_THREADS', 2))
+# Per-user scan allowance, in image-scan equivalents
+SCAN_RATE_PER_MINUTE = float(os.getenv('SCAN_RATE_PER_MINUTE', 10))
+SCAN_BURST = float(os.getenv('SCAN_BURST', 5))
+MAX_TRACKED_USERS = 10000
+
+# Estimated cost per upload kind, relative to OCR of one photo. Text-layer
+# e-receipts are nearly free; PDFs may still contain scanned pages.
+SCAN_COSTS = {'image': 1.0, 'pdf': 0.25, 'email': 0.05, 'html': 0.05}
+DEFAULT_SCAN_SECONDS = 3.0
+
+ADMISSION_TOTAL = Counter(
+    'admission_decisions_total', 'Scan admission decisions', labelnames=('outcome',)
+)
+ADMISSION_IN_FLIGHT = Gauge('admission_in_flight_cost', 'Estimated CPU cost of admitted, unfinished scans')
+
+
+class Rejected(Exception):
+    """A scan was refused; carries the HTTP status and the seconds to wait before retrying"""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def response(self):
+        response = jsonify({'success': False, 'error': self.reason, 'retry_after': self.retry_after})
+        response.status_code = self.status
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response
+
+
+class Ticket:
+    """One admitted scan; release() exactly once when its work is done"""
+    __slots__ = ('controller', 'key', 'cost', 'holds_thread', 'started', 'released')
+
+    def __init__(self, controller, key, cost, holds_thread):
+        self.controller = controller
+        self.key = key
+        self.cost = cost
+        self.holds_thread = holds_thread
+        # A synchronous scan starts at once; a queued async one when a worker picks it up
+        self.started = time.monotonic() if holds_thread else None
+        self.released = False
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def charge(self, extra):
+        """Add work found after admission (OCR pages inside a document); raises Rejected like admit()"""
+        self.controller._charge(self, extra)
+
+    def release(self):
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Admission control for expensive scan requests.
+
+    Each scan is charged its estimated CPU cost (SCAN_COSTS) against a
+    per-process budget and against the caller's token bucket. When the budget
+    is spent the request is shed with 503; when the caller's bucket is empty
+    it gets 429. Both carry a Retry-After estimate. Synchronous scans also
+    hold a request thread, so at most `worker_threads - read_reserved` run at
+    once and cheap reads always have threads left.
+    """
+
+    def __init__(self, cpu_budget=CPU_BUDGET, worker_threads=WORKER_THREADS, read_reserved=READ_RESERVED_THREADS,
+                 rate_per_minute=SCAN_RATE_PER_MINUTE, burst=SCAN_BURST, max_users=MAX_TRACKED_USERS):
+        self.cpu_budget = cpu_budget
+        self.worker_threads = worker_threads
+        self.read_reserved = read_reserved
+        self.scan_threads = max(1, worker_threads - read_reserved)
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_users = max_users
+
+        self._buckets = OrderedDict()
+        self._in_flight = set()
+        self._in_flight_cost = 0.0
+        self._threads_in_use = 0
+        # Moving average of scan duration per unit of cost, for Retry-After estimates
+        self._seconds_per_cost = DEFAULT_SCAN_SECONDS
+        self._lock = threading.Lock()
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate_per_minute / 60.0, self.burst)
+            # Evicted buckets belong to the least recent callers, whose buckets have refilled by now
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _retry_after(self, now):
+        """Seconds until the in-flight scan closest to finishing is expected to be done"""
+        remaining = [
+            ticket.cost * self._seconds_per_cost - (now - (ticket.started or now)) for ticket in self._in_flight
+        ]
+        return max(1, math.ceil(min(remaining, default=self._seconds_per_cost)))
+
+    def admit(self, key, cost, holds_thread=True):
+        """Return a Ticket, or raise Rejected (503 over capacity, 429 over the caller's rate)"""
+        with self._lock:
+            now = time.monotonic()
+            # A lone scan is always admitted, even if it costs more than the whole budget
+            over_budget = bool(self._in_flight) and self._in_flight_cost + cost > self.cpu_budget
+            if over_budget or (holds_thread and self._threads_in_use >= self.scan_threads):
+                ADMISSION_TOTAL.inc(outcome='shed')
+                log.info("Shedding scan: in-flight cost %.2f of %.2f, %d scan threads busy",
+                         self._in_flight_cost, self.cpu_budget, self._threads_in_use)
+                raise Rejected(503, self._retry_after(now), 'Scanner is at capacity, please retry shortly')
+
+            wait = self._bucket(key).try_acquire(cost)
+            if wait:
+                ADMISSION_TOTAL.inc(outcome='rate_limited')
+                raise Rejected(429, max(1, math.ceil(wait)), 'Too many scans, please slow down')
+
+            ticket = Ticket(self, key, cost, holds_thread)
+            self._in_flight.add(ticket)
+            self._in_flight_cost += cost
+            self._threads_in_use += holds_thread
+            ADMISSION_IN_FLIGHT.set(self._in_flight_cost)
+        ADMISSION_TOTAL.inc(outcome='admitted')
+        return ticket
+
+    def _charge(self, ticket, extra):
+        if extra <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # As in admit(), a scan running alone may exceed the budget
+            if len(self._in_flight) > 1 and self._in_flight_cost + extra > self.cpu_budget:
+                ADMISSION_TOTAL.inc(outcome='shed')
+                raise Rejected(503, self._retry_after(now), 'Scanner is at capacity, please retry shortly')
+
+            # A document bigger than the burst can only ever take a full bucket
+            bucket = self._bucket(ticket.key)
+            wait = bucket.try_acquire(min(extra, max(bucket.capacity - ticket.cost, 0)))
+            if wait:
+                ADMISSION_TOTAL.inc(outcome='rate_limited')
+                raise Rejected(429, max(1, math.ceil(wait)), 'Too many scanned pages, please slow down')
+
+            ticket.cost += extra
+            self._in_flight_cost += extra
+            ADMISSION_IN_FLIGHT.set(self._in_flight_cost)
+
+    def _release(self, ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._in_flight.discard(ticket)
+            self._in_flight_cost = max(0.0, self._in_flight_cost - ticket.cost)
+            self._threads_in_use -= ticket.holds_thread
+            # Queue time is not scan time; a ticket that never started says nothing about scan speed
+            if ticket.cost and ticket.started is not None:
+                elapsed = (time.monotonic() - ticket.started) / ticket.cost
+                self._seconds_per_cost += 0.2 * (elapsed - self._seconds_per_cost)
+            ADMISSION_IN_FLIGHT.set(self._in_flight_cost)
+
+    def state(self):
+        with self._lock:
+            return {
+                'cpu_budget': self.cpu_budget,
+                'in_flight_cost': round(self._in_flight_cost, 2),
+                'in_flight_scans': len(self._in_flight),
+                'scan_threads': {'in_use': self._threads_in_use, 'limit': self.scan_threads},
+                'read_reserved_threads': self.read_reserved,
+                'estimated_scan_seconds': round(self._seconds_per_cost, 2),
+                'rate_limit': {'per_minute': self.rate_per_minute, 'burst': self.burst,
+                               'tracked_users': len(self._buckets)},
+                'decisions': {outcome: ADMISSION_TOTAL.value(outcome=outcome)
+                              for outcome in ('admitted', 'shed', 'rate_limited')}
+            }
+
+
+def caller_key():
+    """Rate-limit key: the verified user; the client address only under AUTH_REQUIRED=false (form user_ids are unverified)"""
+    principal = g.get('principal')
+    if principal:
+        return f'user:{principal.user_id}'
+    return f'ip:{request.remote_addr}'
+
+
+admission = AdmissionController()
+
+admission_bp = Blueprint('admission', __name__)
+
+
+@admission_bp.route('', methods=['GET'])
+def get_admission_state():
+    """CPU budget, in-flight scans and rate-limit counters"""
+    return jsonify({'success': True, 'admission': admission.state()})
@@ -1,28 +1,81 @@
-from flask import Blueprint, request, jsonify, redirect, session, url_for
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-from google_auth_oauthlib.flow import Flow
+from flask import Blueprint, request, jsonify, redirect, session, url_for, g
+from functools import wraps
+from urllib.parse import urlencode
 import os
 from dotenv import load_dotenv
-from database import ReceiptDatabase
-from datetime import datetime, timezone
+from database import get_database
+from google_tokens import GoogleTokenVerifier
+from access_tokens import (issue_tokens, verify_access_token, verify_refresh_token, InvalidToken,
+                           AUTH_REQUIRED, REFRESH_TOKEN_TTL)
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from datetime import datetime, timedelta, timezone
 import json
+import logging
+import uuid
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 auth_bp = Blueprint('auth', __name__)
-db = ReceiptDatabase()
 
 # Google OAuth configuration
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 GOOGLE_REDIRECT_URI = os.getenv('GOOGLE_REDIRECT_URI')
 
-print(f"Google Client ID loaded: {GOOGLE_CLIENT_ID[:50]}..." if GOOGLE_CLIENT_ID else "Google Client ID not found!")
-print(f"Google Client Secret loaded: {'Yes' if GOOGLE_CLIENT_SECRET else 'No'}")
+@auth_bp.record_once
+def log_oauth_config(state):
+    """Report the OAuth configuration once, when the auth routes are mounted"""
+    if GOOGLE_CLIENT_ID:
+        log.info("Google Client ID loaded: %s...", GOOGLE_CLIENT_ID[:50])
+    else:
+        log.warning("Google Client ID not found!")
+    log.info("Google Client Secret loaded: %s", 'Yes' if GOOGLE_CLIENT_SECRET else 'No')
+
+# Shared verifier: pooled HTTP session, cached signing certs and verified tokens.
+# GOOGLE_CERTS_FILE points it at a local cert/JWKS file instead of Google.
+token_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID, certs_file=os.getenv('GOOGLE_CERTS_FILE'))
+
+def load_principal():
+    """Attach the verified caller (or None) to g from the Authorization header (a before_request hook for every role)"""
+    g.principal = None
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    try:
+        g.principal = verify_access_token(header[7:])
+    except (InvalidToken, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid access token: {e}'}), 401
+    return None
+
+def authorize_user(requested_user_id):
+    """Return (user_id, None) for the verified caller, or (None, error response); 401 without a token unless AUTH_REQUIRED=false"""
+    principal = g.get('principal')
+    if principal:
+        if requested_user_id and requested_user_id != principal.user_id:
+            return None, (jsonify({'success': False, 'error': 'Forbidden'}), 403)
+        return principal.user_id, None
+    if AUTH_REQUIRED:
+        return None, (jsonify({'success': False, 'error': 'Authentication required'}), 401)
+    return requested_user_id, None
+
+def user_route(view):
+    """Check a route's <user_id> against the verified caller"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id, error = authorize_user(kwargs.get('user_id'))
+        if error:
+            return error
+        kwargs['user_id'] = user_id
+        return view(*args, **kwargs)
+    return wrapper
 
-# Create OAuth flow
+# Create OAuth flow (oauthlib is only imported by processes that run the redirect flow)
 def create_flow():
+    from google_auth_oauthlib.flow import Flow
+
     return Flow.from_client_config(
         {
             "web": {
@@ -57,7 +110,7 @@ def google_auth():
         })
         
     except Exception as e:
-        print(f"Error initiating Google auth: {e}")
+        log.error("Error initiating Google auth: %s", e)
         return jsonify({
             'success': False,
             'error': 'Failed to initiate Google authentication'
@@ -83,11 +136,7 @@ def google_callback():
         
         # Get user info from ID token
         credentials = flow.credentials
-        id_info = id_token.verify_oauth2_token(
-            credentials.id_token,
-            google_requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
+        id_info = token_verifier.verify(credentials.id_token)
         
         # Extract user information
         user_data = {
@@ -101,17 +150,18 @@ def google_callback():
         # Save or update user in database
         user_id = save_or_update_user(user_data)
         
-        # Store user session
-        session['user_id'] = user_id
-        session['user_email'] = user_data['email']
-        session['user_name'] = user_data['name']
+        # The OAuth state is no longer needed; auth travels in signed tokens
+        session.pop('state', None)
+        tokens = issue_session(user_id, user_data['email'], user_data['name'])
         
-        # Redirect to frontend onboarding page
-        frontend_url = f"http://localhost:5173/onboarding?user_id={user_id}&email={user_data['email']}&name={user_data['name']}"
+        # Redirect to frontend onboarding page (tokens in the fragment never reach a server)
+        query = urlencode({'user_id': user_id, 'email': user_data['email'], 'name': user_data['name']})
+        fragment = urlencode({'access_token': tokens['access_token'], 'refresh_token': tokens['refresh_token']})
+        frontend_url = f"http://localhost:5173/onboarding?{query}#{fragment}"
         return redirect(frontend_url)
         
     except Exception as e:
-        print(f"Error in Google callback: {e}")
+        log.error("Error in Google callback: %s", e)
         # Redirect to frontend with error
         return redirect(f"http://localhost:5173/auth?error=authentication_failed")
 
@@ -126,11 +176,7 @@ def verify_google_token():
             return jsonify({'error': 'Token is required'}), 400
         
         # Verify the token
-        id_info = id_token.verify_oauth2_token(
-            token,
-            google_requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
+        id_info = token_verifier.verify(token)
         
         # Extract user information
         user_data = {
@@ -144,11 +190,10 @@ def verify_google_token():
         # Save or update user in database
         try:
             user_id = save_or_update_user(user_data)
-            print(f"User saved successfully with ID: {user_id}")
+            log.info("User saved successfully with ID: %s", user_id)
         except Exception as db_error:
-            print(f"Database error, using email as user_id: {db_error}")
+            log.warning("Database error, using email as user_id: %s", db_error)
             user_id = user_data['email']  # Fallback to email as ID
-            print(f"Using fallback user_id: {user_id}")
         
         return jsonify({
             'success': True,
@@ -157,84 +202,174 @@ def verify_google_token():
                 'email': user_data['email'],
                 'name': user_data['name'],
                 'picture': user_data['picture']
-            }
+            },
+            **issue_session(user_id, user_data['email'], user_data['name'])
         })
         
     except Exception as e:
-        print(f"Error verifying token: {e}")
-        print(f"Token received: {token[:50]}..." if token else "No token received")
-        print(f"Using Client ID: {GOOGLE_CLIENT_ID[:50]}..." if GOOGLE_CLIENT_ID else "No Client ID")
+        log.warning("Error verifying token: %s", e)
         return jsonify({'error': f'Invalid token: {str(e)}'}), 401
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh_tokens():
+    """Exchange a refresh token for a new access/refresh token pair"""
+    data = request.get_json(silent=True) or {}
+    refresh_token = data.get('refresh_token')
+    if not refresh_token:
+        return jsonify({'error': 'refresh_token is required'}), 400
+    
+    try:
+        claims = verify_refresh_token(refresh_token)
+    except (InvalidToken, ValueError) as e:
+        return jsonify({'error': f'Invalid refresh token: {e}'}), 401
+    
+    # Each refresh token is good for one exchange; the new pair carries a new one
+    if not revoke_refresh_token(claims):
+        return jsonify({'error': 'Invalid refresh token: revoked or already used'}), 401
+    
+    return jsonify({
+        'success': True,
+        **issue_session(claims['sub'], claims.get('email'), claims.get('name'))
+    })
+
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
-    """Logout user"""
+    """Logout user, revoking the refresh token sent in the body (or all of the caller's with "all": true)"""
     session.clear()
+    data = request.get_json(silent=True) or {}
+    if data.get('refresh_token'):
+        try:
+            revoke_refresh_token(verify_refresh_token(data['refresh_token']))
+        except (InvalidToken, ValueError):
+            pass
+    principal = g.get('principal')
+    if principal and data.get('all'):
+        revoke_user_refresh_tokens(principal.user_id)
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
 @auth_bp.route('/me', methods=['GET'])
 def get_current_user():
     """Get current authenticated user"""
-    user_id = session.get('user_id')
-    if not user_id:
+    principal = g.get('principal')
+    if not principal:
         return jsonify({'error': 'Not authenticated'}), 401
     
     return jsonify({
         'success': True,
         'user': {
-            'id': user_id,
-            'email': session.get('user_email'),
-            'name': session.get('user_name')
+            'id': principal.user_id,
+            'email': principal.email,
+            'name': principal.name
         }
     })
 
-def save_or_update_user(user_data):
-    """Save or update user in database"""
+_user_indexes_ready = False
+
+def ensure_user_indexes(users_collection):
+    """Create the unique google_id index once per process"""
+    global _user_indexes_ready
+    if _user_indexes_ready:
+        return
+    try:
+        users_collection.create_index([('google_id', 1)], unique=True)
+        _user_indexes_ready = True
+    except Exception as e:
+        log.warning("User index creation failed: %s", e)
+
+_refresh_indexes_ready = False
+
+def refresh_token_collection():
+    """Live refresh token ids, expired ones removed by a TTL index; None without a database"""
+    global _refresh_indexes_ready
+    db = get_database()
     if db.client is None:
-        raise Exception("Database not connected")
-    
+        return None
+    collection = db.db['refresh_tokens']
+    if not _refresh_indexes_ready:
+        try:
+            collection.create_index([('expires_at', 1)], expireAfterSeconds=0)
+            collection.create_index([('user_id', 1)])
+            _refresh_indexes_ready = True
+        except Exception as e:
+            log.warning("Refresh token index creation failed: %s", e)
+    return collection
+
+def issue_session(user_id, email, name):
+    """Issue a token pair and record its refresh token id, so the refresh token can be revoked"""
+    refresh_id = uuid.uuid4().hex
+    collection = refresh_token_collection()
+    if collection is None:
+        log.warning("Database not connected; the refresh token for %s cannot be recorded and will be refused", user_id)
+    else:
+        try:
+            collection.insert_one({
+                '_id': refresh_id,
+                'user_id': user_id,
+                'expires_at': datetime.now(timezone.utc) + timedelta(seconds=REFRESH_TOKEN_TTL)
+            })
+        except Exception as e:
+            log.warning("Could not record refresh token for %s: %s", user_id, e)
+    return issue_tokens(user_id, email, name, refresh_id)
+
+def revoke_refresh_token(claims):
+    """Remove a verified refresh token's id; False when it was already revoked or used"""
+    collection = refresh_token_collection()
+    if collection is None or not claims.get('jti'):
+        return False
     try:
+        return collection.delete_one({'_id': claims['jti'], 'user_id': claims['sub']}).deleted_count == 1
+    except Exception as e:
+        log.warning("Could not revoke refresh token: %s", e)
+        return False
+
+def revoke_user_refresh_tokens(user_id):
+    """Sign a user out everywhere once their access tokens expire"""
+    collection = refresh_token_collection()
+    if collection is not None:
+        collection.delete_many({'user_id': user_id})
+
+def save_or_update_user(user_data, users_collection=None):
+    """Save or update user in database in a single upsert round trip"""
+    if users_collection is None:
+        db = get_database()
+        if db.client is None:
+            raise Exception("Database not connected")
         users_collection = db.db['users']
-        print(f"Attempting to save/update user: {user_data['email']}")
-        
-        # Check if user exists by Google ID
-        existing_user = users_collection.find_one({'google_id': user_data['google_id']})
-        print(f"Existing user found: {existing_user is not None}")
-        
-        if existing_user:
-            # Update existing user
-            users_collection.update_one(
+    
+    ensure_user_indexes(users_collection)
+    
+    now = datetime.now(timezone.utc)
+    update = {
+        '$set': {
+            'email': user_data['email'],
+            'name': user_data['name'],
+            'picture': user_data['picture'],
+            'verified_email': user_data['verified_email'],
+            'last_login': now,
+            'updated_at': now
+        },
+        '$setOnInsert': {
+            'google_id': user_data['google_id'],
+            'created_at': now,
+            'onboarding_completed': False
+        }
+    }
+    
+    # Two concurrent first logins can both try to insert; the unique index
+    # rejects the loser, whose retry then matches the winner's document
+    for attempt in range(2):
+        try:
+            user = users_collection.find_one_and_update(
                 {'google_id': user_data['google_id']},
-                {
-                    '$set': {
-                        'email': user_data['email'],
-                        'name': user_data['name'],
-                        'picture': user_data['picture'],
-                        'verified_email': user_data['verified_email'],
-                        'last_login': datetime.now(timezone.utc),
-                        'updated_at': datetime.now(timezone.utc)
-                    }
-                }
+                update,
+                projection={'_id': 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
-            return str(existing_user['_id'])
-        else:
-            # Create new user
-            user_doc = {
-                'google_id': user_data['google_id'],
-                'email': user_data['email'],
-                'name': user_data['name'],
-                'picture': user_data['picture'],
-                'verified_email': user_data['verified_email'],
-                'created_at': datetime.now(timezone.utc),
-                'updated_at': datetime.now(timezone.utc),
-                'last_login': datetime.now(timezone.utc),
-                'onboarding_completed': False
-            }
-            
-            result = users_collection.insert_one(user_doc)
-            print(f"New user created with ID: {result.inserted_id}")
-            return str(result.inserted_id)
-            
-    except Exception as e:
-        print(f"Error saving user: {e}")
-        raise e
\ No newline at end of file
+            return str(user['_id'])
+        except DuplicateKeyError:
+            if attempt:
+                raise
+        except Exception as e:
+            log.error("Error saving user: %s", e)
+            raise e
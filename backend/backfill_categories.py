@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Categorise existing receipts in bulk.
+
+Streams receipts without a `category` (or every receipt with --all, e.g.
+after the exemplar table changes) in batches, classifies each batch's
+merchant names with one vectorised call, and writes the results back with
+unordered bulk updates. Catalogue companies keep their catalogue category;
+manually chosen categories are never overwritten.
+
+    python backfill_categories.py
+    python backfill_categories.py --all --batch-size 5000
+    python backfill_categories.py --user 1234567890 --dry-run
+"""
+import argparse
+import os
+import time
+from collections import Counter
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from pymongo import UpdateOne
+
+from categorize import categorize_merchants
+from companies import POPULAR_COMPANIES
+from database import get_database
+
+CATALOGUE_CATEGORIES = {company['name']: company['category'] for company in POPULAR_COMPANIES.values()}
+
+
+def category_updates(receipts):
+    """(receipt _id, $set document) for a batch of receipts"""
+    names = [receipt.get('company_name') or '' for receipt in receipts]
+    for receipt, name, match in zip(receipts, names, categorize_merchants(names)):
+        if name in CATALOGUE_CATEGORIES:
+            yield receipt['_id'], {'category': CATALOGUE_CATEGORIES[name], 'metadata.category_score': 1.0}
+        else:
+            yield receipt['_id'], {
+                'category': match.category,
+                'metadata.category_score': match.score,
+                'metadata.parent_ticker': match.parent_ticker,
+                'metadata.parent_name': match.parent_name
+            }
+
+
+def backfill(db, user_id=None, recategorize=False, batch_size=2000, dry_run=False):
+    """Returns a Counter of categories assigned"""
+    query = {} if recategorize else {'category': {'$exists': False}}
+    # A category the user picked by hand is left alone
+    query['metadata.corrected_category'] = {'$ne': True}
+    if user_id:
+        query['user_id'] = user_id
+    cursor = db.collection.find(query, {'company_name': 1}, batch_size=batch_size)
+
+    assigned = Counter()
+
+    def flush(batch):
+        updates = list(category_updates(batch))
+        assigned.update(fields['category'] for _, fields in updates)
+        if not dry_run:
+            db.collection.bulk_write(
+                [UpdateOne({'_id': receipt_id}, {'$set': fields}) for receipt_id, fields in updates], ordered=False
+            )
+
+    batch = []
+    for receipt in cursor:
+        batch.append(receipt)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return assigned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', help='only categorise this user_id')
+    parser.add_argument('--all', action='store_true', help='re-categorise receipts that already have a category')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--dry-run', action='store_true', help='classify without writing')
+    args = parser.parse_args()
+
+    db = get_database()
+    if not db.client:
+        parser.error('MONGO_URI is not reachable')
+
+    start = time.perf_counter()
+    assigned = backfill(db, user_id=args.user, recategorize=args.all, batch_size=args.batch_size, dry_run=args.dry_run)
+    elapsed = time.perf_counter() - start
+    verb = 'Would categorise' if args.dry_run else 'Categorised'
+    print(f"{verb} {sum(assigned.values())} receipts in {elapsed:.1f}s")
+    for category, count in assigned.most_common():
+        print(f"  {category:<15}{count:>8}")
+
+
+if __name__ == '__main__':
+    main()
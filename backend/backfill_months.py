@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Add purchase_date and month_bucket to receipts saved before they existed.
+
+Monthly trends read the (user_id, month_bucket) index, so receipts without
+a bucket are missing from them until this has run. Receipts without a
+purchase date fall back to their scan date. Safe to re-run: each run only
+touches receipts that still have no bucket.
+
+    python backfill_months.py
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from database import get_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    db = get_database()
+    if not db.client:
+        parser.error('MONGO_URI is not reachable')
+    db.ensure_indexes()
+
+    start = time.perf_counter()
+    count = db.backfill_month_buckets()
+    print(f"Updated {count} receipts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
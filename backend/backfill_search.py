@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Add line items and search trigrams to receipts saved before receipt search existed.
+
+Reads receipts without `search_terms` in batches, parses their line items
+from the stored OCR text and writes both fields back. Safe to re-run: each
+run only touches receipts that are still missing them. --oversized also
+rebuilds receipts indexed with more trigrams than search.MAX_TERMS allows.
+
+    python backfill_search.py
+    python backfill_search.py --oversized
+    python backfill_search.py --user 1234567890 --batch-size 200 --dry-run
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from pymongo import UpdateOne
+
+from database import get_database
+from receipt_scan import find_line_items
+from search import MAX_TERMS, search_terms
+
+
+def backfill(db, user_id=None, batch_size=500, dry_run=False, oversized=False):
+    """Returns the number of receipts updated (or that would be)"""
+    query = {'search_terms': {'$exists': False}}
+    if oversized:
+        query = {'$or': [query, {f'search_terms.{MAX_TERMS}': {'$exists': True}}]}
+    if user_id:
+        query['user_id'] = user_id
+    cursor = db.collection.find(
+        query, {'company_name': 1, 'extracted_text': 1, 'line_items': 1}, batch_size=batch_size
+    )
+
+    updated = 0
+    batch = []
+    for receipt in cursor:
+        text = receipt.get('extracted_text') or ''
+        line_items = receipt.get('line_items') or find_line_items(text)
+        batch.append(UpdateOne({'_id': receipt['_id']}, {'$set': {
+            'line_items': line_items,
+            'search_terms': search_terms(receipt.get('company_name'), line_items, text)
+        }}))
+        if len(batch) >= batch_size:
+            updated += len(batch) if dry_run else db.collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += len(batch) if dry_run else db.collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user', help='only backfill this user_id')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='count receipts without writing')
+    parser.add_argument('--oversized', action='store_true', help='also rebuild receipts with more than MAX_TERMS trigrams')
+    args = parser.parse_args()
+
+    db = get_database()
+    if not db.client:
+        parser.error('MONGO_URI is not reachable')
+    db.ensure_indexes()
+
+    start = time.perf_counter()
+    count = backfill(db, user_id=args.user, batch_size=args.batch_size, dry_run=args.dry_run,
+                     oversized=args.oversized)
+    verb = 'Would update' if args.dry_run else 'Updated'
+    print(f"{verb} {count} receipts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
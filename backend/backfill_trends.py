@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Build the merchant trend sketches from receipts saved before trends existed.
+
+Streams every receipt once, folds each batch into per-cohort deltas and
+merges them into `merchant_trends`, the same way the scan path's flush
+does. Run it with --reset once, before the scan path has recorded
+anything, or receipts scanned since then are counted twice.
+
+    python backfill_trends.py --reset
+    python backfill_trends.py --reset --batch-size 20000
+"""
+import argparse
+import os
+import time
+from datetime import timezone
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from database import get_database
+
+
+def backfill(db, batch_size=10000):
+    """Returns the number of receipts counted"""
+    tracker = db.trends
+    cursor = db.collection.find({}, {
+        'user_id': 1, 'company_name': 1, 'total_amount': 1, 'purchase_date': 1, 'scan_date': 1,
+        'metadata.ticker': 1, 'metadata.parent_ticker': 1
+    }, batch_size=batch_size)
+
+    counted = 0
+    events = []
+
+    def flush():
+        statuses = tracker._statuses({event[0] for event in events})
+        for cohort, delta in tracker.deltas(events, statuses).items():
+            tracker._merge_into(cohort, delta)
+
+    now = time.time()
+    for receipt in cursor:
+        metadata = receipt.get('metadata') or {}
+        when = receipt.get('purchase_date') or receipt.get('scan_date')
+        # Stored datetimes come back naive, in UTC
+        timestamp = min(when.replace(tzinfo=when.tzinfo or timezone.utc).timestamp(), now) if when else now
+        events.append((receipt.get('user_id'), receipt.get('company_name'),
+                       metadata.get('ticker') or metadata.get('parent_ticker'),
+                       max(float(receipt.get('total_amount') or 0), 0.0), timestamp))
+        if len(events) >= batch_size:
+            flush()
+            counted += len(events)
+            events = []
+    if events:
+        flush()
+        counted += len(events)
+    return counted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reset', action='store_true', help='drop the stored trends first')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    args = parser.parse_args()
+
+    db = get_database()
+    if not db.client:
+        parser.error('MONGO_URI is not reachable')
+    if args.reset:
+        db.trends.collection.delete_many({})
+
+    start = time.perf_counter()
+    count = backfill(db, batch_size=args.batch_size)
+    print(f"Counted {count} receipts in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+from datetime import date
+
+import numpy as np
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _to_days(values):
+    """datetimes/dates -> datetime64[D] (via ordinals; much faster than per-item datetime64)"""
+    ordinals = np.fromiter((v.toordinal() for v in values), dtype=np.int64, count=len(values))
+    return (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+def _sample_indices(length, max_points):
+    if length <= max_points:
+        return np.arange(length)
+    return np.unique(np.linspace(0, length - 1, max_points).round().astype(np.int64))
+
+
+def run_backtest(purchases, load_prices, end_date=None, max_points=250):
+    """
+    Value of "investing each purchase in the merchant's stock" over time.
+
+    `purchases` is a list of (ticker, purchase_date, amount) and
+    `load_prices(ticker)` returns (datetime64[D] dates, closes) or None. Each
+    purchase buys shares at the first close on or after its date; share
+    counts are accumulated with cumulative sums over a shared trading-day
+    grid, so the cost is one pass per ticker rather than per receipt.
+    """
+    result = {
+        'summary': {'invested': 0.0, 'value': 0.0, 'gain': 0.0, 'return_pct': 0.0, 'purchases': 0},
+        'tickers': [],
+        'series': [],
+        'missing_prices': [],
+        'pending_purchases': 0
+    }
+    if not purchases:
+        return result
+
+    tickers, purchase_dates, amounts = zip(*purchases)
+    tickers = np.array(tickers)
+    purchase_days = _to_days(purchase_dates)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    end_day = _to_days([end_date])[0] if end_date else None
+
+    symbols, ticker_index = np.unique(tickers, return_inverse=True)
+    series = {}
+    for position, symbol in enumerate(symbols):
+        prices = load_prices(str(symbol))
+        if prices is None or not len(prices[0]):
+            result['missing_prices'].append(str(symbol))
+            continue
+        dates, closes = prices
+        if end_day is not None:
+            keep = dates <= end_day
+            dates, closes = dates[keep], closes[keep]
+        if len(dates):
+            series[position] = (str(symbol), dates, closes)
+        else:
+            result['missing_prices'].append(str(symbol))
+
+    if not series:
+        return result
+
+    # Shared calendar: every trading day any held ticker has a close for
+    grid = np.unique(np.concatenate([dates for _, dates, _ in series.values()]))
+
+    rows = []                      # per-ticker price rows on the grid
+    flat_index, flat_shares, flat_amounts = [], [], []
+    per_ticker = []
+    for row, (position, (symbol, dates, closes)) in enumerate(series.items()):
+        mask = ticker_index == position
+        days, spend = purchase_days[mask], amounts[mask]
+
+        # First close on or after each purchase; later purchases are not priced yet
+        fill = np.searchsorted(dates, days, side='left')
+        priced = fill < len(dates)
+        result['pending_purchases'] += int((~priced).sum())
+        fill, spend = fill[priced], spend[priced]
+        shares = spend / closes[fill]
+
+        flat_index.append(row * len(grid) + np.searchsorted(grid, dates[fill]))
+        flat_shares.append(shares)
+        flat_amounts.append(spend)
+
+        # Forward-fill the ticker's closes onto the grid (0 before its first close: no shares held yet)
+        position = np.searchsorted(dates, grid, side='right') - 1
+        rows.append(np.where(position >= 0, closes[np.maximum(position, 0)], 0.0))
+
+        invested, total_shares = float(spend.sum()), float(shares.sum())
+        value = total_shares * float(closes[-1])
+        per_ticker.append({
+            'ticker': symbol,
+            'purchases': int(len(spend)),
+            'invested': round(invested, 2),
+            'shares': round(total_shares, 6),
+            'last_close': float(closes[-1]),
+            'value': round(value, 2),
+            'return_pct': round((value / invested - 1) * 100, 2) if invested else 0.0
+        })
+
+    size = len(series) * len(grid)
+    flat_index = np.concatenate(flat_index)
+    share_matrix = np.bincount(flat_index, weights=np.concatenate(flat_shares), minlength=size).reshape(len(series), len(grid))
+    invested_by_day = np.bincount(flat_index % len(grid), weights=np.concatenate(flat_amounts), minlength=len(grid))
+
+    values = (np.cumsum(share_matrix, axis=1) * np.vstack(rows)).sum(axis=0)
+    invested = np.cumsum(invested_by_day)
+
+    # Start the timeline at the first priced purchase
+    first = int(np.argmax(invested > 0)) if invested[-1] > 0 else len(grid) - 1
+    grid, values, invested = grid[first:], values[first:], invested[first:]
+    sample = _sample_indices(len(grid), max_points)
+    result['series'] = [
+        {'date': str(day), 'invested': round(float(spent), 2), 'value': round(float(value), 2)}
+        for day, spent, value in zip(grid[sample], invested[sample], values[sample])
+    ]
+
+    total_invested, total_value = float(invested[-1]), float(values[-1])
+    result['summary'] = {
+        'invested': round(total_invested, 2),
+        'value': round(total_value, 2),
+        'gain': round(total_value - total_invested, 2),
+        'return_pct': round((total_value / total_invested - 1) * 100, 2) if total_invested else 0.0,
+        'purchases': int(len(flat_index))
+    }
+    result['tickers'] = sorted(per_ticker, key=lambda t: t['value'], reverse=True)
+    return result
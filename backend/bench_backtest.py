@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Investment backtest benchmark on large purchase histories.
+
+Runs backtest.run_backtest over synthetic receipts (many purchases spread
+across tickers with their own trading calendars) and compares against the
+naive approach of walking the shared calendar day by day and revaluing
+every purchase on each day. Final values from both are cross-checked.
+
+    python bench_backtest.py --purchases 100000 --tickers 50
+    python bench_backtest.py --purchases 5000 --naive-purchases 5000 --years 2
+"""
+import argparse
+import bisect
+import os
+import random
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+
+from backtest import run_backtest
+
+
+def make_prices(args):
+    """{ticker: (datetime64[D] dates, closes)}; each ticker skips its own random ~3% of weekdays"""
+    rng = np.random.default_rng(args.seed)
+    start = np.datetime64('2018-01-01')
+    days = start + np.arange(int(args.years * 365))
+    weekdays = days[np.is_busday(days)]
+    prices = {}
+    for i in range(args.tickers):
+        dates = weekdays[rng.random(len(weekdays)) > 0.03]
+        closes = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(dates))))
+        prices[f'T{i:03d}'] = (dates, closes)
+    return prices
+
+
+def make_purchases(args, count):
+    """(ticker, date, amount); the last few purchases land after the final close"""
+    rng = random.Random(args.seed)
+    first = date(2018, 1, 1)
+    span = int(args.years * 365) + 5
+    tickers = [f'T{i:03d}' for i in range(args.tickers)]
+    return [(rng.choice(tickers), first + timedelta(days=rng.randrange(span)), round(rng.uniform(3, 200), 2))
+            for _ in range(count)]
+
+
+def naive_backtest(purchases, prices):
+    """Fill each purchase by bisection, then revalue every purchase on every calendar day"""
+    calendars = {t: [d.item() for d in dates] for t, (dates, _) in prices.items()}
+    filled = []
+    for ticker, day, amount in purchases:
+        dates = calendars[ticker]
+        i = bisect.bisect_left(dates, day)
+        if i < len(dates):
+            filled.append((ticker, dates[i], amount / prices[ticker][1][i]))
+
+    calendar = sorted({d.item() for dates, _ in prices.values() for d in dates})
+    closes = {t: dict(zip((d.item() for d in dates), closes)) for t, (dates, closes) in prices.items()}
+    last_close = {}
+    value = 0.0
+    for day in calendar:
+        for ticker, by_day in closes.items():
+            if day in by_day:
+                last_close[ticker] = by_day[day]
+        value = sum(shares * last_close[ticker] for ticker, filled_on, shares in filled if filled_on <= day)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--purchases', type=int, default=100_000)
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--years', type=float, default=5.0)
+    parser.add_argument('--naive-purchases', type=int, default=1_000, help='purchases replayed through the naive walk')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    prices = make_prices(args)
+    purchases = make_purchases(args, args.purchases)
+    print(f"{len(purchases)} purchases, {args.tickers} tickers, {args.years:g} years of closes\n")
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        result = run_backtest(purchases, prices.get)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{'method':<14}{'purchases':>11}{'best ms':>10}{'purchases/s':>14}")
+    print(f"{'vectorised':<14}{len(purchases):>11}{best * 1000:>10.1f}{len(purchases) / best:>14.0f}")
+
+    sample = purchases[:args.naive_purchases]
+    start = time.perf_counter()
+    naive_value = naive_backtest(sample, prices)
+    elapsed = time.perf_counter() - start
+    print(f"{'naive walk':<14}{len(sample):>11}{elapsed * 1000:>10.1f}{len(sample) / elapsed:>14.0f}")
+
+    check = run_backtest(sample, prices.get)['summary']['value']
+    print(f"\nFinal value on the first {len(sample)} purchases: vectorised {check:,.2f}, naive {naive_value:,.2f}"
+          f" ({'match' if abs(check - round(naive_value, 2)) < 0.01 else 'MISMATCH'})")
+    print(f"Summary: {result['summary']}, pending purchases: {result['pending_purchases']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Compliance check benchmark on large trade histories.
+
+Replays a synthetic, time-ordered trade stream (many users, years of
+trades) through compliance.ComplianceEngine, evaluating every trade before
+recording it, and compares against the naive approach of rescanning each
+user's history for every check. Decisions from both are cross-checked.
+
+    python bench_compliance.py --users 200 --trades 1000000
+    python bench_compliance.py --users 20 --trades 100000 --naive-trades 20000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+
+from compliance import (ComplianceEngine, market_day, STATUS_RULES, PDT_WINDOW_BUSINESS_DAYS,
+                        FREQUENCY_WINDOW_DAYS)
+from companies import catalogue_tickers
+
+
+def make_trades(args):
+    """Time-ordered (user, symbol, side, quantity, price, timestamp); half the trades hit five popular symbols"""
+    rng = random.Random(args.seed)
+    symbols = catalogue_tickers()
+    start = datetime(2020, 1, 1, 14, 30, tzinfo=timezone.utc)
+    span = args.years * 365 * 24 * 3600
+    offsets = sorted(rng.random() * span for _ in range(args.trades))
+    trades = []
+    for offset in offsets:
+        symbol = rng.choice(symbols[:5]) if rng.random() < 0.5 else rng.choice(symbols)
+        trades.append((
+            f'user-{rng.randrange(args.users)}',
+            symbol,
+            'buy' if rng.random() < 0.55 else 'sell',
+            rng.randint(1, 20),
+            rng.uniform(20, 500),
+            start + timedelta(seconds=offset)
+        ))
+    return trades
+
+
+def naive_decision(rules, history, symbol, side, quantity, price, now):
+    """Rescan the user's whole history, as a client-side check would"""
+    day, business_day = market_day(now)
+    recent_trades = 0
+    day_trades = 0
+    bought_today = False
+    bought_by_day = {}
+    for h_symbol, h_side, h_day, h_business_day in history:
+        if h_day > day - FREQUENCY_WINDOW_DAYS:
+            recent_trades += 1
+        if h_side == 'buy':
+            bought_by_day.setdefault(h_day, set()).add(h_symbol)
+        elif h_symbol in bought_by_day.get(h_day, ()) and h_business_day > business_day - PDT_WINDOW_BUSINESS_DAYS:
+            day_trades += 1
+        if h_day == day and h_side == 'buy' and h_symbol == symbol:
+            bought_today = True
+
+    severities = []
+    if side == 'sell' and bought_today:
+        count = day_trades + 1
+        if count > rules['max_day_trades']:
+            severities.append('block')
+        elif rules['day_trade_warning'] is not None and count >= rules['day_trade_warning']:
+            severities.append('warning')
+    count = recent_trades + 1
+    if rules['weekly_trade_limit'] is not None and count > rules['weekly_trade_limit']:
+        severities.append('block')
+    elif rules['weekly_trade_warning'] is not None and count >= rules['weekly_trade_warning']:
+        severities.append('warning')
+    if rules['large_trade_amount'] is not None and quantity * price > rules['large_trade_amount']:
+        severities.append('warning')
+    return 'block' if 'block' in severities else ('warn' if severities else 'allow')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--trades', type=int, default=500_000)
+    parser.add_argument('--years', type=float, default=3.0)
+    parser.add_argument('--naive-trades', type=int, default=20_000, help='trades replayed through the naive rescan')
+    parser.add_argument('--status', choices=list(STATUS_RULES), default='F-1')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    trades = make_trades(args)
+    # Holding periods depend on ledger lots, not history, so both sides skip them here
+    rules = dict(STATUS_RULES[args.status], min_holding_days=None)
+    engine = ComplianceEngine(rules={args.status: rules}, default_status=args.status)
+    print(f"{len(trades)} trades, {args.users} users, {args.years:g} years, status {args.status}\n")
+
+    latencies = np.empty(len(trades))
+    decisions = []
+    start = time.perf_counter()
+    for i, (user_id, symbol, side, quantity, price, at) in enumerate(trades):
+        t0 = time.perf_counter()
+        decision, _ = engine.evaluate(user_id, symbol, side, quantity, price, now=at)
+        latencies[i] = time.perf_counter() - t0
+        engine.record_fill(user_id, symbol, side, at)
+        decisions.append(decision)
+    elapsed = time.perf_counter() - start
+    us = latencies * 1e6
+    print(f"{'method':<16}{'trades':>10}{'checks/s':>12}{'p50 us':>9}{'p99 us':>9}")
+    print(f"{'rolling window':<16}{len(trades):>10}{len(trades) / elapsed:>12.0f}"
+          f"{np.percentile(us, 50):>9.1f}{np.percentile(us, 99):>9.1f}")
+
+    histories = {}
+    naive_trades = trades[:args.naive_trades]
+    naive_latencies = np.empty(len(naive_trades))
+    mismatches = 0
+    start = time.perf_counter()
+    for i, (user_id, symbol, side, quantity, price, at) in enumerate(naive_trades):
+        history = histories.setdefault(user_id, [])
+        t0 = time.perf_counter()
+        decision = naive_decision(rules, history, symbol, side, quantity, price, at)
+        naive_latencies[i] = time.perf_counter() - t0
+        history.append((symbol, side) + market_day(at))
+        mismatches += decision != decisions[i]
+    elapsed = time.perf_counter() - start
+    us = naive_latencies * 1e6
+    print(f"{'naive rescan':<16}{len(naive_trades):>10}{len(naive_trades) / elapsed:>12.0f}"
+          f"{np.percentile(us, 50):>9.1f}{np.percentile(us, 99):>9.1f}")
+    print(f"\nDecision mismatches on the first {len(naive_trades)} trades: {mismatches}")
+    counts = {d: decisions.count(d) for d in ('allow', 'warn', 'block')}
+    print(f"Decisions: {counts}")
+
+
+if __name__ == '__main__':
+    main()
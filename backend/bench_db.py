@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Workload benchmark for ReceiptDatabase and the dashboard routes.
+
+Seeds a local mongod (or mongomock for functional runs) with synthetic users
+and receipts, then drives the ReceiptDatabase read methods and the Flask
+dashboard routes at a target concurrency. Reports latency percentiles,
+throughput and, against a real mongod, documents/keys examined per query
+taken from explain(executionStats).
+
+    python bench_db.py --backend mongod --uri mongodb://localhost:27017/ --users 50 --receipts 2000
+    python bench_db.py --backend mongomock --users 20 --receipts 200
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+# The routes need bearer tokens; the benchmark signs its own
+os.environ.setdefault('AUTH_TOKEN_SECRET', 'bench-secret')
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+import database
+from database import ReceiptDatabase, month_bucket
+from search import search_terms, parse_query, min_matched
+
+BENCH_DATABASE = 'receipt_scanner_bench'
+MERCHANTS = [
+    ('Starbucks Corporation', 'SBUX', 6.5), ('Target Corporation', 'TGT', 45.0),
+    ('Walmart Inc', 'WMT', 60.0), ('Amazon.com Inc', 'AMZN', 35.0),
+    ('Chipotle Mexican Grill Inc', 'CMG', 13.0), ('Costco Wholesale Corporation', 'COST', 120.0),
+    ('Campus Bookstore', None, 30.0), ('Corner Market', None, 12.0),
+]
+ITEMS = [
+    'SONY HEADPHONES', 'PAPER TOWELS', 'LATTE GRANDE', 'USB-C CABLE', 'ORGANIC BANANAS', 'NOTEBOOK 3PK',
+    'CHICKEN BURRITO', 'DISH SOAP', 'PHONE CASE', 'COLD BREW', 'AA BATTERIES 8PK', 'GREEK YOGURT',
+]
+SEARCH_QUERIES = ['headphones', 'paper towels', 'burrito', 'batteries', 'usb cable', 'yogurt']
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Capture find/aggregate commands so they can be re-run under explain"""
+
+    def __init__(self):
+        self.recording = False
+        self.commands = []
+
+    def started(self, event):
+        if self.recording and event.command_name in ('find', 'aggregate'):
+            command = {k: v for k, v in event.command.items() if k not in ('lsid', '$db', '$clusterTime', '$readPreference')}
+            self.commands.append(command)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def receipts_per_user(rng, args):
+    """Sample a receipt count per user from the configured distribution"""
+    if args.distribution == 'uniform':
+        return [args.receipts] * args.users
+    if args.distribution == 'zipf':
+        # A few heavy users, a long tail of light ones
+        weights = 1 / np.arange(1, args.users + 1)
+        counts = np.maximum(1, (weights / weights.sum() * args.receipts * args.users).astype(int))
+        return counts.tolist()
+    counts = np.random.default_rng(args.seed).lognormal(np.log(args.receipts), 0.8, args.users)
+    return np.maximum(1, counts.astype(int)).tolist()
+
+
+def seed(db, args):
+    rng = random.Random(args.seed)
+    db.collection.drop()
+    db._indexes_ready = False
+    db.ensure_indexes()
+
+    now = datetime.now(timezone.utc)
+    counts = receipts_per_user(rng, args)
+    batch = []
+    for user_index, count in enumerate(counts):
+        user_id = f'bench_user_{user_index}'
+        for _ in range(count):
+            company, ticker, mean = rng.choice(MERCHANTS)
+            purchase_date = now - timedelta(days=rng.uniform(0, 365 * args.years))
+            line_items = [{'description': item, 'amount': round(rng.uniform(1, mean), 2)}
+                          for item in rng.sample(ITEMS, rng.randint(1, 5))]
+            extracted_text = '\n'.join([company.upper()] + [f"{i['description']} {i['amount']:.2f}" for i in line_items]
+                                       + [f'TOTAL ${mean:.2f}'])
+            batch.append({
+                'user_id': user_id,
+                'company_name': company,
+                'total_amount': round(rng.expovariate(1 / mean), 2),
+                'confidence': rng.choice(['high', 'high', 'medium', 'low']),
+                'extracted_text': extracted_text,
+                'line_items': line_items,
+                'search_terms': search_terms(company, line_items, extracted_text),
+                'scan_date': purchase_date,
+                'purchase_date': purchase_date,
+                'month_bucket': month_bucket(purchase_date),
+                'metadata': {'ticker': ticker},
+                'created_at': purchase_date,
+                'updated_at': purchase_date,
+            })
+            if len(batch) >= 5000:
+                db.collection.insert_many(batch)
+                batch = []
+    if batch:
+        db.collection.insert_many(batch)
+    return counts
+
+
+def docs_examined(stats):
+    """Largest totalDocsExamined/totalKeysExamined found anywhere in an explain document"""
+    found = {'docs': 0, 'keys': 0}
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'totalDocsExamined' in node:
+                found['docs'] = max(found['docs'], node['totalDocsExamined'])
+            if 'totalKeysExamined' in node:
+                found['keys'] = max(found['keys'], node['totalKeysExamined'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(stats)
+    return found
+
+
+def explain_operations(db, recorder, operations, user_id):
+    print(f"\n{'operation':<24}{'docs examined':>15}{'keys examined':>15}")
+    for name, func in operations:
+        recorder.commands = []
+        recorder.recording = True
+        func(user_id)
+        recorder.recording = False
+        for command in recorder.commands:
+            try:
+                plan = db.db.command({'explain': command, 'verbosity': 'executionStats'})
+                examined = docs_examined(plan)
+                print(f"{name:<24}{examined['docs']:>15}{examined['keys']:>15}")
+            except Exception as e:
+                print(f"{name:<24}{'explain failed: ' + str(e)[:40]:>30}")
+
+
+def search(db, user_id, query):
+    words, terms = parse_query(query)
+    return db.search_receipts(user_id, terms, min_matched(terms), {'company_name': 1, 'total_amount': 1}, limit=20)
+
+
+def drive(label, func, user_ids, args):
+    """Call func(user_id) args.requests times at args.concurrency and report latency"""
+    rng = random.Random(args.seed)
+    targets = [rng.choice(user_ids) for _ in range(args.requests)]
+
+    def timed_call(user_id):
+        t0 = time.perf_counter()
+        func(user_id)
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(timed_call, targets))
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    print(f"{label:<40}{len(latencies) / elapsed:>10.1f}{np.percentile(ms, 50):>9.2f}"
+          f"{np.percentile(ms, 95):>9.2f}{np.percentile(ms, 99):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mongod', 'mongomock'], default='mongod')
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--receipts', type=int, default=500, help='mean receipts per user')
+    parser.add_argument('--distribution', choices=['uniform', 'lognormal', 'zipf'], default='lognormal')
+    parser.add_argument('--years', type=float, default=3.0, help='history length')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per operation')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the existing bench database')
+    args = parser.parse_args()
+
+    recorder = CommandRecorder()
+    if args.backend == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(args.uri, event_listeners=[recorder], maxPoolSize=max(args.concurrency * 2, 10))
+    db = ReceiptDatabase(client=client, database_name=BENCH_DATABASE)
+    # Anything that calls get_database(), the Flask routes included, uses the benchmark database
+    database._shared_database = db
+
+    if not args.skip_seed:
+        t0 = time.perf_counter()
+        counts = seed(db, args)
+        print(f"Seeded {sum(counts)} receipts for {len(counts)} users "
+              f"(max {max(counts)}/user) in {time.perf_counter() - t0:.1f}s")
+    user_ids = db.collection.distinct('user_id')
+    heaviest = max(user_ids, key=lambda u: db.collection.count_documents({'user_id': u}))
+
+    operations = [
+        ('get_user_receipts', lambda u: db.get_user_receipts(u, limit=20)),
+        ('get_user_stats', db.get_user_stats),
+        ('get_company_breakdown', db.get_company_breakdown),
+        ('get_monthly_spending', lambda u: db.get_monthly_spending(u, months=12)),
+        ('search_receipts', lambda u: search(db, u, random.choice(SEARCH_QUERIES))),
+    ]
+
+    print(f"\n{'operation (concurrency ' + str(args.concurrency) + ')':<40}{'ops/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, func in operations:
+        drive(name, func, user_ids, args)
+
+    # Same workload through the Flask routes (JSON encoding, routing, hooks)
+    import scanner
+    from access_tokens import issue_tokens
+    flask_client = scanner.create_app('api').test_client()
+    headers = {u: {'Authorization': f"Bearer {issue_tokens(u, f'{u}@bench', u)['access_token']}"} for u in user_ids}
+
+    def get_ok(url, user_id):
+        # A fast 401 or 500 would otherwise be timed as a fast route
+        response = flask_client.get(url, headers=headers[user_id])
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return response
+
+    routes = ['receipts', 'stats', 'companies', 'monthly', 'search']
+    for route in routes:
+        query = '?q=headphones' if route == 'search' else ''
+        drive(f'GET /api/dashboard/{route}', lambda u, r=route, q=query: get_ok(f'/api/dashboard/{r}/{u}{q}', u),
+              user_ids, args)
+
+    if args.backend == 'mongod':
+        explain_operations(db, recorder, operations, heaviest)
+    else:
+        print('\nexplain() statistics need a real mongod (--backend mongod)')
+
+
+if __name__ == '__main__':
+    main()
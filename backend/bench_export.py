@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Receipt export benchmark: streaming writers vs materialising the history.
+
+Feeds Mongo-shaped receipts through export.py's CSV, JSONL and Parquet
+writers one document at a time, the way the export endpoint reads them from
+a cursor, and compares throughput and peak Python heap (tracemalloc) with
+the old approach of loading the whole history into a list first. With
+--mongo, receipts are read from the configured MongoDB for --user through
+ReceiptDatabase.iter_user_receipts instead of being generated.
+
+    python bench_export.py --receipts 100000
+    python bench_export.py --formats csv,jsonl --receipts 500000
+    python bench_export.py --mongo --user 1234567890 --batch-size 2000
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from bson import ObjectId
+
+import export
+from companies import POPULAR_COMPANIES
+
+
+def generate_receipts(count, seed):
+    rng = random.Random(seed)
+    companies = list(POPULAR_COMPANIES.items())
+    day = datetime(2020, 1, 1)
+    for _ in range(count):
+        name, company = rng.choice(companies)
+        day += timedelta(minutes=rng.randrange(60, 600))
+        yield {
+            '_id': ObjectId(),
+            'company_name': name.title(),
+            'total_amount': round(rng.uniform(2, 150), 2),
+            'confidence': rng.choice(['high', 'medium']),
+            'purchase_date': day.replace(hour=0, minute=0),
+            'scan_date': day,
+            'metadata': {'ticker': company['ticker'], 'source': 'image', 'ocr_tier': 'fast',
+                         'manually_corrected': rng.random() < 0.05}
+        }
+
+
+def run(writer, receipts, columns, materialise):
+    """Drain one export; returns (rows, bytes, seconds, peak heap MB)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    if materialise:
+        receipts = list(receipts)
+    rows = len(receipts) if materialise else None
+    size = 0
+    for chunk in writer(export.export_rows(receipts, columns), columns):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return rows, size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--receipts', type=int, default=100000)
+    parser.add_argument('--formats', default='csv,jsonl,parquet')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--mongo', action='store_true', help='read --user from MONGO_URI instead of generating receipts')
+    parser.add_argument('--user')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    columns = export.export_columns()
+    if args.mongo:
+        from database import get_database
+        db = get_database()
+        if not db.client or not args.user:
+            parser.error('--mongo needs a reachable MONGO_URI and --user')
+        source = lambda: db.iter_user_receipts(args.user, projection=export.export_projection(columns),
+                                               batch_size=args.batch_size)
+        print(f"user {args.user} from MongoDB, batch size {args.batch_size}\n")
+    else:
+        source = lambda: generate_receipts(args.receipts, args.seed)
+        print(f"{args.receipts} generated receipts\n")
+
+    print(f"{'format':<9}{'mode':<13}{'MB out':>9}{'rows/s':>11}{'peak heap MB':>14}")
+    for name in args.formats.split(','):
+        if name == 'parquet' and export.pq is None:
+            print(f"{name:<9}skipped (pyarrow not installed)")
+            continue
+        for materialise in (True, False):
+            rows, size, elapsed, peak = run(export.WRITERS[name], source(), columns, materialise)
+            rows = rows or (args.receipts if not args.mongo else 0)
+            rate = f"{rows / elapsed:>11.0f}" if rows else f"{'-':>11}"
+            mode = 'list' if materialise else 'streaming'
+            print(f"{name:<9}{mode:<13}{size / 1e6:>9.1f}{rate}{peak:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Login-storm benchmark for the user write path.
+
+Replays concurrent sign-ins (a mix of first logins and returning users)
+against the legacy find_one + update_one/insert_one path and the current
+single find_one_and_update upsert in auth.save_or_update_user. Reports
+throughput, latency percentiles, round trips per login and duplicate
+users created by racing first logins.
+
+    python bench_login.py --uri mongodb://localhost:27017/ --logins 5000 --concurrency 32
+    python bench_login.py --backend mongomock --logins 500
+"""
+import argparse
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+import auth
+
+BENCH_DATABASE = 'receipt_scanner_bench'
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def legacy_save_or_update_user(user_data, users_collection):
+    """The original two-round-trip write path, kept for comparison"""
+    existing_user = users_collection.find_one({'google_id': user_data['google_id']})
+    if existing_user:
+        users_collection.update_one(
+            {'google_id': user_data['google_id']},
+            {'$set': {
+                'email': user_data['email'],
+                'name': user_data['name'],
+                'picture': user_data['picture'],
+                'verified_email': user_data['verified_email'],
+                'last_login': datetime.now(timezone.utc),
+                'updated_at': datetime.now(timezone.utc)
+            }}
+        )
+        return str(existing_user['_id'])
+    result = users_collection.insert_one({
+        **user_data,
+        'created_at': datetime.now(timezone.utc),
+        'updated_at': datetime.now(timezone.utc),
+        'last_login': datetime.now(timezone.utc),
+        'onboarding_completed': False
+    })
+    return str(result.inserted_id)
+
+
+def make_logins(args):
+    rng = random.Random(args.seed)
+    logins = []
+    for _ in range(args.logins):
+        user = rng.randrange(args.users)
+        logins.append({
+            'google_id': f'google-{user}',
+            'email': f'student{user}@example.edu',
+            'name': f'Student {user}',
+            'picture': '',
+            'verified_email': True
+        })
+    return logins
+
+
+def run(label, save, users_collection, logins, counter, args):
+    users_collection.drop()
+    auth._user_indexes_ready = False
+    if label == 'upsert':
+        auth.ensure_user_indexes(users_collection)
+
+    def timed(user_data):
+        t0 = time.perf_counter()
+        save(user_data, users_collection)
+        return time.perf_counter() - t0
+
+    counter.count = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(timed, logins))
+    elapsed = time.perf_counter() - start
+    commands = counter.count
+
+    ms = np.array(latencies) * 1000
+    distinct = len({login['google_id'] for login in logins})
+    duplicates = users_collection.count_documents({}) - distinct
+    trips = f'{commands / len(logins):.2f}' if commands else 'n/a'
+    print(f"{label:<10}{len(logins) / elapsed:>10.0f}{np.percentile(ms, 50):>9.2f}"
+          f"{np.percentile(ms, 95):>9.2f}{np.percentile(ms, 99):>9.2f}{trips:>10}{duplicates:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['mongod', 'mongomock'], default='mongod')
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--logins', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=1000, help='distinct Google accounts')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    if args.backend == 'mongomock':
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        client = MongoClient(args.uri, event_listeners=[counter], maxPoolSize=args.concurrency * 2)
+    users_collection = client[BENCH_DATABASE]['users_bench']
+    logins = make_logins(args)
+
+    print(f"{args.logins} logins over {args.users} accounts, concurrency {args.concurrency}\n")
+    print(f"{'path':<10}{'logins/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'trips':>10}{'duplicates':>12}")
+    run('legacy', legacy_save_or_update_user, users_collection, logins, counter, args)
+    run('upsert', auth.save_or_update_user, users_collection, logins, counter, args)
+    users_collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark for the receipt OCR pipeline.
+
+Generates a seeded corpus of synthetic receipts for the POPULAR_COMPANIES
+brands (noise, blur, skew, varying resolution), runs every pipeline stage
+over it and reports throughput, p50/p95 latency, peak memory and
+merchant/total accuracy. Save a run with --output and compare a later run
+against it with --baseline to catch regressions.
+
+    python bench_ocr.py --receipts 40 --output bench_ocr.json
+    python bench_ocr.py --receipts 40 --baseline bench_ocr.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+import ereceipts
+import receipt_scan
+import ocr
+
+ITEM_NAMES = ['COFFEE', 'SANDWICH', 'WATER', 'CHIPS', 'T-SHIRT', 'CHARGER', 'SOAP',
+              'NOTEBOOK', 'BAGEL', 'SALAD', 'JUICE', 'HEADPHONES', 'SNACKS', 'TEA']
+
+# name -> (noise sigma, blur radius, max skew degrees, scale)
+DEGRADATIONS = {
+    'clean': (0, 0, 0, 1.0),
+    'noisy': (18, 0, 0, 1.0),
+    'blurred': (4, 1.2, 0, 1.0),
+    'skewed': (6, 0.5, 4, 1.0),
+    'low_res': (6, 0.5, 1, 0.5),
+}
+
+
+def build_receipt(rng, company_key):
+    """Return (text lines, expected company name, expected total)"""
+    company = receipt_scan.POPULAR_COMPANIES[company_key]
+    header = rng.choice(company['variations']).upper()
+    items = rng.sample(ITEM_NAMES, rng.randint(2, 5))
+    prices = [round(rng.uniform(1.5, 60), 2) for _ in items]
+    subtotal = round(sum(prices), 2)
+    tax = round(subtotal * 0.0825, 2)
+    total = round(subtotal + tax, 2)
+
+    lines = [
+        header,
+        f'{rng.randint(10, 9999)} MAIN STREET',
+        f'{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/2024 {rng.randint(7, 21):02d}:{rng.randint(0, 59):02d}',
+        '',
+    ]
+    lines += [f'{name:<16}{"$%.2f" % price:>9}' for name, price in zip(items, prices)]
+    lines += ['', f'{"SUBTOTAL":<16}{"$%.2f" % subtotal:>9}', f'{"TAX":<16}{"$%.2f" % tax:>9}',
+              f'{"TOTAL":<16}{"$%.2f" % total:>9}', '', 'THANK YOU']
+    return lines, company['name'], total
+
+
+def render_receipt(rng, lines, degradation):
+    """Render receipt lines to an RGB image and apply a degradation profile"""
+    noise, blur, skew, scale = DEGRADATIONS[degradation]
+    font_size = 28
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        font = ImageFont.load_default()
+
+    width, line_height = 620, int(font_size * 1.4)
+    image = Image.new('L', (width, line_height * (len(lines) + 2)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((30, line_height * (i + 1)), line, fill=0, font=font)
+
+    if skew:
+        image = image.rotate(rng.uniform(-skew, skew), resample=Image.BICUBIC, expand=True, fillcolor=255)
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    if scale != 1.0:
+        image = image.resize((int(image.width * scale), int(image.height * scale)), Image.BILINEAR)
+    if noise:
+        pixels = np.asarray(image, dtype=np.float32)
+        noise_rng = np.random.default_rng(rng.randrange(2 ** 32))
+        pixels = np.clip(pixels + noise_rng.normal(0, noise, pixels.shape), 0, 255)
+        image = Image.fromarray(pixels.astype(np.uint8))
+    return image.convert('RGB')
+
+
+def generate_corpus(count, seed):
+    rng = random.Random(seed)
+    keys = sorted(receipt_scan.POPULAR_COMPANIES)
+    degradations = list(DEGRADATIONS)
+    corpus = []
+    for i in range(count):
+        lines, company, total = build_receipt(rng, keys[i % len(keys)])
+        degradation = degradations[i % len(degradations)]
+        corpus.append({
+            'image': render_receipt(rng, lines, degradation),
+            'text': '\n'.join(lines),
+            'company': company,
+            'total': total,
+            'degradation': degradation,
+        })
+    return corpus
+
+
+def text_pdf(text):
+    """One-page PDF with a text layer, like a merchant's e-receipt"""
+    document = ereceipts.pymupdf.open()
+    page = document.new_page()
+    for i, line in enumerate(text.splitlines()):
+        page.insert_text((72, 72 + 14 * i), line, fontsize=10)
+    return document.tobytes()
+
+
+def percentile(values, pct):
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def run_stage(name, func, inputs):
+    """Run func over inputs, returning (outputs, stats)"""
+    latencies, outputs = [], []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for item in inputs:
+        t0 = time.perf_counter()
+        outputs.append(func(item))
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return outputs, {
+        'stage': name,
+        'count': len(inputs),
+        'throughput_per_s': len(inputs) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'peak_python_mb': peak / 1e6,
+    }
+
+
+def accuracy(corpus, texts):
+    merchant_hits = total_hits = 0
+    per_degradation = {}
+    for receipt, text in zip(corpus, texts):
+        merchant_ok = receipt_scan.find_company_name(text) == receipt['company']
+        total_ok = abs(receipt_scan.find_total_amount(text) - receipt['total']) < 0.005
+        merchant_hits += merchant_ok
+        total_hits += total_ok
+        bucket = per_degradation.setdefault(receipt['degradation'], [0, 0, 0])
+        bucket[0] += merchant_ok
+        bucket[1] += total_ok
+        bucket[2] += 1
+    n = len(corpus) or 1
+    return {
+        'merchant_accuracy': merchant_hits / n,
+        'total_accuracy': total_hits / n,
+        'by_degradation': {
+            name: {'merchant_accuracy': m / c, 'total_accuracy': t / c}
+            for name, (m, t, c) in per_degradation.items()
+        },
+    }
+
+
+def tesseract_available():
+    try:
+        ocr.pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def run(args):
+    corpus = generate_corpus(args.receipts, args.seed)
+    stages = []
+
+    processed, stats = run_stage('enhance_receipt_image', ocr.enhance_receipt_image,
+                                 [r['image'] for r in corpus])
+    stages.append(stats)
+
+    ocr_texts = None
+    if args.skip_ocr or not tesseract_available():
+        print('Skipping extract_text_robust (tesseract unavailable or --skip-ocr)')
+    else:
+        # Cost of the per-scan OSD pass (zero when only English traineddata is installed)
+        _, stats = run_stage('detect_languages', lambda image: ocr.detect_languages(ocr.to_grayscale(image)),
+                             [r['image'] for r in corpus])
+        stages.append(stats)
+        ocr_texts, stats = run_stage('extract_text_robust', ocr.extract_text_robust, processed)
+        stages.append(stats)
+
+    # E-receipt fast path: the same receipts as HTML (and PDF when PyMuPDF can write one)
+    # read through their text layer instead of OCR
+    html_docs = ['<html><body><table>' + ''.join(f'<tr><td>{line}</td></tr>' for line in r['text'].splitlines())
+                 + '</table></body></html>' for r in corpus]
+    _, stats = run_stage('ereceipt_html', lambda doc: ereceipts.extract(doc.encode(), 'html'), html_docs)
+    stages.append(stats)
+    if ereceipts.pymupdf is not None:
+        pdf_docs = [text_pdf(r['text']) for r in corpus]
+        _, stats = run_stage('ereceipt_pdf', lambda doc: ereceipts.extract(doc, 'pdf'), pdf_docs)
+        stages.append(stats)
+
+    # Parser timings use OCR output when available; accuracy is also measured on the
+    # ground-truth text so parser regressions show up independently of OCR quality
+    truth_texts = [r['text'] for r in corpus]
+    for name, func in [('detect_popular_company', receipt_scan.detect_popular_company),
+                       ('find_company_name', receipt_scan.find_company_name),
+                       ('find_total_amount', receipt_scan.find_total_amount)]:
+        _, stats = run_stage(name, func, ocr_texts or truth_texts)
+        stages.append(stats)
+
+    results = {
+        'config': {'receipts': args.receipts, 'seed': args.seed, 'python': platform.python_version(),
+                   'machine': platform.machine()},
+        'stages': stages,
+        'accuracy_ground_truth_text': accuracy(corpus, truth_texts),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if ocr_texts is not None:
+        results['accuracy_ocr'] = accuracy(corpus, ocr_texts)
+    return results
+
+
+def print_report(results):
+    print(f"\n{'stage':<24}{'n':>5}{'ops/s':>12}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}")
+    for s in results['stages']:
+        print(f"{s['stage']:<24}{s['count']:>5}{s['throughput_per_s']:>12.1f}"
+              f"{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['peak_python_mb']:>10.1f}")
+    for key in ('accuracy_ground_truth_text', 'accuracy_ocr'):
+        if key in results:
+            acc = results[key]
+            print(f"\n{key}: merchant {acc['merchant_accuracy']:.1%}, total {acc['total_accuracy']:.1%}")
+            for name, a in acc['by_degradation'].items():
+                print(f"  {name:<10} merchant {a['merchant_accuracy']:.1%}  total {a['total_accuracy']:.1%}")
+    print(f"\npeak RSS: {results['peak_rss_mb']:.0f} MB")
+
+
+def compare(results, baseline, tolerance):
+    """Print deltas against a baseline run; return True if anything regressed"""
+    regressed = False
+    if baseline.get('config', {}).get('seed') != results['config']['seed']:
+        print('\nWarning: baseline was generated with a different seed')
+    base_stages = {s['stage']: s for s in baseline.get('stages', [])}
+    print('\nvs baseline (p95 latency / throughput):')
+    for s in results['stages']:
+        base = base_stages.get(s['stage'])
+        if not base or not base['p95_ms']:
+            continue
+        p95_delta = s['p95_ms'] / base['p95_ms'] - 1
+        tput_delta = s['throughput_per_s'] / base['throughput_per_s'] - 1 if base['throughput_per_s'] else 0
+        flag = ''
+        # Ignore sub-millisecond jitter on the parser stages
+        if p95_delta > tolerance and s['p95_ms'] - base['p95_ms'] > 0.5:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"  {s['stage']:<24}p95 {p95_delta:+.1%}  ops/s {tput_delta:+.1%}{flag}")
+    for key in ('accuracy_ground_truth_text', 'accuracy_ocr'):
+        if key in results and key in baseline:
+            for metric in ('merchant_accuracy', 'total_accuracy'):
+                delta = results[key][metric] - baseline[key][metric]
+                flag = '  REGRESSION' if delta < -0.001 else ''
+                regressed = regressed or bool(flag)
+                print(f"  {key}.{metric}: {delta:+.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--receipts', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--skip-ocr', action='store_true', help='skip the Tesseract passes')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='compare against a previous JSON result')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='allowed relative p95 slowdown before flagging a regression')
+    args = parser.parse_args()
+
+    results = run(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark for large receipt lists.
+
+Builds Mongo-shaped receipt documents (ObjectIds, naive UTC datetimes,
+nested metadata, OCR text) and compares the legacy path (str(_id) loop +
+flask.jsonify) with serialization.dumps on the stdlib json fallback and on
+orjson, with and without field projection. Then reports payload size and
+time for gzip/brotli at the configured levels.
+
+    python bench_serialization.py --receipts 5000
+    python bench_serialization.py --receipts 500 --repeat 50 --fields company_name,total_amount,purchase_date
+"""
+import argparse
+import gzip
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+import serialization
+from companies import POPULAR_COMPANIES
+
+
+def make_receipts(count, seed):
+    rng = random.Random(seed)
+    companies = list(POPULAR_COMPANIES.items())
+    start = datetime(2023, 1, 1)
+    receipts = []
+    for _ in range(count):
+        name, company = rng.choice(companies)
+        scanned = start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+        words = ' '.join(rng.choice(['ITEM', 'TAX', 'TOTAL', 'LATTE', 'QTY', '1', '4.95', 'CARD', 'VISA']) for _ in range(80))
+        receipts.append({
+            '_id': ObjectId(),
+            'user_id': 'bench-user',
+            'company_name': name.title(),
+            'total_amount': round(rng.lognormvariate(3, 0.8), 2),
+            'confidence': rng.choice(['high', 'medium', 'low']),
+            'extracted_text': words,
+            'scan_date': scanned,
+            'purchase_date': scanned - timedelta(days=rng.randrange(3)),
+            'month_bucket': scanned.year * 100 + scanned.month,
+            'metadata': {
+                'file_name': 'receipt.jpg',
+                'file_size': rng.randrange(100_000, 4_000_000),
+                'processing_time': scanned.isoformat(),
+                'detected_company': True,
+                'ticker': company['ticker'],
+                'logo': company['logo'],
+                'ocr_tier': 'medium',
+                'ocr_initial_tier': 'cheap',
+                'image_quality': {'blur_variance': 412.3, 'contrast': 51.2, 'noise': 2.71,
+                                  'text_height': 18.0, 'extreme_ratio': 0.62, 'is_digital': False}
+            },
+            'created_at': scanned,
+            'updated_at': scanned
+        })
+    return receipts
+
+
+def timed(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def project(receipts, fields):
+    """What a Mongo projection would have returned"""
+    projected = []
+    for receipt in receipts:
+        doc = {}
+        for field in fields:
+            top = field.split('.', 1)[0]
+            if top in receipt:
+                doc[top] = receipt[top] if '.' not in field else {field.split('.', 1)[1]: receipt[top].get(field.split('.', 1)[1])}
+        projected.append(doc)
+    return projected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--receipts', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=10, help='best-of repetitions per measurement')
+    parser.add_argument('--fields', default='_id,company_name,total_amount,purchase_date,metadata.ticker')
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    receipts = make_receipts(args.receipts, args.seed)
+    fields = serialization.parse_fields(args.fields)
+    app = Flask(__name__)
+
+    def legacy():
+        docs = [dict(doc, _id=str(doc['_id'])) for doc in receipts]
+        with app.app_context():
+            return jsonify({'success': True, 'receipts': docs}).get_data()
+
+    orjson_module = serialization.orjson
+
+    def with_encoder(module, docs):
+        def run():
+            serialization.orjson = module
+            try:
+                return serialization.dumps({'success': True, 'receipts': docs})
+            finally:
+                serialization.orjson = orjson_module
+        return run
+
+    projected = project(receipts, fields)
+    rows = [('jsonify + str(_id) loop', legacy), ('json fallback', with_encoder(None, receipts))]
+    if orjson_module is not None:
+        rows.append(('orjson', with_encoder(orjson_module, receipts)))
+        rows.append((f'orjson, {len(fields)} fields', with_encoder(orjson_module, projected)))
+    else:
+        rows.append((f'json, {len(fields)} fields', with_encoder(None, projected)))
+
+    print(f"{args.receipts} receipts, best of {args.repeat}\n")
+    print(f"{'encoder':<28}{'ms':>9}{'MB/s':>9}{'bytes':>12}")
+    for label, func in rows:
+        seconds, body = timed(func, args.repeat)
+        print(f"{label:<28}{seconds * 1000:>9.2f}{len(body) / seconds / 1e6:>9.0f}{len(body):>12}")
+
+    print(f"\n{'compression':<28}{'ms':>9}{'ratio':>9}{'bytes':>12}")
+    body = with_encoder(orjson_module, receipts)()
+    codecs = [(f'gzip -{serialization.GZIP_LEVEL}', lambda: gzip.compress(body, compresslevel=serialization.GZIP_LEVEL)),
+              ('gzip -9', lambda: gzip.compress(body, compresslevel=9))]
+    if serialization.brotli is not None:
+        brotli = serialization.brotli
+        codecs.append((f'brotli q{serialization.BROTLI_QUALITY}', lambda: brotli.compress(body, quality=serialization.BROTLI_QUALITY)))
+        codecs.append(('brotli q11', lambda: brotli.compress(body, quality=11)))
+    else:
+        print("(brotli not installed; pip install brotli to compare)")
+    for label, func in codecs:
+        seconds, compressed = timed(func, max(1, args.repeat // 2))
+        print(f"{label:<28}{seconds * 1000:>9.2f}{len(body) / len(compressed):>9.1f}{len(compressed):>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the backend process roles.
+
+Boots each role (`scanner.create_app(role)`) in a fresh interpreter, the
+way a new or recycled worker starts, and reports the median time to a
+ready app, resident memory after boot, the number of imported modules and
+which heavy dependencies were loaded.
+
+    python bench_startup.py
+    python bench_startup.py --roles api,auth --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('cv2', 'pytesseract', 'PIL', 'numpy', 'google.auth', 'google_auth_oauthlib', 'requests')
+
+BOOT_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import scanner
+scanner.create_app(sys.argv[1])
+elapsed = time.perf_counter() - start
+rss = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss = int(line.split()[1]) / 1024
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_mb': rss or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'heavy': [m for m in sys.argv[2].split(',') if m in sys.modules]
+}))
+'''
+
+
+def boot(role):
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    output = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT, role, ','.join(HEAVY_MODULES)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--roles', default='api,ocr,auth,all')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"median of {args.runs} cold starts\n")
+    print(f"{'role':<8}{'boot ms':>9}{'RSS MB':>9}{'modules':>9}  heavy imports")
+    for role in args.roles.split(','):
+        runs = [boot(role) for _ in range(args.runs)]
+        print(f"{role:<8}{statistics.median(r['seconds'] for r in runs) * 1000:>9.0f}"
+              f"{statistics.median(r['rss_mb'] for r in runs):>9.1f}"
+              f"{statistics.median(r['modules'] for r in runs):>9.0f}  {', '.join(runs[-1]['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
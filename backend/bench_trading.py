@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Order-rate benchmark for the paper trading engine.
+
+Drives a mix of market and limit orders from many users through
+trading.PaperTradingEngine while a quote ticker moves prices and crosses
+resting limit orders. Reports orders/s and latency percentiles for the
+in-memory engine and, against MongoDB, for batched persistence vs flushing
+after every order (with database round trips per order).
+
+    python bench_trading.py --orders 200000
+    python bench_trading.py --backend mongod --uri mongodb://localhost:27017/ --orders 50000 --concurrency 8
+"""
+import argparse
+import os
+import random
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import numpy as np
+from pymongo import MongoClient, monitoring
+
+from companies import catalogue_tickers
+from quotes import QuoteService, StubProvider, TokenBucket
+from trading import PaperTradingEngine, OrderRejected, Lot
+
+BENCH_DATABASE = 'receipt_scanner_bench'
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def make_orders(args, prices):
+    rng = random.Random(args.seed)
+    symbols = list(prices)
+    orders = []
+    for _ in range(args.orders):
+        symbol = rng.choice(symbols)
+        side = 'buy' if rng.random() < 0.6 else 'sell'
+        if rng.random() < args.limit_share:
+            offset = rng.uniform(-0.02, 0.02)
+            orders.append((f'user-{rng.randrange(args.users)}', symbol, side, rng.randint(1, 5), 'limit',
+                           round(prices[symbol] * (1 + offset), 2)))
+        else:
+            orders.append((f'user-{rng.randrange(args.users)}', symbol, side, rng.randint(1, 5), 'market', None))
+    return orders
+
+
+def run(label, engine, orders, args, flush_each=False, counter=None):
+    rng = random.Random(args.seed + 1)
+    symbols = catalogue_tickers()
+
+    def timed(index, order):
+        if index % args.tick_every == 0:
+            # Quote tick: move one symbol and let the engine fill crossed limit orders
+            symbol = rng.choice(symbols)
+            price = engine.marks.get(symbol) or engine.quotes.get_quote(symbol)['price']
+            engine.on_quotes({symbol: {'price': round(price * (1 + rng.gauss(0, 0.01)), 2)}})
+        t0 = time.perf_counter()
+        try:
+            engine.place_order(*order)
+            outcome = 1
+        except OrderRejected:
+            outcome = 0
+        if flush_each:
+            engine.flush()
+        return time.perf_counter() - t0, outcome
+
+    if counter:
+        counter.count = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(timed, range(len(orders)), orders))
+    writes = engine.flush()
+    elapsed = time.perf_counter() - start
+
+    ms = np.array([r[0] for r in results]) * 1000
+    accepted = sum(r[1] for r in results)
+    trips = f'{counter.count / len(orders):.3f}' if counter and counter.count else 'n/a'
+    print(f"{label:<16}{len(orders) / elapsed:>10.0f}{np.percentile(ms, 50):>9.3f}{np.percentile(ms, 99):>9.3f}"
+          f"{accepted / len(orders):>10.1%}{trips:>10}")
+    return writes
+
+
+def lot_memory(count=100_000):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    lots = [Lot(1.0, 100.0, None) for _ in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del lots
+    return size / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['memory', 'mongod'], default='memory')
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--limit-share', type=float, default=0.3, help='fraction of limit orders')
+    parser.add_argument('--tick-every', type=int, default=50, help='orders between quote ticks')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    quotes = QuoteService(StubProvider(seed=args.seed), ttl=3600, limiter=TokenBucket(rate=1e9, capacity=1e9))
+    prices = {symbol: quote['price'] for symbol, quote in quotes.get_quotes(catalogue_tickers()).items()}
+    orders = make_orders(args, prices)
+
+    print(f"{args.orders} orders from {args.users} users, {args.limit_share:.0%} limit, concurrency {args.concurrency}")
+    print(f"Lot record: {lot_memory():.0f} bytes\n")
+    print(f"{'engine':<16}{'orders/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'accepted':>10}{'trips':>10}")
+
+    run('memory', PaperTradingEngine(quotes), orders, args)
+
+    if args.backend == 'mongod':
+        counter = CommandCounter()
+        client = MongoClient(args.uri, event_listeners=[counter], maxPoolSize=args.concurrency * 2 + 2)
+        database = client[BENCH_DATABASE]
+        for name in ('paper_fills', 'paper_orders', 'paper_accounts'):
+            database[name].drop()
+        run('batched', PaperTradingEngine(quotes, database=database), orders, args, counter=counter)
+
+        for name in ('paper_fills', 'paper_orders', 'paper_accounts'):
+            database[name].drop()
+        run('flush-per-order', PaperTradingEngine(quotes, database=database, flush_interval=None),
+            orders, args, flush_each=True, counter=counter)
+        client.drop_database(BENCH_DATABASE)
+
+
+if __name__ == '__main__':
+    main()
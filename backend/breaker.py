@@ -0,0 +1,117 @@
+"""
+Circuit breaker for a remote dependency.
+
+Closed: calls go through and connection failures are counted. After
+`threshold` failures within `window` seconds the circuit opens, and
+callers are refused immediately instead of each waiting out a driver
+timeout. While open, a background thread runs `probe` every
+`probe_interval` seconds (the half-open trial, made by the breaker
+rather than by a user request); the first successful probe closes the
+circuit and runs the `on_close` callbacks, e.g. replaying spooled writes.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from observability import Counter, Gauge
+
+log = logging.getLogger(__name__)
+
+CIRCUIT_OPEN = Gauge('circuit_open', '1 while a circuit breaker is refusing calls', labelnames=('circuit',))
+CIRCUIT_TRANSITIONS = Counter(
+    'circuit_transitions_total', 'Circuit breaker state changes', labelnames=('circuit', 'state')
+)
+CIRCUIT_REJECTED = Counter(
+    'circuit_rejected_total', 'Calls refused while a circuit was open', labelnames=('circuit',)
+)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Fail-fast guard that opens on repeated failures and closes from a background probe"""
+
+    def __init__(self, name, probe, threshold=5, window=30.0, probe_interval=5.0, on_close=None):
+        self.name = name
+        self.probe = probe
+        self.threshold = threshold
+        self.window = window
+        self.probe_interval = probe_interval
+        self.on_close = list(on_close or [])
+        self.state = CLOSED
+        self.opened_at = None
+        self._failures = deque()
+        self._lock = threading.Lock()
+        self._probe_thread = None
+        CIRCUIT_OPEN.set(0, circuit=name)
+
+    def allow(self):
+        """True when a call may go through; counts a rejection otherwise"""
+        if self.state == CLOSED:
+            return True
+        CIRCUIT_REJECTED.inc(circuit=self.name)
+        return False
+
+    def record_failure(self):
+        """Count a connection failure, opening the circuit once the threshold is reached"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self._failures.append(now)
+            while self._failures and self._failures[0] < now - self.window:
+                self._failures.popleft()
+            if len(self._failures) >= self.threshold:
+                self._open(f'{len(self._failures)} failures in {self.window:g}s')
+
+    def trip(self, reason='tripped'):
+        """Open the circuit now, e.g. when a health ping fails"""
+        with self._lock:
+            if self.state == CLOSED:
+                self._open(reason)
+
+    def _open(self, reason):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._failures.clear()
+        CIRCUIT_OPEN.set(1, circuit=self.name)
+        CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=OPEN)
+        log.warning("Circuit %s opened (%s); probing every %gs", self.name, reason, self.probe_interval)
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f'{self.name}-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while True:
+            time.sleep(self.probe_interval)
+            with self._lock:
+                self.state = HALF_OPEN
+            try:
+                self.probe()
+            except Exception as e:
+                log.debug("Circuit %s probe failed: %s", self.name, e)
+                with self._lock:
+                    self.state = OPEN
+                continue
+            break
+
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+        CIRCUIT_OPEN.set(0, circuit=self.name)
+        CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=CLOSED)
+        log.info("Circuit %s closed", self.name)
+        for callback in self.on_close:
+            try:
+                callback()
+            except Exception as e:
+                log.error("Circuit %s recovery callback failed: %s", self.name, e)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'open_for_seconds': round(time.time() - self.opened_at, 1) if self.opened_at else 0
+        }
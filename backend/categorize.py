@@ -0,0 +1,267 @@
+"""
+Spending categories and likely public parents for merchant names.
+
+Merchant strings are turned into hashed character n-gram vectors (TF-IDF
+weighted, L2 normalised) and compared with a table of labelled exemplars by
+cosine similarity, one matrix product per batch of distinct names. The
+nearest exemplar gives the category; when it is also close enough to a
+brand with a listed parent, that parent's ticker is suggested. The exemplar
+table is small and built once per process. Scoring costs tens of
+microseconds per distinct name, and repeated names (the same store on many
+receipts) are scored once per batch.
+"""
+import logging
+import re
+import threading
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from companies import POPULAR_COMPANIES
+
+log = logging.getLogger(__name__)
+
+# Feature hashing width; collisions at this size cost little for short merchant strings
+FEATURES = 1 << 13
+NGRAM_SIZES = (2, 3, 4)
+# Names scored per vectorised step, bounding the (n-grams x exemplars) scratch array
+BATCH_SIZE = 1024
+# Cosine similarity needed to accept a category, and to suggest a public parent
+CATEGORY_THRESHOLD = 0.25
+PARENT_THRESHOLD = 0.55
+
+CATEGORIES = (
+    'groceries', 'dining', 'retail', 'electronics', 'clothing', 'pharmacy', 'home', 'transport',
+    'fuel', 'subscriptions', 'entertainment', 'education', 'services', 'other'
+)
+
+# (category, exemplar names). Generic words teach the model what "MARKET" or "CAFE" means
+# for stores it has never seen; brands without a listed parent are named for the category only.
+CATEGORY_EXEMPLARS = {
+    'groceries': [
+        'grocery', 'market', 'supermarket', 'foods', 'food mart', 'fresh market', 'farmers market',
+        'asian market', 'oriental market', 'indian grocery', 'international foods', 'halal meat',
+        'bazaar', 'spice bazaar', 'nepali bazaar', 'carniceria', 'supermercado', 'mercado', 'bakery',
+        'produce', 'butcher', 'h mart', '99 ranch market', 'patel brothers', 'trader joes', 'aldi',
+        'lidl', 'wegmans', 'publix', 'meijer', 'hy-vee', 'sprouts farmers market', 'food lion',
+    ],
+    'dining': [
+        'restaurant', 'cafe', 'coffee', 'espresso', 'tea house', 'boba tea', 'bubble tea', 'kitchen',
+        'grill', 'bar and grill', 'pizza', 'pizzeria', 'burger', 'sushi', 'ramen', 'noodle house',
+        'taqueria', 'bistro', 'diner', 'deli', 'bbq', 'momo house', 'curry house', 'dumpling house',
+        'food truck', 'dunkin', 'subway', 'panera bread', 'chick-fil-a', 'five guys', 'in-n-out burger',
+    ],
+    'retail': [
+        'store', 'shop', 'outlet', 'general store', 'variety store', 'dollar store', 'gift shop',
+        'department store', 'wholesale club', 'bookstore', 'campus store', 'ikea',
+    ],
+    'electronics': [
+        'electronics', 'computer store', 'phone repair', 'wireless', 'mobile store', 'camera',
+        'micro center', 'gamestop',
+    ],
+    'clothing': [
+        'apparel', 'clothing', 'fashion', 'boutique', 'shoes', 'footwear', 'sportswear', 'thrift store',
+        'uniqlo', 'h&m', 'zara', 'forever 21',
+    ],
+    'pharmacy': [
+        'pharmacy', 'drug store', 'drugstore', 'chemist', 'apothecary', 'health mart', 'clinic',
+        'rite aid',
+    ],
+    'home': [
+        'hardware', 'home improvement', 'furniture', 'home goods', 'bed bath', 'garden center',
+        'lumber', 'paint store', 'ace hardware',
+    ],
+    'transport': [
+        'taxi', 'cab', 'transit', 'metro', 'parking', 'airline', 'airport', 'bus', 'train', 'rail',
+        'car rental', 'rideshare', 'amtrak', 'greyhound',
+    ],
+    'fuel': [
+        'gas station', 'fuel', 'gas', 'petrol', 'service station', 'gas and go', 'wawa', 'sheetz',
+    ],
+    'subscriptions': [
+        'subscription', 'streaming', 'membership', 'monthly plan', 'cloud storage', 'hulu',
+    ],
+    'entertainment': [
+        'cinema', 'movie theater', 'theatre', 'arcade', 'bowling', 'museum', 'concert', 'tickets',
+        'amusement park', 'karaoke', 'gym', 'fitness',
+    ],
+    'education': [
+        'university', 'college', 'school', 'textbooks', 'tuition', 'library', 'bookstore textbooks',
+        'campus bookstore', 'testing center', 'stationery',
+    ],
+    'services': [
+        'salon', 'barber', 'laundry', 'laundromat', 'dry cleaning', 'post office', 'shipping',
+        'print shop', 'copy center', 'bank', 'insurance', 'repair', 'car wash', 'ups store', 'fedex office',
+    ],
+}
+
+# Brands owned by a listed company that are not in POPULAR_COMPANIES: name -> (category, ticker, parent)
+PARENT_BRANDS = {
+    'whole foods market': ('groceries', 'AMZN', 'Amazon.com Inc'),
+    'sams club': ('groceries', 'WMT', 'Walmart Inc'),
+    'kroger': ('groceries', 'KR', 'The Kroger Co'),
+    'ralphs': ('groceries', 'KR', 'The Kroger Co'),
+    'fred meyer': ('groceries', 'KR', 'The Kroger Co'),
+    'harris teeter': ('groceries', 'KR', 'The Kroger Co'),
+    'safeway': ('groceries', 'ACI', 'Albertsons Companies Inc'),
+    'albertsons': ('groceries', 'ACI', 'Albertsons Companies Inc'),
+    'vons': ('groceries', 'ACI', 'Albertsons Companies Inc'),
+    'dollar tree': ('retail', 'DLTR', 'Dollar Tree Inc'),
+    'family dollar': ('retail', 'DLTR', 'Dollar Tree Inc'),
+    'dollar general': ('retail', 'DG', 'Dollar General Corporation'),
+    'tj maxx': ('clothing', 'TJX', 'The TJX Companies Inc'),
+    'marshalls': ('clothing', 'TJX', 'The TJX Companies Inc'),
+    'homegoods': ('home', 'TJX', 'The TJX Companies Inc'),
+    'old navy': ('clothing', 'GAP', 'Gap Inc'),
+    'gap': ('clothing', 'GAP', 'Gap Inc'),
+    'ross dress for less': ('clothing', 'ROST', 'Ross Stores Inc'),
+    'best buy': ('electronics', 'BBY', 'Best Buy Co Inc'),
+    'lowes': ('home', 'LOW', "Lowe's Companies Inc"),
+    'taco bell': ('dining', 'YUM', 'Yum! Brands Inc'),
+    'kfc': ('dining', 'YUM', 'Yum! Brands Inc'),
+    'pizza hut': ('dining', 'YUM', 'Yum! Brands Inc'),
+    'dominos pizza': ('dining', 'DPZ', "Domino's Pizza Inc"),
+    'wendys': ('dining', 'WEN', "The Wendy's Company"),
+    'burger king': ('dining', 'QSR', 'Restaurant Brands International'),
+    'tim hortons': ('dining', 'QSR', 'Restaurant Brands International'),
+    'popeyes': ('dining', 'QSR', 'Restaurant Brands International'),
+    'olive garden': ('dining', 'DRI', 'Darden Restaurants Inc'),
+    'shell': ('fuel', 'SHEL', 'Shell plc'),
+    'chevron': ('fuel', 'CVX', 'Chevron Corporation'),
+    'exxon': ('fuel', 'XOM', 'Exxon Mobil Corporation'),
+    'mobil': ('fuel', 'XOM', 'Exxon Mobil Corporation'),
+    'bp': ('fuel', 'BP', 'BP plc'),
+    'lyft': ('transport', 'LYFT', 'Lyft Inc'),
+    'doordash': ('dining', 'DASH', 'DoorDash Inc'),
+    'ulta beauty': ('retail', 'ULTA', 'Ulta Beauty Inc'),
+    'amc theatres': ('entertainment', 'AMC', 'AMC Entertainment Holdings'),
+    'planet fitness': ('entertainment', 'PLNT', 'Planet Fitness Inc'),
+    'youtube premium': ('subscriptions', 'GOOGL', 'Alphabet Inc'),
+    'google': ('subscriptions', 'GOOGL', 'Alphabet Inc'),
+    'chase': ('services', 'JPM', 'JPMorgan Chase & Co'),
+    'fedex': ('services', 'FDX', 'FedEx Corporation'),
+    'ups': ('services', 'UPS', 'United Parcel Service Inc'),
+}
+
+# category; score: cosine similarity to the nearest exemplar; parent_*: the likely listed owner or None
+Category = namedtuple('Category', 'category score parent_ticker parent_name')
+
+# Store numbers, addresses and receipt boilerplate carry no signal about the merchant
+NOISE = re.compile(r"\b(?:inc|llc|ltd|corp|co|store|#?\d+|no|the)\b|[^a-z0-9&' ]")
+
+def normalize_name(name):
+    return ' '.join(NOISE.sub(' ', (name or '').lower().replace("'", '')).split())
+
+def features(name):
+    """Hashed n-gram indices for one merchant name (word n-grams padded with spaces, plus whole words)"""
+    indices = []
+    for word in normalize_name(name).split():
+        indices.append(zlib.crc32(b'w:' + word.encode()) % FEATURES)
+        padded = f' {word} '.encode()
+        for n in NGRAM_SIZES:
+            indices.extend(zlib.crc32(padded[i:i + n]) % FEATURES for i in range(len(padded) - n + 1))
+    return indices
+
+class MerchantCategorizer:
+    """Nearest-exemplar classifier over hashed n-gram TF-IDF vectors"""
+
+    def __init__(self, exemplars):
+        """exemplars: (name, category, parent ticker or None, parent name or None) tuples"""
+        self.names = [name for name, _, _, _ in exemplars]
+        self.categories = [category for _, category, _, _ in exemplars]
+        self.tickers = [ticker for _, _, ticker, _ in exemplars]
+        self.parents = [parent for _, _, _, parent in exemplars]
+
+        rows, columns, counts = self._sparse_counts(self.names)
+        document_frequency = np.bincount(columns, minlength=FEATURES)
+        self.idf = (np.log((1 + len(exemplars)) / (1 + document_frequency)) + 1).astype(np.float32)
+        # Feature-major (features x exemplars), so a name's n-grams select rows directly
+        self.columns = np.zeros((FEATURES, len(exemplars)), dtype=np.float32)
+        self.columns[columns, rows] = self._weights(rows, columns, counts, len(exemplars))
+
+    @staticmethod
+    def _sparse_counts(names):
+        """(row, feature, count) triples, sorted by row"""
+        keys = []
+        for row, name in enumerate(names):
+            keys.extend(row * FEATURES + index for index in features(name))
+        keys, counts = np.unique(np.array(keys, dtype=np.int64), return_counts=True)
+        return keys // FEATURES, keys % FEATURES, counts
+
+    def _weights(self, rows, columns, counts, n_rows):
+        """L2-normalised TF-IDF weights for sparse counts"""
+        weights = np.log1p(counts).astype(np.float32) * self.idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=n_rows))
+        return weights / np.maximum(norms[rows], 1e-9)
+
+    def _similarity(self, names):
+        """Cosine similarity of each name to each exemplar (names x exemplars)"""
+        rows, columns, counts = self._sparse_counts(names)
+        if not len(rows):
+            return np.zeros((len(names), len(self.names)), dtype=np.float32)
+        weights = self._weights(rows, columns, counts, len(names))
+        # One dense product over just the features this batch uses
+        used, local = np.unique(columns, return_inverse=True)
+        vectors = np.zeros((len(names), len(used)), dtype=np.float32)
+        vectors[rows, local] = weights
+        return vectors @ self.columns[used]
+
+    def classify(self, names):
+        """Category for each merchant name; repeated names are scored once, BATCH_SIZE per step"""
+        unique = list(dict.fromkeys(names))
+        scored = {}
+        for start in range(0, len(unique), BATCH_SIZE):
+            batch = unique[start:start + BATCH_SIZE]
+            scored.update(zip(batch, self._classify_batch(batch)))
+        return [scored[name] for name in names]
+
+    def _classify_batch(self, names):
+        similarity = self._similarity(names)
+        best = similarity.argmax(axis=1)
+        scores = similarity[np.arange(len(names)), best]
+
+        results = []
+        for index, score in zip(best.tolist(), scores.tolist()):
+            if score < CATEGORY_THRESHOLD:
+                results.append(Category('other', round(score, 3), None, None))
+            elif self.tickers[index] and score >= PARENT_THRESHOLD:
+                results.append(Category(self.categories[index], round(score, 3), self.tickers[index], self.parents[index]))
+            else:
+                results.append(Category(self.categories[index], round(score, 3), None, None))
+        return results
+
+    def classify_one(self, name):
+        return self.classify([name])[0]
+
+def default_exemplars():
+    exemplars = []
+    for company in POPULAR_COMPANIES.values():
+        for name in [company['name']] + company['variations']:
+            # Tickers such as 'ko' or 'hd' are too short to identify a store by name
+            if len(name) > 3:
+                exemplars.append((name, company['category'], company['ticker'], company['name']))
+    for brand, (category, ticker, parent) in PARENT_BRANDS.items():
+        exemplars.append((brand, category, ticker, parent))
+    for category, names in CATEGORY_EXEMPLARS.items():
+        exemplars.extend((name, category, None, None) for name in names)
+    return exemplars
+
+_categorizer = None
+_categorizer_lock = threading.Lock()
+
+def get_categorizer():
+    """The process-wide categoriser, built on first use"""
+    global _categorizer
+    if _categorizer is None:
+        with _categorizer_lock:
+            if _categorizer is None:
+                _categorizer = MerchantCategorizer(default_exemplars())
+                log.info("Merchant categoriser ready (%d exemplars)", len(_categorizer.names))
+    return _categorizer
+
+def categorize_merchants(names):
+    return get_categorizer().classify(list(names))
+
+def categorize_merchant(name):
+    return get_categorizer().classify_one(name)
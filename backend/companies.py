@@ -0,0 +1,147 @@
+# Hardcoded popular companies with their variations and stock tickers
+POPULAR_COMPANIES = {
+    'starbucks': {
+        'name': 'Starbucks Corporation',
+        'ticker': 'SBUX',
+        'category': 'dining',
+        'variations': ['starbucks', 'sbux', 'star bucks', 'starbu'],
+        'logo': '☕'
+    },
+    'target': {
+        'name': 'Target Corporation',
+        'ticker': 'TGT',
+        'category': 'retail',
+        'variations': ['target', 'tgt', 'target corp'],
+        'logo': '🎯'
+    },
+    'walmart': {
+        'name': 'Walmart Inc',
+        'ticker': 'WMT',
+        'category': 'retail',
+        'variations': ['walmart', 'wal mart', 'wal-mart', 'wmt'],
+        'logo': '🛒'
+    },
+    'nike': {
+        'name': 'Nike Inc',
+        'ticker': 'NKE',
+        'category': 'clothing',
+        'variations': ['nike', 'nke', 'nike inc'],
+        'logo': '👟'
+    },
+    'apple': {
+        'name': 'Apple Inc',
+        'ticker': 'AAPL',
+        'category': 'electronics',
+        'variations': ['apple', 'aapl', 'apple inc', 'apple store'],
+        'logo': '🍎'
+    },
+    'amazon': {
+        'name': 'Amazon.com Inc',
+        'ticker': 'AMZN',
+        'category': 'retail',
+        'variations': ['amazon', 'amzn', 'amazon.com', 'amazon fresh', 'whole foods'],
+        'logo': '📦'
+    },
+    'mcdonalds': {
+        'name': 'McDonald\'s Corporation',
+        'ticker': 'MCD',
+        'category': 'dining',
+        'variations': ['mcdonalds', 'mcd', 'mcdonald\'s', 'mc donalds'],
+        'logo': '🍟'
+    },
+    'cocacola': {
+        'name': 'The Coca-Cola Company',
+        'ticker': 'KO',
+        'category': 'groceries',
+        'variations': ['coca cola', 'coke', 'coca-cola', 'ko'],
+        'logo': '🥤'
+    },
+    'tesla': {
+        'name': 'Tesla Inc',
+        'ticker': 'TSLA',
+        'category': 'transport',
+        'variations': ['tesla', 'tsla', 'tesla motors'],
+        'logo': '🚗'
+    },
+    'microsoft': {
+        'name': 'Microsoft Corporation',
+        'ticker': 'MSFT',
+        'category': 'electronics',
+        'variations': ['microsoft', 'msft', 'xbox'],
+        'logo': '💻'
+    },
+    'netflix': {
+        'name': 'Netflix Inc',
+        'ticker': 'NFLX',
+        'category': 'subscriptions',
+        'variations': ['netflix', 'nflx'],
+        'logo': '📺'
+    },
+    'uber': {
+        'name': 'Uber Technologies Inc',
+        'ticker': 'UBER',
+        'category': 'transport',
+        'variations': ['uber', 'uber eats'],
+        'logo': '🚕'
+    },
+    'spotify': {
+        'name': 'Spotify Technology SA',
+        'ticker': 'SPOT',
+        'category': 'subscriptions',
+        'variations': ['spotify', 'spot'],
+        'logo': '🎵'
+    },
+    'meta': {
+        'name': 'Meta Platforms Inc',
+        'ticker': 'META',
+        'category': 'services',
+        'variations': ['meta', 'facebook', 'fb', 'instagram', 'whatsapp'],
+        'logo': '📱'
+    },
+    'disney': {
+        'name': 'The Walt Disney Company',
+        'ticker': 'DIS',
+        'category': 'entertainment',
+        'variations': ['disney', 'dis', 'walt disney', 'disneyland', 'disney world'],
+        'logo': '🏰'
+    },
+    'costco': {
+        'name': 'Costco Wholesale Corporation',
+        'ticker': 'COST',
+        'category': 'groceries',
+        'variations': ['costco', 'cost', 'costco wholesale'],
+        'logo': '🏪'
+    },
+    'homedepot': {
+        'name': 'The Home Depot Inc',
+        'ticker': 'HD',
+        'category': 'home',
+        'variations': ['home depot', 'hd', 'homedepot'],
+        'logo': '🔨'
+    },
+    'cvs': {
+        'name': 'CVS Health Corporation',
+        'ticker': 'CVS',
+        'category': 'pharmacy',
+        'variations': ['cvs', 'cvs pharmacy', 'cvs health'],
+        'logo': '💊'
+    },
+    'walgreens': {
+        'name': 'Walgreens Boots Alliance Inc',
+        'ticker': 'WBA',
+        'category': 'pharmacy',
+        'variations': ['walgreens', 'wba', 'walgreen'],
+        'logo': '💊'
+    },
+    'chipotle': {
+        'name': 'Chipotle Mexican Grill Inc',
+        'ticker': 'CMG',
+        'category': 'dining',
+        'variations': ['chipotle', 'cmg'],
+        'logo': '🌯'
+    }
+}
+
+def catalogue_tickers():
+    """Tickers of every company in the catalogue, in catalogue order"""
+    return [company['ticker'] for company in POPULAR_COMPANIES.values()]
@@ -0,0 +1,395 @@
+import logging
+import os
+import threading
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from flask import Blueprint, request, jsonify
+
+from auth import authorize_user, user_route
+from observability import Counter, DB_ERRORS_TOTAL
+
+log = logging.getLogger(__name__)
+
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+DEFAULT_STATUS = os.getenv('COMPLIANCE_DEFAULT_STATUS', 'F-1')
+PDT_MIN_EQUITY = 25000
+PDT_WINDOW_BUSINESS_DAYS = 5
+FREQUENCY_WINDOW_DAYS = 7
+
+# Rule parameters per immigration status; None switches a rule off.
+# Day trades: FINRA pattern-day-trader rule (4+ day trades in 5 business days
+# under $25k equity). Trade frequency and holding periods reflect the
+# "passive investing only" guidance for student and exchange-visitor visas.
+STATUS_RULES = {
+    'F-1': {
+        'max_day_trades': 3, 'day_trade_warning': 2,
+        'weekly_trade_warning': 5, 'weekly_trade_limit': 10,
+        'min_holding_days': 30, 'large_trade_amount': 5000,
+        'disallowed_instruments': ('option', 'crypto', 'leveraged_etf'),
+    },
+    'J-1': {
+        'max_day_trades': 3, 'day_trade_warning': 2,
+        'weekly_trade_warning': 5, 'weekly_trade_limit': 10,
+        'min_holding_days': 30, 'large_trade_amount': 5000,
+        'disallowed_instruments': ('option', 'crypto', 'leveraged_etf'),
+    },
+    'H-1B': {
+        'max_day_trades': 3, 'day_trade_warning': 2,
+        'weekly_trade_warning': 20, 'weekly_trade_limit': None,
+        'min_holding_days': None, 'large_trade_amount': 10000,
+        'disallowed_instruments': (),
+    },
+    'Other': {
+        'max_day_trades': 3, 'day_trade_warning': None,
+        'weekly_trade_warning': None, 'weekly_trade_limit': None,
+        'min_holding_days': None, 'large_trade_amount': None,
+        'disallowed_instruments': (),
+    },
+}
+
+# Everything in the company catalogue is common stock; other instrument types are listed here
+INSTRUMENT_TYPES = {
+    'TQQQ': 'leveraged_etf', 'SQQQ': 'leveraged_etf', 'UVXY': 'leveraged_etf', 'SOXL': 'leveraged_etf',
+    'BITO': 'crypto', 'IBIT': 'crypto', 'GBTC': 'crypto',
+}
+
+COMPLIANCE_CHECKS_TOTAL = Counter('compliance_checks_total', 'Pre-trade compliance decisions', labelnames=('status', 'decision'))
+
+Violation = namedtuple('Violation', ['rule', 'severity', 'message'])
+
+_MONDAY_ORDINAL = datetime(2001, 1, 1).toordinal()
+
+
+def market_day(moment):
+    """(calendar ordinal, business-day index) of a timestamp in the market's timezone"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    ordinal = moment.astimezone(MARKET_TIMEZONE).toordinal()
+    weeks, weekday = divmod(ordinal - _MONDAY_ORDINAL, 7)
+    # Weekend trades count towards the following Monday's business day
+    return ordinal, weeks * 5 + min(weekday, 5)
+
+
+class TradeWindow:
+    """Rolling per-user trade history; each trade is appended and evicted once"""
+    __slots__ = ('trade_days', 'day_trades', 'day', 'bought_today')
+
+    def __init__(self):
+        self.trade_days = deque()      # calendar ordinals of trades in the frequency window
+        self.day_trades = deque()      # business-day indices of day trades in the PDT window
+        self.day = None
+        self.bought_today = set()
+
+    def advance(self, day, business_day):
+        trade_days, day_trades = self.trade_days, self.day_trades
+        while trade_days and trade_days[0] <= day - FREQUENCY_WINDOW_DAYS:
+            trade_days.popleft()
+        while day_trades and day_trades[0] <= business_day - PDT_WINDOW_BUSINESS_DAYS:
+            day_trades.popleft()
+        if day != self.day:
+            self.day = day
+            self.bought_today = set()
+
+    def is_day_trade(self, symbol, side):
+        return side == 'sell' and symbol in self.bought_today
+
+    def record(self, day, business_day, symbol, side):
+        self.advance(day, business_day)
+        self.trade_days.append(day)
+        if side == 'buy':
+            self.bought_today.add(symbol)
+        elif symbol in self.bought_today:
+            self.day_trades.append(business_day)
+
+
+class TradeContext:
+    """Everything a rule needs about one proposed trade, computed once"""
+    __slots__ = ('symbol', 'side', 'quantity', 'price', 'now', 'window', 'account', 'equity', 'day_trade')
+
+    def __init__(self, symbol, side, quantity, price, now, window, account, equity):
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.now = now
+        self.window = window
+        self.account = account
+        self.equity = equity
+        self.day_trade = window.is_day_trade(symbol, side)
+
+
+def _day_trade_rule(limit, warning):
+    def check(ctx):
+        if not ctx.day_trade:
+            return None
+        count = len(ctx.window.day_trades) + 1
+        if limit is not None and count > limit and (ctx.equity is None or ctx.equity() < PDT_MIN_EQUITY):
+            return Violation('pattern_day_trader', 'block',
+                             f'This would be day trade #{count} in {PDT_WINDOW_BUSINESS_DAYS} business days; '
+                             f'pattern day traders need ${PDT_MIN_EQUITY:,} equity')
+        if warning is not None and count >= warning:
+            return Violation('pattern_day_trader', 'warning',
+                             f'Day trade #{count} in {PDT_WINDOW_BUSINESS_DAYS} business days '
+                             f'(limit {limit})')
+        return None
+    return check
+
+
+def _frequency_rule(warning, limit):
+    def check(ctx):
+        count = len(ctx.window.trade_days) + 1
+        if limit is not None and count > limit:
+            return Violation('trade_frequency', 'block',
+                             f'{count} trades in {FREQUENCY_WINDOW_DAYS} days exceeds the passive-investing limit of {limit}')
+        if warning is not None and count >= warning:
+            return Violation('trade_frequency', 'warning',
+                             f'{count} trades in {FREQUENCY_WINDOW_DAYS} days; frequent trading may be seen as active trading')
+        return None
+    return check
+
+
+def _holding_period_rule(days):
+    def check(ctx):
+        if ctx.side != 'sell' or ctx.account is None:
+            return None
+        position = ctx.account.positions.get(ctx.symbol)
+        if position is None:
+            return None
+        # FIFO: only the lots this sell would consume matter
+        cutoff = ctx.now - timedelta(days=days)
+        remaining = ctx.quantity
+        for lot in position.lots:
+            opened_at = lot.opened_at if lot.opened_at.tzinfo else lot.opened_at.replace(tzinfo=timezone.utc)
+            if opened_at > cutoff:
+                return Violation('holding_period', 'warning',
+                                 f'Selling {ctx.symbol} shares held less than {days} days')
+            remaining -= lot.quantity
+            if remaining <= 0:
+                break
+        return None
+    return check
+
+
+def _instrument_rule(disallowed):
+    disallowed = frozenset(disallowed)
+
+    def check(ctx):
+        instrument = INSTRUMENT_TYPES.get(ctx.symbol, 'stock')
+        if instrument in disallowed:
+            return Violation('instrument', 'block', f'{instrument.replace("_", " ")} products are not allowed for this status')
+        return None
+    return check
+
+
+def _large_trade_rule(amount):
+    def check(ctx):
+        if ctx.quantity * ctx.price > amount:
+            return Violation('large_trade', 'warning',
+                             f'Trades over ${amount:,} need extra records for tax reporting')
+        return None
+    return check
+
+
+def compile_rules(rules):
+    """Turn a status's rule parameters into a tuple of checks, skipping rules that are off"""
+    checks = []
+    if rules['disallowed_instruments']:
+        checks.append(_instrument_rule(rules['disallowed_instruments']))
+    if rules['max_day_trades'] is not None or rules['day_trade_warning'] is not None:
+        checks.append(_day_trade_rule(rules['max_day_trades'], rules['day_trade_warning']))
+    if rules['weekly_trade_limit'] is not None or rules['weekly_trade_warning'] is not None:
+        checks.append(_frequency_rule(rules['weekly_trade_warning'], rules['weekly_trade_limit']))
+    if rules['min_holding_days'] is not None:
+        checks.append(_holding_period_rule(rules['min_holding_days']))
+    if rules['large_trade_amount'] is not None:
+        checks.append(_large_trade_rule(rules['large_trade_amount']))
+    return tuple(checks)
+
+
+class ComplianceEngine:
+    """
+    Pre-trade checks by immigration status.
+
+    Rules are compiled per status once; each user has a rolling TradeWindow
+    updated on every fill, so a check costs O(1) amortised instead of a scan
+    of the user's trade history.
+    """
+
+    def __init__(self, rules=STATUS_RULES, default_status=DEFAULT_STATUS, database=None):
+        self.rules = rules
+        self.policies = {status: compile_rules(params) for status, params in rules.items()}
+        self.default_status = default_status
+        self.database = database
+        self.engine = None
+        self._statuses = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def bind(self, database):
+        self.database = database
+
+    def status(self, user_id):
+        status = self._statuses.get(user_id)
+        if status is None:
+            status = self.default_status
+            if self.database is not None:
+                try:
+                    doc = self.database['compliance_profiles'].find_one({'_id': user_id})
+                    if doc and doc.get('status') in self.policies:
+                        status = doc['status']
+                except Exception as e:
+                    DB_ERRORS_TOTAL.inc(method='compliance_status')
+                    log.error("Failed to load compliance status for %s: %s", user_id, e)
+            self._statuses[user_id] = status
+        return status
+
+    def set_status(self, user_id, status):
+        if status not in self.policies:
+            raise ValueError(f"Unknown status '{status}'; expected one of {', '.join(self.policies)}")
+        self._statuses[user_id] = status
+        if self.database is not None:
+            self.database['compliance_profiles'].update_one(
+                {'_id': user_id},
+                {'$set': {'status': status, 'updated_at': datetime.now(timezone.utc)}},
+                upsert=True
+            )
+
+    def window(self, user_id):
+        window = self._windows.get(user_id)
+        if window is None:
+            window = self._load_window(user_id)
+            with self._lock:
+                window = self._windows.setdefault(user_id, window)
+        return window
+
+    def _load_window(self, user_id):
+        """Rebuild a window from recent persisted fills (once per user per process)"""
+        window = TradeWindow()
+        if self.database is None:
+            return window
+        try:
+            since = datetime.now(timezone.utc) - timedelta(days=FREQUENCY_WINDOW_DAYS + 2)
+            for fill in self.database['paper_fills'].find(
+                    {'user_id': user_id, 'filled_at': {'$gte': since}},
+                    {'symbol': 1, 'side': 1, 'filled_at': 1}).sort('filled_at', 1):
+                window.record(*market_day(fill['filled_at']), fill['symbol'], fill['side'])
+        except Exception as e:
+            DB_ERRORS_TOTAL.inc(method='compliance_window')
+            log.error("Failed to load trade window for %s: %s", user_id, e)
+        return window
+
+    def evaluate(self, user_id, symbol, side, quantity, price, account=None, equity=None, now=None):
+        """Return (decision, violations) where decision is 'allow', 'warn' or 'block'"""
+        now = now or datetime.now(timezone.utc)
+        status = self.status(user_id)
+        window = self.window(user_id)
+        window.advance(*market_day(now))
+        ctx = TradeContext(symbol, side, quantity, price, now, window, account, equity)
+
+        violations = [v for v in (check(ctx) for check in self.policies[status]) if v is not None]
+        if any(v.severity == 'block' for v in violations):
+            decision = 'block'
+        elif violations:
+            decision = 'warn'
+        else:
+            decision = 'allow'
+        COMPLIANCE_CHECKS_TOTAL.inc(status=status, decision=decision)
+        return decision, violations
+
+    def record_fill(self, user_id, symbol, side, filled_at):
+        self.window(user_id).record(*market_day(filled_at), symbol, side)
+
+    def summary(self, user_id, now=None):
+        status = self.status(user_id)
+        window = self.window(user_id)
+        window.advance(*market_day(now or datetime.now(timezone.utc)))
+        return {
+            'status': status,
+            'rules': self.rules[status],
+            'day_trades_in_window': len(window.day_trades),
+            'trades_in_window': len(window.trade_days),
+            'pdt_window_business_days': PDT_WINDOW_BUSINESS_DAYS,
+            'frequency_window_days': FREQUENCY_WINDOW_DAYS
+        }
+
+    # -- paper trading hooks -------------------------------------------------
+
+    def attach(self, engine, rejected_error):
+        """Check every paper order before it is accepted and feed fills into the windows"""
+        if self.engine is engine:
+            # Already attached (create_app can run more than once per process)
+            return
+        self.engine = engine
+
+        def pre_trade_check(account, order, price):
+            decision, violations = self.evaluate(
+                account.user_id, order.symbol, order.side, order.quantity,
+                order.limit_price or price, account=account, equity=account_equity(engine, account)
+            )
+            if decision == 'block':
+                raise rejected_error('; '.join(v.message for v in violations if v.severity == 'block'))
+            return [v.message for v in violations]
+
+        engine.pre_trade_checks.append(pre_trade_check)
+        engine.fill_listeners.append(lambda order: self.record_fill(order.user_id, order.symbol, order.side, order.filled_at))
+
+
+def account_equity(engine, account):
+    """Lazy equity of a paper account: cash plus positions at the engine's last marks"""
+    def equity():
+        return account.cash + sum(p.quantity * engine.marks.get(s, 0.0) for s, p in account.positions.items())
+    return equity
+
+
+compliance_engine = ComplianceEngine()
+
+compliance_bp = Blueprint('compliance', __name__)
+
+
+@compliance_bp.route('/<user_id>', methods=['GET'])
+@user_route
+def get_compliance_summary(user_id):
+    """Status, active rules and current rolling-window counts"""
+    return jsonify({'success': True, 'compliance': compliance_engine.summary(user_id)})
+
+
+@compliance_bp.route('/<user_id>/status', methods=['PUT'])
+@user_route
+def set_compliance_status(user_id):
+    """Set the user's immigration status (F-1, J-1, H-1B, Other)"""
+    try:
+        compliance_engine.set_status(user_id, (request.get_json() or {}).get('status'))
+        return jsonify({'success': True, 'compliance': compliance_engine.summary(user_id)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@compliance_bp.route('/check', methods=['POST'])
+def check_trade():
+    """Dry-run a proposed trade against the caller's rules"""
+    data = request.get_json() or {}
+    user_id, error = authorize_user(data.get('user_id'))
+    if error:
+        return error
+    if not user_id or not data.get('symbol') or data.get('side') not in ('buy', 'sell'):
+        return jsonify({'success': False, 'error': 'user_id, symbol and side are required'}), 400
+    try:
+        trade = (user_id, data['symbol'].upper(), data['side'], float(data.get('quantity', 0)), float(data.get('price', 0)))
+        engine = compliance_engine.engine
+        if engine is None:
+            decision, violations = compliance_engine.evaluate(*trade)
+        else:
+            # Same view of the account as the engine's own pre-trade check, and
+            # under its lock so fills cannot move the windows mid-evaluation
+            account = engine.account(user_id)
+            with engine._lock:
+                decision, violations = compliance_engine.evaluate(
+                    *trade, account=account, equity=account_equity(engine, account)
+                )
+        return jsonify({'success': True, 'decision': decision, 'violations': [v._asdict() for v in violations]})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
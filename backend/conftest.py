@@ -0,0 +1,4 @@
+import os
+
+# User routes require a signing secret; tests sign their own tokens with this one
+os.environ.setdefault('AUTH_TOKEN_SECRET', 'test-secret')
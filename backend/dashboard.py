@@ -0,0 +1,310 @@
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify
+
+from auth import authorize_user, user_route
+from backtest import run_backtest
+from categorize import CATEGORIES, categorize_merchant
+from database import get_database
+from price_store import price_store
+from search import parse_query, min_matched, matching_items
+from serialization import json_response, parse_fields, projection
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# Returned for search hits unless ?fields= asks for others
+SEARCH_FIELDS = ('_id', 'company_name', 'total_amount', 'confidence', 'purchase_date', 'line_items', 'metadata.ticker')
+
+def parse_date_param(value):
+    """Parse a YYYY-MM-DD query parameter into a UTC datetime"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+@dashboard_bp.route('/dashboard/receipts/<user_id>', methods=['GET'])
+@user_route
+def get_user_receipts(user_id):
+    """Get all receipts for a user"""
+    try:
+        page = int(request.args.get('page', 1))
+        limit = int(request.args.get('limit', 20))
+        skip = (page - 1) * limit
+        
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+        
+        receipts = get_database().get_user_receipts(user_id, limit=limit, skip=skip, projection=projection(fields))
+        
+        return json_response({
+            'success': True,
+            'receipts': receipts,
+            'page': page,
+            'limit': limit
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/dashboard/search/<user_id>', methods=['GET'])
+@user_route
+def search_receipts(user_id):
+    """Ranked receipt search over merchant, line items and OCR text (?q=, optional ?start=&end=, ?page=&limit=)"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        limit = min(100, max(1, int(request.args.get('limit', 20))))
+        
+        try:
+            words, terms = parse_query(request.args.get('q', ''))
+            fields = parse_fields(request.args.get('fields')) or SEARCH_FIELDS
+            start_date = parse_date_param(request.args.get('start'))
+            end_date = parse_date_param(request.args.get('end'))
+        except ValueError as e:
+            return json_response({'success': False, 'error': str(e)}, 400)
+        
+        # One extra row tells whether there is a next page without counting every match
+        receipts = get_database().search_receipts(
+            user_id, terms, min_matched(terms), projection(fields),
+            start_date=start_date, end_date=end_date, limit=limit + 1, skip=(page - 1) * limit
+        )
+        has_more = len(receipts) > limit
+        receipts = receipts[:limit]
+        for receipt in receipts:
+            receipt['score'] = round(receipt.pop('matched_terms') / len(terms), 3)
+            if 'line_items' in receipt:
+                receipt['matched_items'] = matching_items(receipt['line_items'], words)
+        
+        return json_response({
+            'success': True,
+            'receipts': receipts,
+            'page': page,
+            'limit': limit,
+            'has_more': has_more
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/dashboard/stats/<user_id>', methods=['GET'])
+@user_route
+def get_user_stats(user_id):
+    """Get dashboard statistics for a user"""
+    try:
+        stats = get_database().get_user_stats(user_id)
+        
+        if stats is None:
+            return json_response({
+                'success': False,
+                'error': 'Failed to get user statistics'
+            }, 500)
+        
+        return json_response({
+            'success': True,
+            'stats': stats
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/dashboard/companies/<user_id>', methods=['GET'])
+@user_route
+def get_company_breakdown(user_id):
+    """Get spending breakdown by company"""
+    try:
+        companies = get_database().get_company_breakdown(user_id)
+        
+        return json_response({
+            'success': True,
+            'companies': companies
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/dashboard/categories/<user_id>', methods=['GET'])
+@user_route
+def get_category_breakdown(user_id):
+    """Get spending breakdown by category (optional ?start=&end=)"""
+    try:
+        try:
+            start_date = parse_date_param(request.args.get('start'))
+            end_date = parse_date_param(request.args.get('end'))
+        except ValueError:
+            return json_response({'success': False, 'error': 'Dates must be YYYY-MM-DD'}, 400)
+        
+        return json_response({
+            'success': True,
+            'categories': get_database().get_category_breakdown(user_id, start_date=start_date, end_date=end_date)
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/dashboard/monthly/<user_id>', methods=['GET'])
+@user_route
+def get_monthly_spending(user_id):
+    """Get monthly spending trends (last N months, or a custom start/end window)"""
+    try:
+        try:
+            start_date = parse_date_param(request.args.get('start'))
+            end_date = parse_date_param(request.args.get('end'))
+            months = max(1, int(request.args.get('months', 12)))
+        except ValueError:
+            return json_response({'success': False, 'error': 'Dates must be YYYY-MM-DD and months a number'}, 400)
+        
+        if start_date or end_date:
+            monthly_data = get_database().get_spending_range(user_id, start_date=start_date, end_date=end_date)
+        else:
+            monthly_data = get_database().get_monthly_spending(user_id, months=months)
+        
+        return json_response({
+            'success': True,
+            'monthly_data': monthly_data
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/analytics/backtest/<user_id>', methods=['GET'])
+@user_route
+def get_backtest(user_id):
+    """What the user's spending at listed companies would be worth had it bought their stock"""
+    try:
+        try:
+            start_date = parse_date_param(request.args.get('start'))
+            end_date = parse_date_param(request.args.get('end'))
+            max_points = max(2, int(request.args.get('points', 250)))
+        except ValueError:
+            return json_response({'success': False, 'error': 'Dates must be YYYY-MM-DD and points a number'}, 400)
+        purchases = get_database().get_ticker_purchases(user_id, start_date=start_date, end_date=end_date)
+        
+        backtest = run_backtest(
+            purchases,
+            price_store.closes,
+            end_date=end_date,
+            max_points=max_points
+        )
+        
+        return json_response({
+            'success': True,
+            'backtest': backtest
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@dashboard_bp.route('/receipts/<receipt_id>', methods=['DELETE'])
+def delete_receipt(receipt_id):
+    """Delete a receipt"""
+    try:
+        user_id, error = authorize_user(request.args.get('user_id'))
+        if error:
+            return error
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'user_id is required'
+            }), 400
+        
+        success = get_database().delete_receipt(receipt_id, user_id)
+        
+        return jsonify({
+            'success': success,
+            'message': 'Receipt deleted successfully' if success else 'Failed to delete receipt'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@dashboard_bp.route('/receipts/<receipt_id>', methods=['PUT'])
+def update_receipt(receipt_id):
+    """Update a receipt (manual correction)"""
+    try:
+        data = request.get_json()
+        user_id, error = authorize_user(data.get('user_id'))
+        if error:
+            return error
+        
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'error': 'user_id is required'
+            }), 400
+        
+        # Extract updatable fields
+        updates = {}
+        if 'company_name' in data:
+            updates['company_name'] = data['company_name']
+        if 'category' in data:
+            if data['category'] not in CATEGORIES:
+                return jsonify({
+                    'success': False,
+                    'error': f"category must be one of: {', '.join(CATEGORIES)}"
+                }), 400
+            updates['category'] = data['category']
+            updates['metadata.corrected_category'] = True
+        elif 'company_name' in updates:
+            # A corrected merchant name is categorised again unless the user also picked a category
+            match = categorize_merchant(updates['company_name'])
+            updates['category'] = match.category
+            updates['metadata.parent_ticker'] = match.parent_ticker
+            updates['metadata.parent_name'] = match.parent_name
+        if 'total_amount' in data:
+            updates['total_amount'] = float(data['total_amount'])
+        if 'confidence' in data:
+            updates['confidence'] = data['confidence']
+        if data.get('purchase_date'):
+            updates['purchase_date'] = parse_date_param(data['purchase_date'])
+        
+        success = get_database().update_receipt(receipt_id, user_id, updates)
+        
+        return jsonify({
+            'success': success,
+            'message': 'Receipt updated successfully' if success else 'Failed to update receipt'
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@dashboard_bp.route('/stats/ocr-tiers', methods=['GET'])
+def get_ocr_tier_stats():
+    """Manual-correction rate per OCR tier, for tuning the tier thresholds"""
+    try:
+        return json_response({
+            'success': True,
+            'tiers': get_database().get_ocr_tier_stats()
+        })
+        
+    except Exception as e:
+        return json_response({
+            'success': False,
+            'error': str(e)
+        }, 500)
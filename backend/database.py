@@ -1,16 +1,77 @@
+import pymongo
 from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
 from datetime import datetime, timezone
 from bson import ObjectId
 import os
+import logging
+import time
+import threading
 from dotenv import load_dotenv
+from breaker import CLOSED, CircuitBreaker
+from observability import DB_OPERATION_SECONDS, DB_ERRORS_TOTAL
+from search import search_terms
+from spool import WriteSpool
+from trending import TrendTracker
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+# Documents per cursor round trip when streaming exports
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+# Driver timeouts; MONGO_TIMEOUT_MS overrides the local (5 s) and Atlas (15 s) defaults
+MONGO_TIMEOUT_MS = int(os.getenv('MONGO_TIMEOUT_MS', 0))
+# Connection failures within DB_BREAKER_WINDOW seconds that open the circuit
+DB_BREAKER_THRESHOLD = int(os.getenv('DB_BREAKER_THRESHOLD', 5))
+DB_BREAKER_WINDOW = float(os.getenv('DB_BREAKER_WINDOW', 30))
+DB_PROBE_INTERVAL = float(os.getenv('DB_PROBE_INTERVAL', 5))
+# Health pings are bounded by PING_TIMEOUT and reused for HEALTH_CACHE_SECONDS
+PING_TIMEOUT = float(os.getenv('DB_PING_TIMEOUT', 2))
+HEALTH_CACHE_SECONDS = float(os.getenv('DB_HEALTH_CACHE_SECONDS', 5))
+# Scans that cannot be saved are spooled here until the database is back; empty disables
+SPOOL_DIR = os.getenv('DB_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'spool'))
+
+# Seconds to wait before retrying index creation after it failed
+INDEX_RETRY_SECONDS = 30
+
+# Fields whose manual edits mean the OCR result was wrong
+CORRECTABLE_FIELDS = ('company_name', 'total_amount', 'purchase_date')
+
+def month_bucket(date):
+    """Return the yyyymm bucket key for a datetime (e.g. 202409)"""
+    return date.year * 100 + date.month
+
+def months_back_bucket(months, now=None):
+    """Return the bucket key of the first month in a trailing window of `months` months"""
+    now = now or datetime.now(timezone.utc)
+    index = now.year * 12 + (now.month - 1) - (max(months, 1) - 1)
+    return (index // 12) * 100 + (index % 12) + 1
+
 class ReceiptDatabase:
-    def __init__(self):
+    def __init__(self, client=None, database_name=None):
         self.mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-        self.database_name = os.getenv('DATABASE_NAME', 'receipt_scanner')
+        self.database_name = database_name or os.getenv('DATABASE_NAME', 'receipt_scanner')
         self.collection_name = 'scanned_receipts'
+        self._indexes_ready = False
+        self._indexes_retry_at = 0.0
+        self._indexes_lock = threading.Lock()
+        self.breaker = CircuitBreaker(
+            'mongodb', self.ping, threshold=DB_BREAKER_THRESHOLD, window=DB_BREAKER_WINDOW,
+            probe_interval=DB_PROBE_INTERVAL, on_close=[self.replay_spool]
+        )
+        self.spool = WriteSpool(SPOOL_DIR, self.collection_name) if SPOOL_DIR else None
+        self._health = None
+        self._health_lock = threading.Lock()
+        
+        if client is not None:
+            # Pre-built client (benchmarks, mongomock)
+            self.client = client
+            self.db = self.client[self.database_name]
+            self.collection = self.db[self.collection_name]
+            self.trends = TrendTracker(self.db)
+            return
         
         try:
             # Check if using local or Atlas MongoDB
@@ -18,14 +79,14 @@ class ReceiptDatabase:
                 # Local MongoDB connection (no SSL)
                 self.client = MongoClient(
                     self.mongo_uri,
-                    serverSelectionTimeoutMS=5000,
-                    connectTimeoutMS=5000,
-                    socketTimeoutMS=5000
+                    serverSelectionTimeoutMS=MONGO_TIMEOUT_MS or 5000,
+                    connectTimeoutMS=MONGO_TIMEOUT_MS or 5000,
+                    socketTimeoutMS=MONGO_TIMEOUT_MS or 5000
                 )
-                print("Connecting to local MongoDB...")
+                log.info("Connecting to local MongoDB...")
             else:
                 # MongoDB Atlas connection with SSL (Python 3.13 compatible)
-                print("Attempting MongoDB Atlas connection...")
+                log.info("Attempting MongoDB Atlas connection...")
                 try:
                     # Try with relaxed SSL config for Python 3.13 compatibility
                     self.client = MongoClient(
@@ -33,97 +94,297 @@ class ReceiptDatabase:
                         tls=True,
                         tlsAllowInvalidCertificates=True,
                         tlsInsecure=True,
-                        serverSelectionTimeoutMS=15000,
-                        connectTimeoutMS=15000,
-                        socketTimeoutMS=15000
+                        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS or 15000,
+                        connectTimeoutMS=MONGO_TIMEOUT_MS or 15000,
+                        socketTimeoutMS=MONGO_TIMEOUT_MS or 15000
                     )
-                    print("Using relaxed SSL configuration...")
+                    log.info("Using relaxed SSL configuration...")
                 except Exception as ssl_error:
-                    print(f"Relaxed SSL failed: {str(ssl_error)[:100]}...")
+                    log.warning("Relaxed SSL failed: %s...", str(ssl_error)[:100])
                     # Fallback to minimal configuration
                     try:
                         self.client = MongoClient(
                             self.mongo_uri,
-                            serverSelectionTimeoutMS=10000
+                            serverSelectionTimeoutMS=MONGO_TIMEOUT_MS or 10000
                         )
-                        print("Using minimal Atlas configuration...")
+                        log.info("Using minimal Atlas configuration...")
                     except Exception as fallback_error:
-                        print(f"All Atlas connection attempts failed: {str(fallback_error)[:100]}...")
+                        log.error("All Atlas connection attempts failed: %s...", str(fallback_error)[:100])
                         raise fallback_error
             self.db = self.client[self.database_name]
             self.collection = self.db[self.collection_name]
             
-            print("MongoDB client initialized (connection will be tested on first use)")
+            self.trends = TrendTracker(self.db)
+            log.info("MongoDB client initialized (connection will be tested on first use)")
             
             # Create indexes for better performance (will be done on first use)
             # self.create_indexes()
             
         except Exception as e:
-            print(f"MongoDB connection failed: {e}")
-            print("Running without database functionality")
+            log.error("MongoDB connection failed: %s", e)
+            log.warning("Running without database functionality")
             self.client = None
+            self.trends = TrendTracker(None)
     
+    def available(self):
+        """True when a client is configured and the circuit breaker lets calls through"""
+        return self.client is not None and self.breaker.allow()
+
+    def _record_error(self, method, error):
+        DB_ERRORS_TOTAL.inc(method=method)
+        if isinstance(error, ConnectionFailure):
+            self.breaker.record_failure()
+
+    def ping(self, timeout=PING_TIMEOUT):
+        """Round trip to the server, bounded by `timeout` seconds including server selection"""
+        with pymongo.timeout(timeout):
+            self.client.admin.command('ping')
+
+    def health(self, max_age=HEALTH_CACHE_SECONDS):
+        """Database status from a real ping, reused for `max_age` seconds so probes stay cheap"""
+        if self.client is None:
+            return {'status': 'disconnected'}
+        if self.breaker.state != CLOSED:
+            health = {'status': 'unavailable', 'circuit': self.breaker.status()}
+        else:
+            health = self._health
+            if (health is None or time.monotonic() - health['checked'] > max_age) \
+                    and self._health_lock.acquire(blocking=False):
+                # One caller pings; the others keep answering from the previous result
+                try:
+                    start = time.perf_counter()
+                    try:
+                        self.ping()
+                        health = {'status': 'connected', 'ping_ms': round((time.perf_counter() - start) * 1000, 1)}
+                    except Exception as e:
+                        log.warning("Database ping failed: %s", e)
+                        self.breaker.record_failure()
+                        health = {'status': 'unavailable', 'error': str(e)[:200]}
+                    health['checked'] = time.monotonic()
+                    self._health = health
+                finally:
+                    self._health_lock.release()
+            elif health is None:
+                health = {'status': 'connected'}
+            health = {key: value for key, value in health.items() if key != 'checked'}
+            health['circuit'] = self.breaker.status()
+        if self.spool is not None:
+            health['spooled'] = self.spool.pending
+        return health
+
+    def replay_spool(self):
+        """Bulk-insert scans spooled while the database was unreachable"""
+        if self.spool is None or not self.available():
+            return 0
+        try:
+            return self.spool.replay(self.collection)
+        except Exception as e:
+            self._record_error('replay_spool', e)
+            log.error("Spool replay failed, will retry on next recovery: %s", e)
+            return 0
+
+    def _record_trend(self, receipt_document, receipt_id):
+        """Count a saved (or spooled) receipt towards the merchant trends; passes its id through"""
+        if receipt_id:
+            metadata = receipt_document['metadata']
+            self.trends.record(
+                receipt_document['user_id'], receipt_document['company_name'],
+                metadata.get('ticker') or metadata.get('parent_ticker'),
+                receipt_document['total_amount'], receipt_document['purchase_date']
+            )
+        return receipt_id
+
+    def _spool_receipt(self, receipt_document):
+        """Keep a scan locally while the database is unreachable; its id is valid once replayed"""
+        if self.spool is None:
+            return None
+        try:
+            self.spool.append(receipt_document)
+            log.warning("Database unavailable; spooled receipt %s", receipt_document['_id'])
+            return str(receipt_document['_id'])
+        except Exception as e:
+            log.error("Failed to spool receipt: %s", e)
+            return None
+
     def create_indexes(self):
-        """Create database indexes for better query performance"""
+        """Create database indexes for better query performance; returns True once they all exist"""
         try:
-            self.collection.create_index([("user_id", 1)])
-            self.collection.create_index([("scan_date", -1)])
+            self.collection.create_index([("user_id", 1), ("scan_date", -1)])
+            self.collection.create_index([("user_id", 1), ("month_bucket", -1)])
+            self.collection.create_index([("user_id", 1), ("purchase_date", -1)])
+            # Multikey: an inverted index from trigram to each user's receipts
+            self.collection.create_index([("user_id", 1), ("search_terms", 1)])
             self.collection.create_index([("company_name", 1)])
-            self.collection.create_index([("total_amount", 1)])
             self.collection.create_index([("confidence", 1)])
-            print("Database indexes created")
+            log.info("Database indexes created")
+            return True
         except Exception as e:
-            print(f"Index creation failed: {e}")
+            self._record_error('create_indexes', e)
+            log.warning("Index creation failed, will retry in %ds: %s", INDEX_RETRY_SECONDS, e)
+            return False
+
+    def ensure_indexes(self):
+        """Create indexes once per process, on first use; a failed attempt is retried on a later call"""
+        if self._indexes_ready or time.monotonic() < self._indexes_retry_at or not self.available():
+            return
+        with self._indexes_lock:
+            if self._indexes_ready or time.monotonic() < self._indexes_retry_at:
+                return
+            self._indexes_ready = self.create_indexes()
+            if not self._indexes_ready:
+                self._indexes_retry_at = time.monotonic() + INDEX_RETRY_SECONDS
+                return
+        if self.spool is not None and self.spool.files():
+            # Scans spooled by a process that exited before the database came back
+            threading.Thread(target=self.replay_spool, name='spool-replay', daemon=True).start()
+
+    def backfill_month_buckets(self):
+        """Populate purchase_date/month_bucket on receipts saved before they existed"""
+        if not self.available():
+            return 0
+
+        try:
+            result = self.collection.update_many(
+                {'month_bucket': {'$exists': False}},
+                [
+                    {'$set': {'purchase_date': {'$ifNull': ['$purchase_date', '$scan_date']}}},
+                    {'$set': {'month_bucket': {'$add': [
+                        {'$multiply': [{'$year': '$purchase_date'}, 100]},
+                        {'$month': '$purchase_date'}
+                    ]}}}
+                ]
+            )
+            log.info("Backfilled month buckets on %d receipts", result.modified_count)
+            return result.modified_count
+
+        except Exception as e:
+            log.error("Failed to backfill month buckets: %s", e)
+            return 0
     
-    def save_receipt_scan(self, user_id, company_name, total_amount, confidence, extracted_text, scan_metadata=None):
-        """Save a receipt scan to database"""
+    @DB_OPERATION_SECONDS.time(method='save_receipt_scan')
+    def save_receipt_scan(self, user_id, company_name, total_amount, confidence, extracted_text, scan_metadata=None, purchase_date=None, line_items=None, category=None):
+        """Save a receipt scan to database, or to the local spool while the database is unreachable"""
         if not self.client:
             return None
         
         try:
+            scan_date = datetime.now(timezone.utc)
+            # Fall back to the scan time when no date could be read off the receipt
+            purchase_date = purchase_date or scan_date
             receipt_document = {
+                # Assigned here so a spooled receipt keeps its id when replayed
+                '_id': ObjectId(),
                 'user_id': user_id,
                 'company_name': company_name,
+                'category': category or 'other',
                 'total_amount': float(total_amount),
                 'confidence': confidence,
                 'extracted_text': extracted_text,
-                'scan_date': datetime.now(timezone.utc),
+                'line_items': line_items or [],
+                'search_terms': search_terms(company_name, line_items, extracted_text),
+                'scan_date': scan_date,
+                'purchase_date': purchase_date,
+                'month_bucket': month_bucket(purchase_date),
                 'metadata': scan_metadata or {},
                 'created_at': datetime.now(timezone.utc),
                 'updated_at': datetime.now(timezone.utc)
             }
             
+            if not self.available():
+                return self._record_trend(receipt_document, self._spool_receipt(receipt_document))
+            self.ensure_indexes()
+            
             result = self.collection.insert_one(receipt_document)
-            print(f" Receipt saved with ID: {result.inserted_id}")
-            return str(result.inserted_id)
+            log.debug("Receipt saved with ID: %s", result.inserted_id)
+            return self._record_trend(receipt_document, str(result.inserted_id))
             
+        except ConnectionFailure as e:
+            self._record_error('save_receipt_scan', e)
+            log.error("Failed to save receipt: %s", e)
+            return self._record_trend(receipt_document, self._spool_receipt(receipt_document))
         except Exception as e:
-            print(f" Failed to save receipt: {e}")
+            self._record_error('save_receipt_scan', e)
+            log.error("Failed to save receipt: %s", e)
             return None
     
-    def get_user_receipts(self, user_id, limit=50, skip=0):
-        """Get all receipts for a user with pagination"""
-        if not self.client:
+    @DB_OPERATION_SECONDS.time(method='get_user_receipts')
+    def get_user_receipts(self, user_id, limit=50, skip=0, projection=None):
+        """Get all receipts for a user with pagination (ObjectIds are left for the serializer)"""
+        if not self.available():
             return []
         
         try:
-            receipts = list(self.collection.find(
-                {'user_id': user_id}
+            # search_terms only serve the search index and are never returned
+            return list(self.collection.find(
+                {'user_id': user_id}, projection or {'search_terms': 0}
             ).sort('scan_date', -1).skip(skip).limit(limit))
             
-            # Convert ObjectId to string for JSON serialization
-            for receipt in receipts:
-                receipt['_id'] = str(receipt['_id'])
+        except Exception as e:
+            self._record_error('get_user_receipts', e)
+            log.error("Failed to get user receipts: %s", e)
+            return []
+    
+    def iter_user_receipts(self, user_id, start_date=None, end_date=None, projection=None, batch_size=EXPORT_BATCH_SIZE):
+        """Yield a user's receipts oldest first from a server-side cursor, `batch_size` documents per round trip"""
+        if not self.available():
+            return
+        
+        query = {'user_id': user_id}
+        if start_date or end_date:
+            # Range on the (user_id, purchase_date) index
+            query['purchase_date'] = {}
+            if start_date:
+                query['purchase_date']['$gte'] = start_date
+            if end_date:
+                query['purchase_date']['$lt'] = end_date
+        
+        cursor = self.collection.find(query, projection, batch_size=batch_size).sort('purchase_date', 1)
+        try:
+            yield from cursor
+        except Exception as e:
+            self._record_error('iter_user_receipts', e)
+            log.error("Receipt export cursor failed: %s", e)
+            raise
+        finally:
+            cursor.close()
+    
+    @DB_OPERATION_SECONDS.time(method='search_receipts')
+    def search_receipts(self, user_id, terms, min_matched, fields, start_date=None, end_date=None, limit=20, skip=0):
+        """Receipts sharing at least `min_matched` trigrams with the query (best match, then newest first)"""
+        if not self.available():
+            return []
+        
+        try:
+            # Candidates come from the (user_id, search_terms) multikey index
+            match = {'user_id': user_id, 'search_terms': {'$in': terms}}
+            if start_date or end_date:
+                match['purchase_date'] = {}
+                if start_date:
+                    match['purchase_date']['$gte'] = start_date
+                if end_date:
+                    match['purchase_date']['$lt'] = end_date
             
-            return receipts
+            return list(self.collection.aggregate([
+                {'$match': match},
+                # Count the query's trigrams present on each candidate
+                {'$project': {**fields, 'purchase_date': 1, 'matched_terms': {'$size': {
+                    '$filter': {'input': terms, 'cond': {'$in': ['$$this', '$search_terms']}}
+                }}}},
+                {'$match': {'matched_terms': {'$gte': min_matched}}},
+                {'$sort': {'matched_terms': -1, 'purchase_date': -1, '_id': -1}},
+                {'$skip': skip},
+                {'$limit': limit}
+            ]))
             
         except Exception as e:
-            print(f"Failed to get user receipts: {e}")
+            self._record_error('search_receipts', e)
+            log.error("Failed to search receipts: %s", e)
             return []
     
+    @DB_OPERATION_SECONDS.time(method='get_user_stats')
     def get_user_stats(self, user_id):
         """Get dashboard statistics for a user"""
-        if not self.client:
+        if not self.available():
             return None
         
         try:
@@ -168,12 +429,14 @@ class ReceiptDatabase:
                 }
                 
         except Exception as e:
-            print(f" Failed to get user stats: {e}")
+            self._record_error('get_user_stats', e)
+            log.error("Failed to get user stats: %s", e)
             return None
     
+    @DB_OPERATION_SECONDS.time(method='get_company_breakdown')
     def get_company_breakdown(self, user_id):
         """Get spending breakdown by company"""
-        if not self.client:
+        if not self.available():
             return []
         
         try:
@@ -199,28 +462,115 @@ class ReceiptDatabase:
             return result
             
         except Exception as e:
-            print(f" Failed to get company breakdown: {e}")
+            self._record_error('get_company_breakdown', e)
+            log.error("Failed to get company breakdown: %s", e)
+            return []
+    
+    @DB_OPERATION_SECONDS.time(method='get_category_breakdown')
+    def get_category_breakdown(self, user_id, start_date=None, end_date=None):
+        """Spending per category, largest first"""
+        if not self.available():
+            return []
+        
+        try:
+            match = {'user_id': user_id}
+            if start_date or end_date:
+                match['purchase_date'] = {}
+                if start_date:
+                    match['purchase_date']['$gte'] = start_date
+                if end_date:
+                    match['purchase_date']['$lt'] = end_date
+            
+            result = list(self.collection.aggregate([
+                {'$match': match},
+                {'$group': {
+                    # Receipts saved before categories existed count as 'other' until backfilled
+                    '_id': {'$ifNull': ['$category', 'other']},
+                    'total_spent': {'$sum': '$total_amount'},
+                    'receipt_count': {'$sum': 1},
+                    'merchant_count': {'$addToSet': '$company_name'}
+                }},
+                {'$sort': {'total_spent': -1}}
+            ]))
+            
+            for item in result:
+                item['category'] = item.pop('_id')
+                item['merchant_count'] = len(item['merchant_count'])
+                item['total_spent'] = round(item['total_spent'], 2)
+            
+            return result
+            
+        except Exception as e:
+            self._record_error('get_category_breakdown', e)
+            log.error("Failed to get category breakdown: %s", e)
             return []
     
+    @DB_OPERATION_SECONDS.time(method='get_ticker_purchases')
+    def get_ticker_purchases(self, user_id, start_date=None, end_date=None):
+        """Get (ticker, purchase_date, amount) for receipts from listed companies"""
+        if not self.available():
+            return []
+        
+        try:
+            query = {'user_id': user_id, 'metadata.ticker': {'$type': 'string'}}
+            if start_date or end_date:
+                query['purchase_date'] = {}
+                if start_date:
+                    query['purchase_date']['$gte'] = start_date
+                if end_date:
+                    query['purchase_date']['$lt'] = end_date
+            
+            cursor = self.collection.find(query, {
+                '_id': 0, 'metadata.ticker': 1, 'purchase_date': 1, 'scan_date': 1, 'total_amount': 1
+            })
+            return [
+                (doc['metadata']['ticker'], doc.get('purchase_date') or doc['scan_date'], doc['total_amount'])
+                for doc in cursor
+            ]
+            
+        except Exception as e:
+            self._record_error('get_ticker_purchases', e)
+            log.error("Failed to get ticker purchases: %s", e)
+            return []
+    
+    @DB_OPERATION_SECONDS.time(method='get_monthly_spending')
     def get_monthly_spending(self, user_id, months=12):
-        """Get monthly spending trends"""
-        if not self.client:
+        """Get monthly spending trends for the last `months` calendar months"""
+        return self._spending_by_bucket({
+            'user_id': user_id,
+            'month_bucket': {'$gte': months_back_bucket(months)}
+        })
+    
+    @DB_OPERATION_SECONDS.time(method='get_spending_range')
+    def get_spending_range(self, user_id, start_date=None, end_date=None):
+        """Get monthly spending trends for purchases in [start_date, end_date)"""
+        match = {'user_id': user_id}
+        date_range = {}
+        if start_date:
+            date_range['$gte'] = start_date
+        if end_date:
+            date_range['$lt'] = end_date
+        if date_range:
+            match['purchase_date'] = date_range
+        return self._spending_by_bucket(match)
+    
+    def _spending_by_bucket(self, match):
+        """Group matching receipts by their precomputed month bucket"""
+        if not self.available():
             return []
         
+        self.ensure_indexes()
+        
         try:
             pipeline = [
-                {'$match': {'user_id': user_id}},
+                {'$match': match},
                 {'$group': {
-                    '_id': {
-                        'year': {'$year': '$scan_date'},
-                        'month': {'$month': '$scan_date'}
-                    },
+                    '_id': '$month_bucket',
                     'total_spent': {'$sum': '$total_amount'},
                     'receipt_count': {'$sum': 1},
                     'avg_amount': {'$avg': '$total_amount'}
                 }},
-                {'$sort': {'_id.year': -1, '_id.month': -1}},
-                {'$limit': months}
+                {'$sort': {'_id': -1}}
             ]
             
             result = list(self.collection.aggregate(pipeline))
@@ -228,9 +578,11 @@ class ReceiptDatabase:
             # Format the results
             formatted_results = []
             for item in result:
+                if item['_id'] is None:
+                    continue
                 formatted_results.append({
-                    'year': item['_id']['year'],
-                    'month': item['_id']['month'],
+                    'year': item['_id'] // 100,
+                    'month': item['_id'] % 100,
                     'total_spent': item['total_spent'],
                     'receipt_count': item['receipt_count'],
                     'avg_amount': item['avg_amount']
@@ -239,12 +591,47 @@ class ReceiptDatabase:
             return formatted_results
             
         except Exception as e:
-            print(f" Failed to get monthly spending: {e}")
+            self._record_error('get_monthly_spending', e)
+            log.error("Failed to get monthly spending: %s", e)
             return []
     
+    @DB_OPERATION_SECONDS.time(method='get_ocr_tier_stats')
+    def get_ocr_tier_stats(self):
+        """Scan and manual-correction counts per OCR tier"""
+        if not self.available():
+            return []
+        
+        try:
+            pipeline = [
+                {'$match': {'metadata.ocr_tier': {'$exists': True}}},
+                {'$group': {
+                    '_id': {'tier': '$metadata.ocr_tier', 'initial_tier': '$metadata.ocr_initial_tier'},
+                    'scans': {'$sum': 1},
+                    'corrected': {'$sum': {'$cond': ['$metadata.manually_corrected', 1, 0]}}
+                }},
+                {'$sort': {'_id.tier': 1, '_id.initial_tier': 1}}
+            ]
+            
+            result = []
+            for item in self.collection.aggregate(pipeline):
+                result.append({
+                    'tier': item['_id']['tier'],
+                    'initial_tier': item['_id'].get('initial_tier'),
+                    'scans': item['scans'],
+                    'corrected': item['corrected'],
+                    'correction_rate': item['corrected'] / item['scans'] if item['scans'] else 0.0
+                })
+            return result
+            
+        except Exception as e:
+            self._record_error('get_ocr_tier_stats', e)
+            log.error("Failed to get OCR tier stats: %s", e)
+            return []
+    
+    @DB_OPERATION_SECONDS.time(method='delete_receipt')
     def delete_receipt(self, receipt_id, user_id):
         """Delete a specific receipt (with user verification)"""
-        if not self.client:
+        if not self.available():
             return False
         
         try:
@@ -256,16 +643,32 @@ class ReceiptDatabase:
             return result.deleted_count > 0
             
         except Exception as e:
-            print(f" Failed to delete receipt: {e}")
+            self._record_error('delete_receipt', e)
+            log.error("Failed to delete receipt: %s", e)
             return False
     
+    @DB_OPERATION_SECONDS.time(method='update_receipt')
     def update_receipt(self, receipt_id, user_id, updates):
         """Update a receipt (user can manually correct OCR errors)"""
-        if not self.client:
+        if not self.available():
             return False
         
         try:
             updates['updated_at'] = datetime.now(timezone.utc)
+            corrected = [field for field in CORRECTABLE_FIELDS if field in updates]
+            if corrected:
+                updates['metadata.manually_corrected'] = True
+                updates['metadata.corrected_fields'] = corrected
+            if 'purchase_date' in updates:
+                updates['month_bucket'] = month_bucket(updates['purchase_date'])
+            if 'company_name' in updates:
+                current = self.collection.find_one(
+                    {'_id': ObjectId(receipt_id), 'user_id': user_id}, {'line_items': 1, 'extracted_text': 1}
+                )
+                if current:
+                    updates['search_terms'] = search_terms(
+                        updates['company_name'], current.get('line_items'), current.get('extracted_text')
+                    )
             
             result = self.collection.update_one(
                 {'_id': ObjectId(receipt_id), 'user_id': user_id},
@@ -275,5 +678,18 @@ class ReceiptDatabase:
             return result.modified_count > 0
             
         except Exception as e:
-            print(f" Failed to update receipt: {e}")
-            return False
\ No newline at end of file
+            self._record_error('update_receipt', e)
+            log.error("Failed to update receipt: %s", e)
+            return False
+
+_shared_database = None
+_shared_lock = threading.Lock()
+
+def get_database():
+    """The process-wide ReceiptDatabase (one MongoClient and pool), created on first use"""
+    global _shared_database
+    if _shared_database is None:
+        with _shared_lock:
+            if _shared_database is None:
+                _shared_database = ReceiptDatabase()
+    return _shared_database
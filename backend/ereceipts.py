@@ -0,0 +1,253 @@
+"""
+Text-layer extraction for e-receipts (PDF, .eml and HTML).
+
+Digital receipts already carry their text, so it is read directly and
+handed to the same merchant/total/date parsers as OCR output. Only pages
+or attachments without any text are returned as images for OCR.
+"""
+import email
+import email.policy
+import email.utils
+import io
+import logging
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf
+    except ImportError:
+        pymupdf = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+log = logging.getLogger(__name__)
+
+MAX_PAGES = int(os.getenv('ERECEIPT_MAX_PAGES', 10))
+# Pages with less text than this are treated as scanned images
+MIN_PAGE_TEXT = 20
+RASTER_DPI = 200
+
+# text: extracted text; images: encoded images (PNG/JPEG) that still need OCR;
+# pages: pages/parts read; sent_on: the e-mail's send date (the sender's calendar day at UTC
+# midnight, like receipt_scan.find_purchase_date), used when the body prints no date
+ExtractedDocument = namedtuple('ExtractedDocument', 'text images pages sent_on')
+
+class DocumentError(ValueError):
+    """The upload could not be read as the document type it claims to be"""
+
+class PdfSupportMissing(RuntimeError):
+    """Neither PyMuPDF nor pypdf is installed"""
+
+AMOUNT = re.compile(r'\d\.\d{2}\b')
+
+EMAIL_HEADER = re.compile(
+    rb'^(?:received|return-path|delivered-to|mime-version|message-id|from|to|subject|date):', re.IGNORECASE
+)
+
+def detect_kind(data, file_name='', content_type=None):
+    """Classify an upload as 'pdf', 'email', 'html' or 'image' from its bytes, extension and MIME type"""
+    if data[:5] == b'%PDF-':
+        return 'pdf'
+    extension = os.path.splitext((file_name or '').lower())[1]
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if extension == '.eml' or content_type == 'message/rfc822':
+        return 'email'
+    if extension in ('.html', '.htm') or content_type == 'text/html':
+        return 'html'
+    head = data[:512].lstrip().lower()
+    if head.startswith((b'<!doctype html', b'<html')):
+        return 'html'
+    if EMAIL_HEADER.match(head):
+        return 'email'
+    return 'image'
+
+def extract(data, kind):
+    """Return an ExtractedDocument for a 'pdf', 'email' or 'html' upload"""
+    if kind == 'pdf':
+        return extract_pdf(data)
+    if kind == 'email':
+        return extract_email(data)
+    if kind == 'html':
+        return ExtractedDocument(html_to_text(_decode(data)), [], 1, None)
+    raise ValueError(f'Not an e-receipt: {kind}')
+
+# -- PDF ------------------------------------------------------------------
+
+def extract_pdf(data):
+    """Text of every page; pages without a text layer come back as images to OCR"""
+    if pymupdf is not None:
+        return _extract_pdf_pymupdf(data)
+    if pypdf is not None:
+        return _extract_pdf_pypdf(data)
+    raise PdfSupportMissing('PDF e-receipts need the pypdf (or PyMuPDF) package')
+
+def _extract_pdf_pymupdf(data):
+    try:
+        document = pymupdf.open(stream=data, filetype='pdf')
+    except Exception as e:
+        raise DocumentError(f'Could not read PDF: {e}')
+
+    texts, images = [], []
+    with document:
+        pages = min(document.page_count, MAX_PAGES)
+        for index in range(pages):
+            page = document[index]
+            text = page.get_text('text', sort=True)
+            if len(text.strip()) >= MIN_PAGE_TEXT:
+                texts.append(text)
+            else:
+                # Scanned page: render it once at OCR resolution
+                images.append(page.get_pixmap(dpi=RASTER_DPI).tobytes('png'))
+    return ExtractedDocument(_join(texts), images, pages, None)
+
+def _extract_pdf_pypdf(data):
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        page_list = reader.pages[:MAX_PAGES]
+    except Exception as e:
+        raise DocumentError(f'Could not read PDF: {e}')
+
+    texts, images = [], []
+    for page in page_list:
+        text = page.extract_text() or ''
+        if len(text.strip()) >= MIN_PAGE_TEXT:
+            texts.append(text)
+        else:
+            # pypdf cannot rasterise, but scanned pages are normally one embedded image
+            try:
+                images.extend(image.data for image in page.images)
+            except Exception as e:
+                log.warning("Could not extract images from PDF page: %s", e)
+    return ExtractedDocument(_join(texts), images, len(page_list), None)
+
+# -- E-mail ---------------------------------------------------------------
+
+def extract_email(data):
+    """Sender, subject and body text, plus PDF attachments; image attachments only when there is no text"""
+    try:
+        message = email.message_from_bytes(data, policy=email.policy.default)
+    except Exception as e:
+        raise DocumentError(f'Could not read e-mail: {e}')
+
+    texts = []
+    sender = message.get('From')
+    if sender:
+        name, address = email.utils.parseaddr(str(sender))
+        texts.append(name or address)
+    if message.get('Subject'):
+        texts.append(str(message['Subject']))
+    header_lines = len(texts)
+
+    body = message.get_body(preferencelist=('html', 'plain'))
+    if body is not None:
+        content = body.get_content()
+        texts.append(html_to_text(content) if body.get_content_type() == 'text/html' else content)
+
+    images, attached_images, pages = [], [], 1
+    for part in message.iter_attachments():
+        content_type = part.get_content_type()
+        if content_type == 'application/pdf' or (part.get_filename() or '').lower().endswith('.pdf'):
+            try:
+                attachment = extract_pdf(part.get_payload(decode=True))
+            except (DocumentError, PdfSupportMissing) as e:
+                log.warning("Skipping PDF attachment %s: %s", part.get_filename(), e)
+                continue
+            texts.append(attachment.text)
+            images.extend(attachment.images)
+            pages += attachment.pages
+        elif content_type.startswith('image/'):
+            image = part.get_payload(decode=True)
+            if image:
+                attached_images.append(image)
+
+    # Attached photos are only worth OCR when the text has no amounts (otherwise they are logos)
+    if not AMOUNT.search(_join(texts[header_lines:])):
+        images.extend(attached_images)
+
+    sent_on = None
+    if message.get('Date'):
+        try:
+            sent = email.utils.parsedate_to_datetime(str(message['Date']))
+            sent_on = datetime(sent.year, sent.month, sent.day, tzinfo=timezone.utc)
+        except (TypeError, ValueError):
+            pass
+
+    return ExtractedDocument(_join(texts), images, pages, sent_on)
+
+# -- HTML -----------------------------------------------------------------
+
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'div', 'dl', 'dt', 'dd', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'tbody', 'thead', 'tfoot', 'title', 'tr', 'ul'
+}
+CELL_TAGS = {'td', 'th'}
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg'}
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text with one line per block element and table row"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines = []
+        self.current = []
+        self.skipping = 0
+
+    def _break(self):
+        line = ' '.join(''.join(self.current).split())
+        if line:
+            self.lines.append(line)
+        self.current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self._break()
+        elif tag in CELL_TAGS:
+            self.current.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in BLOCK_TAGS:
+            self._break()
+        elif tag in CELL_TAGS:
+            self.current.append(' ')
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.current.append(data)
+
+    def text(self):
+        self._break()
+        return '\n'.join(self.lines)
+
+def html_to_text(html):
+    """Visible text of an HTML document, one line per block/table row (so 'Total $12.34' stays on one line)"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+# -- helpers --------------------------------------------------------------
+
+def _decode(data):
+    for encoding in ('utf-8', 'cp1252'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('latin-1')
+
+def _join(texts):
+    return '\n'.join(text.strip('\n') for text in texts if text and text.strip())
@@ -0,0 +1,185 @@
+import csv
+import io
+import logging
+from datetime import datetime, timezone
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+from auth import user_route
+from dashboard import parse_date_param
+from database import get_database
+from serialization import dumps
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+log = logging.getLogger(__name__)
+
+# Bytes buffered before a chunk is sent (CSV/JSONL) and rows per Parquet row group
+CHUNK_BYTES = 64 * 1024
+PARQUET_ROW_GROUP = 10000
+
+# (column, receipt field, Parquet type name); `metadata.x` reads nested fields
+EXPORT_COLUMNS = (
+    ('receipt_id', '_id', 'string'),
+    ('purchase_date', 'purchase_date', 'timestamp'),
+    ('scan_date', 'scan_date', 'timestamp'),
+    ('company_name', 'company_name', 'string'),
+    ('category', 'category', 'string'),
+    ('total_amount', 'total_amount', 'float64'),
+    ('confidence', 'confidence', 'string'),
+    ('ticker', 'metadata.ticker', 'string'),
+    ('source', 'metadata.source', 'string'),
+    ('ocr_tier', 'metadata.ocr_tier', 'string'),
+    ('manually_corrected', 'metadata.manually_corrected', 'bool'),
+)
+TEXT_COLUMN = ('extracted_text', 'extracted_text', 'string')
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def export_columns(include_text=False):
+    return EXPORT_COLUMNS + (TEXT_COLUMN,) if include_text else EXPORT_COLUMNS
+
+def export_projection(columns):
+    return {field: 1 for _, field, _ in columns}
+
+def _utc(value):
+    """pymongo returns naive UTC datetimes"""
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def export_rows(receipts, columns):
+    """Flatten receipt documents into tuples in column order"""
+    for receipt in receipts:
+        row = []
+        for _, field, kind in columns:
+            if field.startswith('metadata.'):
+                value = (receipt.get('metadata') or {}).get(field[9:])
+            else:
+                value = receipt.get(field)
+            if field == '_id' and value is not None:
+                value = str(value)
+            elif kind == 'timestamp':
+                value = _utc(value)
+            elif kind == 'bool':
+                value = bool(value)
+            row.append(value)
+        yield row
+
+def csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in columns])
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+def jsonl_chunks(rows, columns):
+    names = [name for name, _, _ in columns]
+    buffer = bytearray()
+    for row in rows:
+        buffer += dumps(dict(zip(names, row)))
+        buffer += b'\n'
+        if len(buffer) >= CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    yield bytes(buffer)
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever Parquet wrote since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def parquet_chunks(rows, columns, row_group=PARQUET_ROW_GROUP):
+    """One Parquet row group per `row_group` rows, each sent as soon as it is encoded"""
+    types = {'string': pa.string(), 'timestamp': pa.timestamp('ms', tz='UTC'), 'float64': pa.float64(), 'bool': pa.bool_()}
+    schema = pa.schema([(name, types[kind]) for name, _, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+    batch = [[] for _ in columns]
+    for row in rows:
+        for values, value in zip(batch, row):
+            values.append(value)
+        if len(batch[0]) >= row_group:
+            writer.write_table(pa.Table.from_arrays(batch, schema=schema))
+            batch = [[] for _ in columns]
+            yield sink.drain()
+    if batch[0] or sink.tell() == 0:
+        writer.write_table(pa.Table.from_arrays(batch, schema=schema))
+    writer.close()
+    yield sink.drain()
+
+WRITERS = {'csv': csv_chunks, 'jsonl': jsonl_chunks, 'parquet': parquet_chunks}
+
+export_bp = Blueprint('export', __name__)
+
+@export_bp.route('/receipts/<user_id>', methods=['GET'])
+@user_route
+def export_receipts(user_id):
+    """Stream a user's full receipt history: ?format=csv|jsonl|parquet, optional ?start=&end= and ?text=1"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in FORMATS:
+        return jsonify({'success': False, 'error': f"Unsupported format '{export_format}'; use csv, jsonl or parquet"}), 400
+    if export_format == 'parquet' and pq is None:
+        return jsonify({'success': False, 'error': 'Parquet export needs the pyarrow package'}), 503
+
+    try:
+        start_date = parse_date_param(request.args.get('start'))
+        end_date = parse_date_param(request.args.get('end'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    db = get_database()
+    if not db.available():
+        return jsonify({'success': False, 'error': 'Database not available'}), 503
+
+    columns = export_columns(request.args.get('text') in ('1', 'true'))
+    receipts = db.iter_user_receipts(user_id, start_date=start_date, end_date=end_date,
+                                     projection=export_projection(columns))
+
+    def generate():
+        try:
+            yield from WRITERS[export_format](export_rows(receipts, columns), columns)
+        except Exception as e:
+            # Headers are already sent, so a failure can only cut the body short
+            log.error("Receipt export for %s failed mid-stream: %s", user_id, e)
+        finally:
+            receipts.close()
+
+    file_name = f"receipts-{user_id}-{datetime.now(timezone.utc):%Y%m%d}.{export_format}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename="{file_name}"'}
+    )
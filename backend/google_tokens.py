@@ -0,0 +1,149 @@
+import base64
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+DEFAULT_CERTS_MAX_AGE = 3600
+# Unknown key ids force a refetch; cap how often so forged kids can't hammer Google
+MIN_FORCED_REFRESH_INTERVAL = 60
+
+
+def _b64_to_int(value):
+    return int.from_bytes(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)), 'big')
+
+
+def jwks_to_pem(jwks):
+    """Convert a JWKS document ({"keys": [...]}) into {kid: PEM public key}"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+
+    certs = {}
+    for key in jwks.get('keys', []):
+        if key.get('kty') != 'RSA':
+            continue
+        public_key = RSAPublicNumbers(_b64_to_int(key['e']), _b64_to_int(key['n'])).public_key()
+        certs[key['kid']] = public_key.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+    return certs
+
+
+def parse_max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens without a network round trip on the hot path.
+
+    Google's signing certs are fetched over a pooled HTTP session and cached
+    for their Cache-Control max-age; successfully verified tokens are cached
+    (by hash) until they expire. Pass `certs` (PEM map or JWKS) or
+    `certs_file` to verify against a local key set instead of Google.
+    """
+
+    def __init__(self, client_id, certs_url=GOOGLE_CERTS_URL, certs=None, certs_file=None,
+                 session=None, token_cache_size=1024, clock_skew=10):
+        self.client_id = client_id
+        self.certs_url = certs_url
+        self.clock_skew = clock_skew
+        self.token_cache_size = token_cache_size
+
+        self._session = session
+        self._certs = None
+        self._certs_expire_at = 0.0
+        self._certs_fetched_at = float('-inf')
+        self._certs_lock = threading.Lock()
+        self._tokens = OrderedDict()
+        self._tokens_lock = threading.Lock()
+        self._static_certs = False
+
+        if certs_file:
+            with open(certs_file) as f:
+                certs = json.load(f)
+        if certs is not None:
+            self._certs = jwks_to_pem(certs) if 'keys' in certs else dict(certs)
+            self._certs_expire_at = float('inf')
+            self._static_certs = True
+
+    @property
+    def session(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=2, pool_maxsize=10))
+            self._session = session
+        return self._session
+
+    def get_certs(self, force_refresh=False):
+        """Return {kid: PEM}, refreshing from Google when the cached copy has expired
+
+        Forced refreshes within MIN_FORCED_REFRESH_INTERVAL of the last fetch
+        return the cached copy.
+        """
+        if not force_refresh and self._certs is not None and time.time() < self._certs_expire_at:
+            return self._certs
+        if self._static_certs:
+            return self._certs
+
+        with self._certs_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force_refresh and self._certs is not None and time.time() < self._certs_expire_at:
+                return self._certs
+            if force_refresh and self._certs is not None and \
+                    time.time() - self._certs_fetched_at < MIN_FORCED_REFRESH_INTERVAL:
+                return self._certs
+
+            response = self.session.get(self.certs_url, timeout=5)
+            response.raise_for_status()
+            data = response.json()
+            self._certs = jwks_to_pem(data) if 'keys' in data else data
+            self._certs_fetched_at = time.time()
+            self._certs_expire_at = self._certs_fetched_at + parse_max_age(response.headers.get('Cache-Control'))
+            log.debug("Fetched %d Google signing certs", len(self._certs))
+            return self._certs
+
+    def verify(self, token):
+        """Verify a Google ID token and return its claims; raises ValueError if invalid"""
+        cache_key = hashlib.sha256(token.encode()).hexdigest()
+        now = time.time()
+
+        with self._tokens_lock:
+            cached = self._tokens.get(cache_key)
+            if cached is not None:
+                if cached['exp'] > now:
+                    self._tokens.move_to_end(cache_key)
+                    return cached
+                del self._tokens[cache_key]
+
+        from google.auth import jwt
+
+        certs = self.get_certs()
+        kid = jwt.decode_header(token).get('kid')
+        if kid and kid not in certs:
+            # Google rotated its keys before our cached copy expired
+            certs = self.get_certs(force_refresh=True)
+
+        id_info = jwt.decode(token, certs=certs, audience=self.client_id,
+                             clock_skew_in_seconds=self.clock_skew)
+        if id_info.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {id_info.get('iss')}")
+
+        with self._tokens_lock:
+            self._tokens[cache_key] = id_info
+            while len(self._tokens) > self.token_cache_size:
+                self._tokens.popitem(last=False)
+
+        return id_info
@@ -0,0 +1,89 @@
+import os
+
+import cv2
+import numpy as np
+
+# Tier thresholds, kept together so they can be tuned against the
+# tier/correction statistics from ReceiptDatabase.get_ocr_tier_stats()
+TIER_THRESHOLDS = {
+    'cheap_min_blur': 300.0,        # Laplacian variance above this is sharp
+    'cheap_max_noise': 4.0,         # mean |pixel - median3(pixel)|
+    'cheap_min_contrast': 35.0,     # grayscale std-dev
+    'cheap_min_text_height': 14,    # px, median glyph height in the original image
+    'heavy_max_blur': 60.0,
+    'heavy_min_noise': 10.0,
+    'heavy_max_contrast': 30.0,
+    'heavy_max_text_height': 8,
+    'digital_min_extreme_ratio': 0.85,  # share of pixels that are near-black or near-white
+}
+
+ANALYSIS_WIDTH = 800
+
+
+def to_grayscale(image):
+    """PIL RGB image -> uint8 grayscale array"""
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2GRAY)
+
+
+def measure_image_quality(gray):
+    """Cheap image statistics used to pick an OCR tier (a few ms on a phone photo)"""
+    height, width = gray.shape
+    scale = 1.0
+    if width > ANALYSIS_WIDTH:
+        scale = ANALYSIS_WIDTH / width
+        gray = cv2.resize(gray, (ANALYSIS_WIDTH, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+
+    blur_variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    contrast = float(gray.std())
+    noise = float(np.mean(cv2.absdiff(gray, cv2.medianBlur(gray, 3))))
+    extreme_ratio = float(np.mean((gray < 40) | (gray > 215)))
+
+    # Dominant text height: median height of glyph-sized connected components
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = heights[(areas >= 8) & (heights >= 4) & (heights <= gray.shape[0] // 4)]
+    text_height = float(np.median(glyphs)) if len(glyphs) else 0.0
+
+    return {
+        'blur_variance': round(blur_variance, 1),
+        'contrast': round(contrast, 1),
+        'noise': round(noise, 2),
+        'text_height': round(text_height / scale, 1),
+        'extreme_ratio': round(extreme_ratio, 3),
+        'is_digital': extreme_ratio >= TIER_THRESHOLDS['digital_min_extreme_ratio'] and noise < 2.0,
+    }
+
+
+def choose_tier(quality):
+    """Map image statistics to 'cheap', 'medium' or 'heavy'"""
+    forced = os.getenv('OCR_FORCE_TIER')
+    if forced in ('cheap', 'medium', 'heavy'):
+        return forced
+
+    t = TIER_THRESHOLDS
+    text_height = quality['text_height']
+
+    if quality['is_digital'] and text_height >= t['heavy_max_text_height']:
+        return 'cheap'
+
+    if (quality['blur_variance'] < t['heavy_max_blur'] or
+            quality['noise'] >= t['heavy_min_noise'] or
+            quality['contrast'] < t['heavy_max_contrast'] or
+            text_height <= t['heavy_max_text_height']):
+        return 'heavy'
+
+    if (quality['blur_variance'] >= t['cheap_min_blur'] and
+            quality['noise'] <= t['cheap_max_noise'] and
+            quality['contrast'] >= t['cheap_min_contrast'] and
+            text_height >= t['cheap_min_text_height']):
+        return 'cheap'
+
+    return 'medium'
+
+
+def classify_image_quality(gray):
+    """Return (tier, quality statistics) for a grayscale receipt image"""
+    quality = measure_image_quality(gray)
+    return choose_tier(quality), quality
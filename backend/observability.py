@@ -0,0 +1,214 @@
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+# Default latency buckets (seconds), from fast DB reads up to slow OCR passes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    """Value that can go up and down (in-flight work, open connections)"""
+
+    def set(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Each decorated call gets its own timer; a shared one would mix up concurrent start times
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+        return False
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """Time a block or function: `with HIST.time(stage='ocr'):` or `@HIST.time(...)`"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        series = self._series.get(key)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", le))} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Shared metrics
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint',
+    labelnames=('endpoint', 'method', 'status')
+)
+HTTP_REQUESTS_TOTAL = Counter(
+    'http_requests_total', 'HTTP requests by endpoint and status',
+    labelnames=('endpoint', 'method', 'status')
+)
+SCAN_STAGE_SECONDS = Histogram(
+    'scan_stage_duration_seconds', 'Receipt scan pipeline stage latency',
+    labelnames=('stage',)
+)
+OCR_PASS_SECONDS = Histogram(
+    'ocr_pass_duration_seconds', 'Latency of a single Tesseract pass',
+    labelnames=('oem', 'psm')
+)
+SCANS_TOTAL = Counter(
+    'receipt_scans_total', 'Receipt scans by outcome',
+    labelnames=('outcome',)
+)
+OCR_TIER_TOTAL = Counter(
+    'ocr_tier_total', 'Scans by the OCR tier used and the tier first chosen by the classifier',
+    labelnames=('tier', 'initial_tier')
+)
+DB_OPERATION_SECONDS = Histogram(
+    'db_operation_duration_seconds', 'ReceiptDatabase method latency',
+    labelnames=('method',)
+)
+DB_ERRORS_TOTAL = Counter(
+    'db_errors_total', 'ReceiptDatabase method failures',
+    labelnames=('method',)
+)
+
+
+class SampledFilter(logging.Filter):
+    """Keep all warnings and errors, but only a sampled fraction of INFO/DEBUG records"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+def configure_logging():
+    """Configure leveled, sampled logging from LOG_LEVEL / LOG_SAMPLE_RATE"""
+    level = os.getenv('LOG_LEVEL', 'INFO').upper()
+    sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+    root = logging.getLogger()
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        handler.addFilter(SampledFilter(sample_rate))
+        root.addHandler(handler)
+    root.setLevel(level)
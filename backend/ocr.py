@@ -0,0 +1,123 @@
+"""
+OpenCV/Tesseract half of the scan pipeline.
+
+Importing this module loads cv2, NumPy, PIL and pytesseract, so only
+receipt_scan.load_ocr() imports it: API-only and auth processes never pay
+for the OCR stack.
+"""
+import logging
+
+import cv2
+import numpy as np
+from PIL import Image
+import pytesseract
+
+from image_quality import classify_image_quality, to_grayscale
+from observability import OCR_PASS_SECONDS
+from profiling import stage
+from ocr_models import detect_languages, image_to_string, preload, DEFAULT_LANGUAGE
+
+log = logging.getLogger(__name__)
+
+# (oem, psm) Tesseract passes per quality tier; 'heavy' is the original 18-pass sweep
+OCR_TIERS = {
+    'cheap': [(3, 6), (3, 4)],
+    'medium': [(3, 6), (3, 4), (3, 11), (3, 3)],
+    'heavy': [(oem, psm) for oem in [3, 1, 2] for psm in [6, 4, 8, 11, 13, 3]]
+}
+
+# Only applied to English; it would strip every character of other scripts
+ASCII_WHITELIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,$/():- '
+
+def tier_passes(tier, languages=DEFAULT_LANGUAGE):
+    """(oem, psm) passes for a tier; non-English models run LSTM-only (most ship without legacy data)"""
+    passes = OCR_TIERS[tier]
+    if languages == DEFAULT_LANGUAGE:
+        return passes
+    return list(dict.fromkeys((1, psm) for _, psm in passes))
+
+def enhance_receipt_image(image, tier='heavy'):
+    """Enhanced preprocessing for better OCR (lighter for cheap/medium tiers)"""
+    # Convert to OpenCV
+    opencv_img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(opencv_img, cv2.COLOR_BGR2GRAY)
+    
+    # Resize to optimal size for OCR
+    height, width = gray.shape
+    target_height = 1500
+    if tier == 'cheap':
+        # Clean digital receipts only need upscaling when they are tiny
+        target_height = 750
+    if height < target_height:
+        scale = target_height / height
+        new_width = int(width * scale)
+        gray = cv2.resize(gray, (new_width, target_height), interpolation=cv2.INTER_CUBIC)
+    
+    if tier == 'cheap':
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return binary
+    
+    if tier == 'medium':
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return cv2.adaptiveThreshold(
+            clahe.apply(gray), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, 15, 4
+        )
+    
+    # Advanced denoising
+    denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+    
+    # Gaussian blur
+    blurred = cv2.GaussianBlur(denoised, (1, 1), 0)
+    
+    # Enhanced contrast
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    enhanced = clahe.apply(blurred)
+    
+    # Morphological operations
+    kernel = np.ones((1,1), np.uint8)
+    morph = cv2.morphologyEx(enhanced, cv2.MORPH_CLOSE, kernel)
+    
+    # Adaptive threshold
+    binary = cv2.adaptiveThreshold(
+        morph, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+        cv2.THRESH_BINARY, 15, 4
+    )
+    
+    # Cleanup
+    kernel = np.ones((2,2), np.uint8)
+    cleaned = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    
+    return cleaned
+
+def extract_text_robust(processed_img, tier='heavy', on_pass=None, languages=DEFAULT_LANGUAGE):
+    """Multi-pass OCR extraction"""
+    all_results = []
+    passes = tier_passes(tier, languages)
+    whitelist = ASCII_WHITELIST if languages == DEFAULT_LANGUAGE else None
+    
+    for index, (oem, psm) in enumerate(passes, start=1):
+        if on_pass:
+            on_pass(index, len(passes))
+        try:
+            with stage(OCR_PASS_SECONDS, oem=oem, psm=psm):
+                text = image_to_string(processed_img, languages, oem, psm, whitelist)
+            
+            if text.strip() and len(text.strip()) > 20:
+                all_results.append({
+                    'text': text.strip(),
+                    'length': len(text.strip()),
+                    'oem': oem,
+                    'psm': psm
+                })
+        except Exception as e:
+            continue
+    
+    if not all_results:
+        return ""
+    
+    # Return the longest result
+    best_result = max(all_results, key=lambda x: x['length'])
+    log.info("Best OCR: OEM %s, PSM %s, Length: %s, Languages: %s",
+             best_result['oem'], best_result['psm'], best_result['length'], languages)
+    return best_result['text']
@@ -0,0 +1,216 @@
+"""
+Tesseract language selection and loaded-model reuse.
+
+A cheap orientation-and-script detection pass (Tesseract OSD) names the
+receipt's dominant script, which picks the traineddata to OCR with, e.g.
+'chi_sim+eng' for a Chinese grocery receipt with English item codes.
+
+With tesserocr installed, initialised engines are kept per (languages, oem)
+and reused across scans, so a language model is loaded once per process
+rather than once per Tesseract call; the least recently used models are
+released when more than OCR_MAX_MODELS are loaded. Without tesserocr every
+pass runs the tesseract binary through pytesseract, as before.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pytesseract
+from PIL import Image
+
+from observability import Counter, Gauge
+
+try:
+    from tesserocr import PyTessBaseAPI, PSM, get_languages
+except ImportError:
+    PyTessBaseAPI = None
+
+log = logging.getLogger(__name__)
+
+# Loaded (languages, oem) engine sets kept in memory, and idle engines kept per set
+MAX_MODELS = int(os.getenv('OCR_MAX_MODELS', 6))
+MAX_IDLE_ENGINES = int(os.getenv('OCR_MAX_IDLE_ENGINES', 2))
+# Set to false when every receipt is in English to skip the OSD pass
+SCRIPT_DETECTION = os.getenv('OCR_SCRIPT_DETECTION', 'true').lower() in ('1', 'true', 'yes')
+# Images are shrunk to this height for OSD; script detection does not need full resolution
+OSD_MAX_HEIGHT = 1200
+OSD_MIN_CONFIDENCE = 1.0
+
+DEFAULT_LANGUAGE = 'eng'
+
+# Tesseract OSD script name -> traineddata to try, in order of preference. The first
+# installed one is used; OCR_SCRIPT_LANGUAGES="Devanagari=nep,Han=chi_tra" overrides.
+SCRIPT_LANGUAGES = {
+    'Latin': ['eng'],
+    'Han': ['chi_sim', 'chi_tra'],
+    'Hangul': ['kor'],
+    'Japanese': ['jpn'],
+    'Katakana': ['jpn'],
+    'Hiragana': ['jpn'],
+    'Devanagari': ['hin', 'nep', 'mar'],
+    'Bengali': ['ben'],
+    'Gurmukhi': ['pan'],
+    'Gujarati': ['guj'],
+    'Tamil': ['tam'],
+    'Telugu': ['tel'],
+    'Kannada': ['kan'],
+    'Malayalam': ['mal'],
+    'Thai': ['tha'],
+    'Arabic': ['ara'],
+    'Hebrew': ['heb'],
+    'Cyrillic': ['rus', 'ukr'],
+    'Greek': ['ell'],
+}
+for _override in filter(None, os.getenv('OCR_SCRIPT_LANGUAGES', '').split(',')):
+    _script, _, _languages = _override.partition('=')
+    SCRIPT_LANGUAGES[_script.strip()] = _languages.strip().split('+')
+
+OCR_MODEL_LOADS = Counter(
+    'ocr_model_loads_total', 'Tesseract engines initialised, by traineddata', labelnames=('languages',)
+)
+OCR_MODELS_LOADED = Gauge('ocr_models_loaded', 'Idle Tesseract engines held by the model pool')
+OCR_SCRIPT_TOTAL = Counter('ocr_script_total', 'Scans by detected script', labelnames=('script',))
+
+_installed = None
+
+def installed_languages():
+    """Traineddata names available to Tesseract (read once per process)"""
+    global _installed
+    if _installed is None:
+        try:
+            if PyTessBaseAPI is not None:
+                _installed = frozenset(get_languages()[1])
+            else:
+                _installed = frozenset(pytesseract.get_languages(config=''))
+        except Exception as e:
+            log.warning("Could not list Tesseract languages: %s", e)
+            _installed = frozenset([DEFAULT_LANGUAGE])
+    return _installed
+
+def languages_for_script(script):
+    """Tesseract `lang` string for a detected script, always including English for item codes and prices"""
+    installed = installed_languages()
+    for language in SCRIPT_LANGUAGES.get(script, ()):
+        if language in installed:
+            return language if language == DEFAULT_LANGUAGE else f'{language}+{DEFAULT_LANGUAGE}'
+    if script not in ('Latin', None):
+        log.warning("No traineddata installed for %s script (tried %s); using %s",
+                    script, ', '.join(SCRIPT_LANGUAGES.get(script, ())) or 'none', DEFAULT_LANGUAGE)
+    return DEFAULT_LANGUAGE
+
+class TesseractPool:
+    """Initialised tesserocr engines keyed by (languages, oem), evicting the least recently used key"""
+
+    def __init__(self, max_models=MAX_MODELS, max_idle=MAX_IDLE_ENGINES):
+        self.max_models = max_models
+        self.max_idle = max_idle
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def engine(self, languages, oem):
+        """Borrow an engine for one call; engines are not thread-safe, so each borrower gets its own"""
+        key = (languages, oem)
+        with self._lock:
+            idle = self._idle.get(key)
+            api = idle.pop() if idle else None
+            if idle is not None:
+                self._idle.move_to_end(key)
+        if api is None:
+            api = PyTessBaseAPI(lang=languages, oem=oem)
+            OCR_MODEL_LOADS.inc(languages=languages)
+            log.info("Loaded Tesseract model %s (oem %s)", languages, oem)
+
+        try:
+            yield api
+        finally:
+            api.Clear()
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                self._idle.move_to_end(key)
+                released = [api] if len(idle) >= self.max_idle else []
+                if not released:
+                    idle.append(api)
+                while len(self._idle) > self.max_models:
+                    evicted_key, evicted = self._idle.popitem(last=False)
+                    released.extend(evicted)
+                    log.info("Evicting Tesseract model %s (oem %s)", *evicted_key)
+                OCR_MODELS_LOADED.set(sum(len(engines) for engines in self._idle.values()))
+            for engine in released:
+                engine.End()
+
+    def loaded(self):
+        with self._lock:
+            return {f'{languages}/oem{oem}': len(engines) for (languages, oem), engines in self._idle.items()}
+
+    def close(self):
+        with self._lock:
+            engines = [engine for idle in self._idle.values() for engine in idle]
+            self._idle.clear()
+            OCR_MODELS_LOADED.set(0)
+        for engine in engines:
+            engine.End()
+
+pool = TesseractPool() if PyTessBaseAPI is not None else None
+
+def image_to_string(image, languages, oem, psm, whitelist=None):
+    """One Tesseract pass over a NumPy/PIL image, through the model pool when tesserocr is installed"""
+    if pool is None:
+        config = f'--oem {oem} --psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        return pytesseract.image_to_string(image, lang=languages, config=config)
+
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    with pool.engine(languages, oem) as api:
+        api.SetPageSegMode(psm)
+        # Variables persist on a reused engine, so the whitelist is always set (empty clears it)
+        api.SetVariable('tessedit_char_whitelist', whitelist or '')
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+def detect_script(gray):
+    """Dominant script of a grayscale receipt image via Tesseract OSD, or None when unsure"""
+    height, width = gray.shape[:2]
+    image = Image.fromarray(gray)
+    if height > OSD_MAX_HEIGHT:
+        image = image.resize((max(1, width * OSD_MAX_HEIGHT // height), OSD_MAX_HEIGHT))
+
+    try:
+        if pool is not None:
+            with pool.engine('osd', 0) as api:
+                api.SetPageSegMode(PSM.OSD_ONLY)
+                api.SetImage(image)
+                result = api.DetectOrientationScript() or {}
+            script, confidence = result.get('script_name'), result.get('script_conf', 0)
+        else:
+            result = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+            script, confidence = result.get('script'), result.get('script_conf', 0)
+    except Exception as e:
+        # OSD fails on images with too little text; treat them as the default language
+        log.debug("Script detection failed: %s", e)
+        return None
+    return script if confidence >= OSD_MIN_CONFIDENCE else None
+
+def detect_languages(gray):
+    """Tesseract `lang` for a receipt; skips OSD when only one language could be chosen anyway"""
+    installed = installed_languages()
+    if not SCRIPT_DETECTION or 'osd' not in installed or not (installed - {DEFAULT_LANGUAGE, 'osd', 'equ'}):
+        return DEFAULT_LANGUAGE
+    script = detect_script(gray)
+    OCR_SCRIPT_TOTAL.inc(script=script or 'unknown')
+    return languages_for_script(script)
+
+def preload(languages=None):
+    """Load models at boot so the first scans in each language skip the model load"""
+    if pool is None:
+        return
+    for language in (languages or os.getenv('OCR_PRELOAD_LANGUAGES', DEFAULT_LANGUAGE)).split(','):
+        try:
+            with pool.engine(language.strip(), 3):
+                pass
+        except Exception as e:
+            log.warning("Could not preload Tesseract model %s: %s", language, e)
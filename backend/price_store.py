@@ -0,0 +1,227 @@
+import argparse
+import csv
+import glob
+import logging
+import os
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+from flask import Blueprint, request, jsonify
+
+from companies import catalogue_tickers
+from quotes import quote_service, parse_symbols
+from serialization import json_response
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# One raw little-endian file per column per ticker. `date` is written last on
+# every append, so its length is the committed row count for all columns.
+COLUMNS = (
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+    ('date', '<M8[D]'),
+)
+COLUMN_TYPES = dict(COLUMNS)
+ROW_BYTES = 8
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'prices')
+
+
+class PriceStore:
+    """
+    Append-only columnar daily price history, one directory per ticker.
+
+    Reads are zero-copy slices of memory-mapped columns (date ranges are
+    found with a binary search on the sorted date column); appends only add
+    rows newer than the last stored date.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _path(self, ticker, column):
+        return os.path.join(self.root, ticker, f'{column}.bin')
+
+    def rows(self, ticker):
+        try:
+            return os.path.getsize(self._path(ticker, 'date')) // ROW_BYTES
+        except OSError:
+            return 0
+
+    def tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(t for t in os.listdir(self.root) if self.rows(t))
+
+    def _columns(self, ticker):
+        """Memory-mapped columns for the committed rows, re-opened only when the ticker grew"""
+        rows = self.rows(ticker)
+        if not rows:
+            return None
+        cached = self._maps.get(ticker)
+        if cached is None or cached[0] != rows:
+            maps = {
+                column: np.memmap(self._path(ticker, column), dtype=dtype, mode='r', shape=(rows,))
+                for column, dtype in COLUMNS
+            }
+            cached = self._maps[ticker] = (rows, maps)
+        return cached[1]
+
+    def read(self, ticker, start=None, end=None, columns=('date', 'close')):
+        """Return {column: array view} for start <= date <= end, or None if the ticker has no history"""
+        maps = self._columns(ticker)
+        if maps is None:
+            return None
+        dates = maps['date']
+        lo = np.searchsorted(dates, np.datetime64(start, 'D'), side='left') if start is not None else 0
+        hi = np.searchsorted(dates, np.datetime64(end, 'D'), side='right') if end is not None else len(dates)
+        return {column: maps[column][lo:hi] for column in columns}
+
+    def closes(self, ticker):
+        """(dates, closes) loader for backtest.run_backtest"""
+        data = self.read(ticker)
+        return (data['date'], data['close']) if data else None
+
+    def last_date(self, ticker):
+        maps = self._columns(ticker)
+        return maps['date'][-1] if maps is not None else None
+
+    def append(self, ticker, bars):
+        """Append rows newer than the last stored date; return how many were added"""
+        with self._lock:
+            os.makedirs(os.path.join(self.root, ticker), exist_ok=True)
+            rows = self.rows(ticker)
+
+            # Drop partial rows left behind by an interrupted append
+            for column, _ in COLUMNS:
+                path = self._path(ticker, column)
+                if os.path.exists(path) and os.path.getsize(path) != rows * ROW_BYTES:
+                    os.truncate(path, rows * ROW_BYTES)
+
+            dates = np.asarray(bars['date'], dtype='datetime64[D]')
+            order = np.argsort(dates, kind='stable')
+            keep = order[np.concatenate(([True], np.diff(dates[order]) > np.timedelta64(0, 'D')))]
+            last = self.last_date(ticker)
+            if last is not None:
+                keep = keep[dates[keep] > last]
+            if not len(keep):
+                return 0
+
+            for column, dtype in COLUMNS:
+                values = bars.get(column)
+                if values is None:
+                    # Close-only sources (e.g. fixtures) still get a complete row
+                    values = bars['close'] if dtype == '<f8' else np.zeros(len(dates), dtype=dtype)
+                with open(self._path(ticker, column), 'ab') as f:
+                    f.write(np.asarray(values)[keep].astype(dtype).tobytes())
+
+            return len(keep)
+
+    def update(self, ticker, provider, limiter=None, limiter_timeout=30):
+        """Fetch daily bars from the provider and append the new ones"""
+        if limiter is not None and not limiter.acquire(timeout=limiter_timeout):
+            raise RuntimeError('Upstream rate limit budget exhausted')
+        return self.append(ticker, provider.fetch_daily(ticker))
+
+    def update_all(self, tickers, provider, limiter=None):
+        added = {}
+        for ticker in tickers:
+            try:
+                added[ticker] = self.update(ticker, provider, limiter)
+            except Exception as e:
+                log.warning("Price update failed for %s: %s", ticker, e)
+                added[ticker] = None
+        return added
+
+    def seed_from_fixtures(self, directory):
+        """Load `<TICKER>.csv` files (date,close plus optional open,high,low,volume)"""
+        added = {}
+        for path in sorted(glob.glob(os.path.join(directory, '*.csv'))):
+            ticker = os.path.splitext(os.path.basename(path))[0].upper()
+            with open(path, newline='') as f:
+                rows = list(csv.DictReader(f))
+            if not rows:
+                continue
+            bars = {'date': np.array([row['date'] for row in rows], dtype='datetime64[D]')}
+            for column, dtype in COLUMNS[:-1]:
+                if column in rows[0]:
+                    bars[column] = np.array([float(row[column]) for row in rows]).astype(dtype)
+            added[ticker] = self.append(ticker, bars)
+        return added
+
+
+price_store = PriceStore(os.getenv('PRICE_STORE_DIR', DEFAULT_STORE_DIR))
+
+prices_bp = Blueprint('prices', __name__)
+
+
+@prices_bp.route('', methods=['GET'])
+def list_price_history():
+    """Tickers in the local price store with their row count and last date"""
+    return jsonify({
+        'success': True,
+        'tickers': [
+            {'ticker': t, 'rows': price_store.rows(t), 'last_date': str(price_store.last_date(t))}
+            for t in price_store.tickers()
+        ]
+    })
+
+
+@prices_bp.route('/<symbol>', methods=['GET'])
+def get_price_history(symbol):
+    """Daily bars for charts: ?start=&end= (YYYY-MM-DD), or the last ?days= trading days (default 100)"""
+    symbols, invalid = parse_symbols(symbol)
+    if invalid or not symbols:
+        return jsonify({'success': False, 'error': f'Unsupported symbol: {symbol}'}), 400
+
+    try:
+        start, end = request.args.get('start'), request.args.get('end')
+        days = max(1, int(request.args.get('days', 100)))
+        data = price_store.read(
+            symbols[0], start=start, end=end,
+            columns=('date', 'open', 'high', 'low', 'close', 'volume')
+        )
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD and days a number'}), 400
+
+    if data is None:
+        return jsonify({'success': False, 'error': f'No price history stored for {symbols[0]}'}), 404
+
+    if not start and not end:
+        data = {column: values[-days:] for column, values in data.items()}
+
+    return json_response({
+        'success': True,
+        'symbol': symbols[0],
+        'bars': [
+            {'timestamp': d, 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+            for d, o, h, l, c, v in zip(data['date'].astype(str).tolist(), data['open'].tolist(), data['high'].tolist(),
+                                        data['low'].tolist(), data['close'].tolist(), data['volume'].tolist())
+        ]
+    })
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the local price history store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    update_parser = commands.add_parser('update', help='append new daily bars from the quote provider')
+    update_parser.add_argument('tickers', nargs='*', help='defaults to the company catalogue')
+    seed_parser = commands.add_parser('seed', help='load <TICKER>.csv fixture files')
+    seed_parser.add_argument('directory')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    if args.command == 'seed':
+        result = price_store.seed_from_fixtures(args.directory)
+    else:
+        result = price_store.update_all(args.tickers or catalogue_tickers(), quote_service.provider, quote_service.limiter)
+    for ticker, added in result.items():
+        log.info("%s: %s rows added", ticker, 'failed' if added is None else added)
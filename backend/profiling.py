@@ -0,0 +1,325 @@
+"""
+On-demand sampling profiler for the scan pipeline.
+
+A scan is profiled when it is picked by PROFILE_SAMPLE_RATE, or always while
+PROFILE_SLOW_SECONDS is set. In the second case the trace is kept only when
+the scan turns out slower than the threshold. A single sampler thread reads
+the profiled threads' stacks every PROFILE_INTERVAL_MS through
+sys._current_frames, so profiled scans run at full speed, concurrent scans
+can be profiled at once and nothing is paid when profiling is off.
+
+Every trace records:
+- the SHA-256 of the upload;
+- the stage timings (decode, enhance, each OCR pass by OEM/PSM, parse and so on);
+- the sampled stacks in collapsed form, rooted at the stage they were taken in.
+
+The most recent PROFILE_MAX_TRACES traces are kept per process and can be
+downloaded from /api/profiling as `.folded` files, which flamegraph.pl,
+speedscope and inferno read directly.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, request
+
+from observability import Counter as MetricCounter
+
+log = logging.getLogger(__name__)
+
+# Fraction of scans profiled regardless of speed, and the latency above which any scan's trace is kept
+SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 0))
+# Sampling is bounded by the interpreter's 5 ms thread switch interval, so smaller values add little
+INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 10))
+MAX_TRACES = int(os.getenv('PROFILE_MAX_TRACES', 20))
+# Required in X-Profiling-Token to change settings or download traces; the endpoints are off without it
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN')
+# Distinct stacks kept per trace; rarer ones beyond this are counted under one entry
+MAX_STACKS = 5000
+
+PROFILES_TOTAL = MetricCounter(
+    'scan_profiles_total', 'Profiled scans by why they were profiled and whether the trace was kept',
+    labelnames=('mode', 'kept')
+)
+
+_local = threading.local()
+
+
+class Trace:
+    """Stage timings and sampled stacks of one profiled scan"""
+
+    def __init__(self, mode, file_bytes, file_name, root_code):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.image_sha256 = hashlib.sha256(file_bytes).hexdigest()
+        self.file_name = file_name
+        self.file_size = len(file_bytes)
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.root_code = root_code
+        self.duration = None
+        self.status = None
+        self.stages = []
+        self.tags = []
+        self.samples = Counter()
+
+    def summary(self):
+        return {
+            'trace_id': self.trace_id,
+            'mode': self.mode,
+            'image_sha256': self.image_sha256,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'started_at': self.started_at.isoformat(),
+            'duration_seconds': round(self.duration, 3) if self.duration is not None else None,
+            'status': self.status,
+            'samples': sum(self.samples.values()),
+            'stages': self.stages
+        }
+
+    def folded(self):
+        """Collapsed stacks, one `frame;frame;frame count` line each"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class Profiler:
+    """Picks scans to profile, samples their threads and keeps the most recent traces"""
+
+    def __init__(self, sample_rate=SAMPLE_RATE, slow_seconds=SLOW_SECONDS, interval_ms=INTERVAL_MS,
+                 max_traces=MAX_TRACES):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.interval_ms = interval_ms
+        self.traces = deque(maxlen=max_traces)
+        self._active = {}
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._sampler = None
+
+    def configure(self, sample_rate=None, slow_seconds=None, interval_ms=None, max_traces=None):
+        if sample_rate is not None:
+            self.sample_rate = min(max(float(sample_rate), 0.0), 1.0)
+        if slow_seconds is not None:
+            self.slow_seconds = max(float(slow_seconds), 0.0)
+        if interval_ms is not None:
+            self.interval_ms = max(float(interval_ms), 1.0)
+        if max_traces is not None:
+            with self._lock:
+                self.traces = deque(self.traces, maxlen=max(int(max_traces), 1))
+        log.info("Scan profiling: sample rate %s, slow threshold %ss, interval %sms",
+                 self.sample_rate, self.slow_seconds, self.interval_ms)
+
+    def settings(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'slow_seconds': self.slow_seconds,
+            'interval_ms': self.interval_ms,
+            'max_traces': self.traces.maxlen,
+            'active': len(self._active)
+        }
+
+    def _mode(self):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        if self.slow_seconds:
+            return 'slow'
+        return None
+
+    def start(self, file_bytes, file_name, root_code):
+        """Begin profiling the calling thread's scan, or return None when it is not picked"""
+        mode = self._mode()
+        if mode is None:
+            return None
+        trace = Trace(mode, file_bytes, file_name, root_code)
+        with self._lock:
+            self._active[threading.get_ident()] = trace
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='scan-profiler', daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        _local.trace = trace
+        return trace
+
+    def finish(self, trace, status):
+        _local.trace = None
+        trace.duration = time.perf_counter() - trace.started
+        trace.status = status
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            kept = trace.mode == 'sampled' or trace.duration >= self.slow_seconds
+            if kept:
+                self.traces.append(trace)
+        PROFILES_TOTAL.inc(mode=trace.mode, kept=str(kept).lower())
+        if kept:
+            log.info("Kept %s scan profile %s (%.2fs, %d samples)",
+                     trace.mode, trace.trace_id, trace.duration, sum(trace.samples.values()))
+
+    def get(self, trace_id):
+        with self._lock:
+            return next((trace for trace in self.traces if trace.trace_id == trace_id), None)
+
+    def recent(self):
+        with self._lock:
+            return list(reversed(self.traces))
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+            self._labels[code] = label
+        return label
+
+    def _fold(self, frame, trace):
+        stack = []
+        while frame is not None and frame.f_code is not trace.root_code:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.extend(reversed(list(trace.tags)))
+        return ';'.join(reversed(stack))
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval_ms / 1000)
+            with self._lock:
+                active = list(self._active.items())
+                if not active:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for thread_id, trace in active:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = self._fold(frame, trace)
+                if stack not in trace.samples and len(trace.samples) >= MAX_STACKS:
+                    stack = '[other stacks]'
+                trace.samples[stack] += 1
+            del frames
+
+
+profiler = Profiler()
+
+
+def profiled(process):
+    """Profile a `process(file_bytes, file_name, ...)` scan function returning (result, status) when picked"""
+    @wraps(process)
+    def wrapper(file_bytes, file_name, *args, **kwargs):
+        trace = profiler.start(file_bytes, file_name, wrapper.__code__)
+        if trace is None:
+            return process(file_bytes, file_name, *args, **kwargs)
+        status = 500
+        try:
+            result = process(file_bytes, file_name, *args, **kwargs)
+            status = result[1]
+            return result
+        finally:
+            profiler.finish(trace, status)
+    return wrapper
+
+
+@contextmanager
+def stage(histogram, **labels):
+    """Time a block into `histogram` and, when the scan is being profiled, into its trace"""
+    trace = getattr(_local, 'trace', None)
+    if trace is None:
+        with histogram.time(**labels):
+            yield
+        return
+
+    tag = '[' + ' '.join(f'{name}={value}' for name, value in labels.items()) + ']'
+    trace.tags.append(tag)
+    start = time.perf_counter()
+    try:
+        with histogram.time(**labels):
+            yield
+    finally:
+        trace.tags.pop()
+        trace.stages.append({
+            **labels,
+            'offset_seconds': round(start - trace.started, 4),
+            'seconds': round(time.perf_counter() - start, 4)
+        })
+
+
+profiling_bp = Blueprint('profiling', __name__)
+
+
+def _refuse():
+    """Return an error response unless the request carries the configured profiling token"""
+    if not PROFILING_TOKEN:
+        return jsonify({'success': False, 'error': 'Profiling endpoints are disabled; set PROFILING_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Profiling-Token', '').encode(), PROFILING_TOKEN.encode()):
+        return jsonify({'success': False, 'error': 'Invalid profiling token'}), 403
+    return None
+
+
+@profiling_bp.route('', methods=['GET'])
+def get_profiles():
+    """Profiling settings and the kept traces, newest first"""
+    error = _refuse()
+    if error:
+        return error
+    return jsonify({
+        'success': True,
+        'settings': profiler.settings(),
+        'traces': [trace.summary() for trace in profiler.recent()]
+    })
+
+
+@profiling_bp.route('', methods=['PUT'])
+def update_profiling():
+    """Change sample_rate, slow_seconds, interval_ms or max_traces at runtime (this process only)"""
+    error = _refuse()
+    if error:
+        return error
+    data = request.get_json(silent=True) or {}
+    try:
+        profiler.configure(**{key: data[key] for key in ('sample_rate', 'slow_seconds', 'interval_ms', 'max_traces')
+                              if key in data})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Settings must be numbers'}), 400
+    return jsonify({'success': True, 'settings': profiler.settings()})
+
+
+@profiling_bp.route('/traces/<trace_id>', methods=['GET'])
+def download_trace(trace_id):
+    """One trace as collapsed stacks (default) or ?format=json with stage timings"""
+    error = _refuse()
+    if error:
+        return error
+    trace = profiler.get(trace_id)
+    if trace is None:
+        return jsonify({'success': False, 'error': 'Trace not found'}), 404
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'trace': {**trace.summary(), 'stacks': dict(trace.samples)}})
+    return Response(trace.folded(), mimetype='text/plain', headers={
+        'Content-Disposition': f'attachment; filename="scan-{trace.trace_id}.folded"'
+    })
+
+
+@profiling_bp.route('/traces.folded', methods=['GET'])
+def download_all_traces():
+    """Every kept trace merged into one collapsed-stack file"""
+    error = _refuse()
+    if error:
+        return error
+    merged = Counter()
+    for trace in profiler.recent():
+        merged.update(trace.samples)
+    body = ''.join(f'{stack} {count}\n' for stack, count in merged.most_common())
+    return Response(body, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename="scans.folded"'
+    })
@@ -0,0 +1,405 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+import requests
+from dotenv import load_dotenv
+from flask import Blueprint, request, jsonify
+
+from companies import catalogue_tickers
+from observability import Counter
+
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+ALPHA_VANTAGE_URL = 'https://www.alphavantage.co/query'
+SYMBOL_PATTERN = re.compile(r'^[A-Z][A-Z.\-]{0,9}$')
+# Longest a quote request waits on the provider; slower symbols are returned stale or listed as pending
+REQUEST_WAIT_SECONDS = float(os.getenv('QUOTE_REQUEST_WAIT', 2))
+
+QUOTE_CACHE_TOTAL = Counter('quote_cache_total', 'Quote lookups by cache result', labelnames=('result',))
+QUOTE_UPSTREAM_TOTAL = Counter('quote_upstream_requests_total', 'Upstream quote provider calls', labelnames=('provider', 'outcome'))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take tokens if available; return 0 on success or the seconds to wait"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until tokens are available; return False if that would exceed `timeout`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def state(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {'tokens': round(self._tokens, 2), 'capacity': self.capacity, 'rate_per_s': self.rate}
+
+
+class AlphaVantageProvider:
+    """Alpha Vantage GLOBAL_QUOTE, or REALTIME_BULK_QUOTES (premium) for batches"""
+
+    name = 'alphavantage'
+
+    def __init__(self, api_key, bulk=False):
+        self.api_key = api_key
+        self.bulk = bulk
+        self.max_batch_size = 100 if bulk else 1
+        self.session = requests.Session()
+
+    def _get(self, params):
+        response = self.session.get(ALPHA_VANTAGE_URL, params={**params, 'apikey': self.api_key}, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        if 'Error Message' in data:
+            raise ValueError(data['Error Message'])
+        if 'Note' in data or 'Information' in data:
+            raise RuntimeError(data.get('Note') or data.get('Information'))
+        return data
+
+    def fetch_quotes(self, symbols):
+        if self.bulk:
+            data = self._get({'function': 'REALTIME_BULK_QUOTES', 'symbol': ','.join(symbols)})
+            quotes = {}
+            for item in data.get('data', []):
+                price = float(item['close'])
+                previous_close = float(item['previous_close'])
+                quotes[item['symbol']] = {
+                    'symbol': item['symbol'],
+                    'price': price,
+                    'change': float(item['change']),
+                    'changePercent': float(item['change_percent']),
+                    'volume': int(float(item['volume'])),
+                    'previousClose': previous_close
+                }
+            return quotes
+
+        quotes = {}
+        for symbol in symbols:
+            quote = self._get({'function': 'GLOBAL_QUOTE', 'symbol': symbol}).get('Global Quote')
+            if not quote:
+                continue
+            quotes[symbol] = {
+                'symbol': quote['01. symbol'],
+                'price': float(quote['05. price']),
+                'change': float(quote['09. change']),
+                'changePercent': float(quote['10. change percent'].rstrip('%')),
+                'volume': int(quote['06. volume']),
+                'previousClose': float(quote['08. previous close'])
+            }
+        return quotes
+
+    def fetch_daily(self, symbol):
+        """Daily bars as {column: array} (date, open, high, low, close, volume), oldest first"""
+        data = self._get({
+            'function': 'TIME_SERIES_DAILY',
+            'symbol': symbol,
+            # Full history is a premium feature; the free tier returns ~100 days
+            'outputsize': 'full' if self.bulk else 'compact'
+        })
+        series = data.get('Time Series (Daily)') or {}
+        days = sorted(series)
+        bars = {'date': np.array(days, dtype='datetime64[D]')}
+        for column, key in (('open', '1. open'), ('high', '2. high'), ('low', '3. low'), ('close', '4. close')):
+            bars[column] = np.array([float(series[day][key]) for day in days], dtype=np.float64)
+        bars['volume'] = np.array([int(series[day]['5. volume']) for day in days], dtype=np.int64)
+        return bars
+
+
+class StubProvider:
+    """Offline provider for tests and local development (fixture file or seeded random walk)"""
+
+    name = 'stub'
+
+    def __init__(self, fixture_file=None, seed=42, max_batch_size=50):
+        self.max_batch_size = max_batch_size
+        self.calls = []
+        self._rng = random.Random(seed)
+        self._prices = {}
+        if fixture_file:
+            with open(fixture_file) as f:
+                self._prices = {symbol: float(price) for symbol, price in json.load(f).items()}
+
+    def fetch_quotes(self, symbols):
+        self.calls.append(list(symbols))
+        quotes = {}
+        for symbol in symbols:
+            previous_close = self._prices.setdefault(symbol, round(self._rng.uniform(20, 500), 2))
+            price = round(previous_close * (1 + self._rng.gauss(0, 0.01)), 2)
+            quotes[symbol] = {
+                'symbol': symbol,
+                'price': price,
+                'change': round(price - previous_close, 2),
+                'changePercent': round((price / previous_close - 1) * 100, 4),
+                'volume': self._rng.randint(100_000, 50_000_000),
+                'previousClose': previous_close
+            }
+        return quotes
+
+    def fetch_daily(self, symbol, start='2015-01-01'):
+        """Deterministic business-day random walk per symbol, in the same shape as AlphaVantageProvider"""
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        dates = np.arange(np.datetime64(start), np.datetime64(date.today()), dtype='datetime64[D]')
+        dates = dates[np.is_busday(dates)]
+        walk = np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+        # End the walk at the fixture price when there is one, so history and quotes agree
+        last_price = self._prices.get(symbol) or rng.uniform(20, 500) * walk[-1]
+        close = np.round(walk * (last_price / walk[-1]), 2)
+        open_ = np.round(np.concatenate(([close[0]], close[:-1])) * (1 + rng.normal(0, 0.003, len(dates))), 2)
+        spread = np.abs(rng.normal(0, 0.008, len(dates))) * close
+        return {
+            'date': dates,
+            'open': open_,
+            'high': np.round(np.maximum(open_, close) + spread, 2),
+            'low': np.round(np.minimum(open_, close) - spread, 2),
+            'close': close,
+            'volume': rng.integers(100_000, 50_000_000, len(dates))
+        }
+
+
+class _Flight:
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class QuoteService:
+    """
+    Shared quote cache in front of a rate-limited provider.
+
+    Fresh quotes come from a TTL cache. Misses for a symbol already being
+    fetched wait on that fetch (single-flight); the rest are grouped into
+    provider-sized batches, each paid for from a global token bucket.
+    Request handlers use get_quotes_within, which fetches on a background
+    worker and stops waiting after a deadline instead of holding the
+    request thread while the bucket refills.
+    """
+
+    def __init__(self, provider, ttl=60, limiter=None, limiter_timeout=30):
+        self.provider = provider
+        self.ttl = ttl
+        self.limiter = limiter or TokenBucket(rate=5 / 60, capacity=5)
+        self.limiter_timeout = limiter_timeout
+        self._cache = {}
+        self._inflight = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        # One worker: upstream calls are serialized by the token bucket anyway
+        self._fetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quote-fetch')
+
+    def add_listener(self, callback):
+        """Call `callback({symbol: quote})` with every batch of fresh quotes from the provider"""
+        self._listeners.append(callback)
+
+    def _claim(self, symbols):
+        """Split symbols into fresh cached quotes, {symbol: flight} this caller fetches and {symbol: flight} already in flight"""
+        now = time.time()
+        results, owned, waiting = {}, {}, {}
+
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                cached = self._cache.get(symbol)
+                if cached and cached[1] > now:
+                    results[symbol] = cached[0]
+                    QUOTE_CACHE_TOTAL.inc(result='hit')
+                elif symbol in self._inflight:
+                    waiting[symbol] = self._inflight[symbol]
+                    QUOTE_CACHE_TOTAL.inc(result='coalesced')
+                else:
+                    owned[symbol] = self._inflight[symbol] = _Flight()
+                    QUOTE_CACHE_TOTAL.inc(result='miss')
+        return results, owned, waiting
+
+    def _batches(self, symbols):
+        symbols = list(symbols)
+        size = self.provider.max_batch_size
+        return [symbols[start:start + size] for start in range(0, len(symbols), size)]
+
+    def get_quotes(self, symbols):
+        """Return {symbol: quote} for every symbol that could be resolved, blocking on the provider"""
+        results, owned, waiting = self._claim(symbols)
+
+        for batch in self._batches(owned):
+            self._fetch_batch(batch, results)
+
+        for symbol, flight in waiting.items():
+            flight.event.wait(self.limiter_timeout + 15)
+            if flight.result is not None:
+                results[symbol] = flight.result
+
+        return results
+
+    def get_quotes_within(self, symbols, wait):
+        """Return ({symbol: quote}, pending symbols), waiting at most `wait` seconds; stale quotes stand in for pending ones"""
+        results, owned, waiting = self._claim(symbols)
+
+        # Misses are fetched in the background and land in the cache even if this caller stops waiting
+        for batch in self._batches(owned):
+            self._fetcher.submit(self._fetch_batch, batch, {})
+
+        deadline = time.monotonic() + wait
+        pending = []
+        for symbol, flight in {**owned, **waiting}.items():
+            if flight.event.wait(max(deadline - time.monotonic(), 0)):
+                if flight.result is not None:
+                    results[symbol] = flight.result
+                continue
+            pending.append(symbol)
+            with self._lock:
+                stale = self._cache.get(symbol)
+            if stale:
+                results[symbol] = stale[0]
+
+        return results, pending
+
+    def get_quote(self, symbol):
+        return self.get_quotes([symbol]).get(symbol)
+
+    def _fetch_batch(self, batch, results):
+        fetched = {}
+        try:
+            if not self.limiter.acquire(timeout=self.limiter_timeout):
+                raise RuntimeError('Upstream rate limit budget exhausted')
+            fetched = self.provider.fetch_quotes(batch)
+            QUOTE_UPSTREAM_TOTAL.inc(provider=self.provider.name, outcome='success')
+        except Exception as e:
+            QUOTE_UPSTREAM_TOTAL.inc(provider=self.provider.name, outcome='error')
+            log.warning("Quote fetch failed for %s: %s", ','.join(batch), e)
+
+        expires = time.time() + self.ttl
+        with self._lock:
+            for symbol in batch:
+                flight = self._inflight.pop(symbol)
+                quote = fetched.get(symbol)
+                if quote is not None:
+                    self._cache[symbol] = (quote, expires)
+                    results[symbol] = quote
+                else:
+                    # Serve a stale quote rather than nothing when the provider fails
+                    stale = self._cache.get(symbol)
+                    if stale:
+                        quote = results[symbol] = stale[0]
+                flight.result = quote
+                flight.event.set()
+
+        if fetched:
+            for callback in self._listeners:
+                try:
+                    callback(fetched)
+                except Exception as e:
+                    log.warning("Quote listener failed: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'provider': self.provider.name,
+                'cached_symbols': len(self._cache),
+                'inflight_symbols': len(self._inflight),
+                'ttl_seconds': self.ttl,
+                'limiter': self.limiter.state()
+            }
+
+
+def create_provider():
+    """Pick the quote provider from QUOTE_PROVIDER (alphavantage | stub)"""
+    if os.getenv('QUOTE_PROVIDER', 'alphavantage') == 'stub':
+        return StubProvider(fixture_file=os.getenv('QUOTE_STUB_FILE'))
+    return AlphaVantageProvider(
+        os.getenv('ALPHA_VANTAGE_API_KEY', 'demo'),
+        bulk=os.getenv('ALPHA_VANTAGE_BULK', 'false').lower() == 'true'
+    )
+
+
+quote_service = QuoteService(
+    create_provider(),
+    ttl=int(os.getenv('QUOTE_TTL', 60)),
+    limiter=TokenBucket(
+        rate=float(os.getenv('QUOTE_RATE_PER_MINUTE', 5)) / 60,
+        capacity=int(os.getenv('QUOTE_BURST', 5))
+    )
+)
+
+quotes_bp = Blueprint('quotes', __name__)
+
+
+def parse_symbols(raw):
+    """Split and validate a comma-separated symbol list against the catalogue"""
+    allowed = set(catalogue_tickers())
+    symbols = [s.strip().upper() for s in (raw or '').split(',') if s.strip()]
+    invalid = [s for s in symbols if not SYMBOL_PATTERN.match(s) or s not in allowed]
+    return symbols, invalid
+
+
+@quotes_bp.route('', methods=['GET'])
+def get_quotes():
+    """Get quotes for ?symbols=AAPL,MSFT (defaults to the whole catalogue)"""
+    symbols, invalid = parse_symbols(request.args.get('symbols') or ','.join(catalogue_tickers()))
+    if invalid:
+        return jsonify({'success': False, 'error': f"Unsupported symbols: {', '.join(invalid)}"}), 400
+
+    quotes, pending = quote_service.get_quotes_within(symbols, REQUEST_WAIT_SECONDS)
+    return jsonify({
+        'success': True,
+        'quotes': [quotes[s] for s in symbols if s in quotes],
+        'missing': [s for s in symbols if s not in quotes and s not in pending],
+        # Still being fetched; quotes listed here too are stale until then
+        'pending': pending
+    })
+
+
+@quotes_bp.route('/<symbol>', methods=['GET'])
+def get_quote(symbol):
+    """Get a single quote"""
+    symbols, invalid = parse_symbols(symbol)
+    if invalid or not symbols:
+        return jsonify({'success': False, 'error': f'Unsupported symbol: {symbol}'}), 400
+
+    quotes, pending = quote_service.get_quotes_within(symbols, REQUEST_WAIT_SECONDS)
+    quote = quotes.get(symbols[0])
+    if quote is None:
+        if pending:
+            return jsonify({'success': False, 'error': 'Quote is being fetched, retry shortly'}), 503, {'Retry-After': '1'}
+        return jsonify({'success': False, 'error': 'Quote unavailable'}), 503
+    return jsonify({'success': True, 'quote': quote, 'pending': pending})
+
+
+@quotes_bp.route('/stats', methods=['GET'])
+def get_quote_stats():
+    """Cache and rate-limiter state"""
+    return jsonify({'success': True, 'stats': quote_service.stats()})
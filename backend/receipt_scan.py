@@ -0,0 +1,570 @@
+import io
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, g, request, jsonify
+
+from admission import admission, caller_key, Rejected, SCAN_COSTS
+from auth import authorize_user
+from categorize import categorize_merchant
+from companies import POPULAR_COMPANIES
+from database import get_database
+from ereceipts import detect_kind, extract, DocumentError, PdfSupportMissing
+from observability import SCAN_STAGE_SECONDS, SCANS_TOTAL, OCR_TIER_TOTAL
+from profiling import profiled, stage
+from streams import scan_jobs
+
+log = logging.getLogger(__name__)
+
+scan_bp = Blueprint('scan', __name__)
+
+# The imported ocr module once loaded, False when its packages are missing
+_ocr_stack = None
+
+def load_ocr():
+    """Import the OpenCV/Tesseract stack on first use; None when it is not installed"""
+    global _ocr_stack
+    if _ocr_stack is None:
+        try:
+            import ocr
+            ocr.preload()
+            _ocr_stack = ocr
+        except ImportError as e:
+            log.warning("OCR packages not available: %s", e)
+            _ocr_stack = False
+    return _ocr_stack or None
+
+def detect_popular_company(text):
+    """Detect popular companies from OCR text using fuzzy matching"""
+    text_lower = text.lower()
+    
+    # First, try exact matches and variations
+    for company_key, company_data in POPULAR_COMPANIES.items():
+        for variation in company_data['variations']:
+            if variation.lower() in text_lower:
+                log.debug("Found company variation '%s' for %s", variation, company_data['name'])
+                return {
+                    'name': company_data['name'],
+                    'ticker': company_data['ticker'],
+                    'logo': company_data['logo'],
+                    'category': company_data['category'],
+                    'confidence': 'high',
+                    'matched_text': variation
+                }
+    
+    # If no exact match, try partial matching for common words
+    words = re.findall(r'\b\w+\b', text_lower)
+    
+    for company_key, company_data in POPULAR_COMPANIES.items():
+        for variation in company_data['variations']:
+            variation_words = variation.split()
+            if len(variation_words) == 1:
+                # Single word company names
+                for word in words:
+                    if word in variation or variation in word:
+                        if len(word) >= 3:  # Avoid very short matches
+                            log.debug("Found partial match '%s' for %s", word, company_data['name'])
+                            return {
+                                'name': company_data['name'],
+                                'ticker': company_data['ticker'],
+                                'logo': company_data['logo'],
+                                'category': company_data['category'],
+                                'confidence': 'medium',
+                                'matched_text': word
+                            }
+    
+    return None
+
+def find_company_name(text):
+    """Find company name with enhanced popular company detection"""
+    
+    # First, try to detect popular companies
+    popular_company = detect_popular_company(text)
+    if popular_company:
+        return popular_company['name']
+    
+    # Fallback to original logic for unknown companies
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    
+    # Patterns to skip
+    skip_patterns = [
+        r'^\d+\s+.*(?:street|st|avenue|ave|road|rd|boulevard|blvd)',
+        r'^\(\d{3}\)\s*\d{3}-\d{4}',
+        r'^\d{1,2}[/-]\d{1,2}[/-]\d{2,4}',
+        r'^store\s*#?\d+',
+        r'^\d{1,2}:\d{2}',
+        r'^\$\d+\.?\d*',
+        r'^receipt\s*#?\d*',
+        r'^transaction\s*#?\d*',
+        r'^cashier:?\s*\w+',
+        r'^terminal:?\s*\d+',
+        r'^card\s*#?\*+\d+',
+        r'^\*+\d{4}$',
+        r'^auth\s*code:?\s*\d+',
+        r'^ref\s*#?\d+'
+    ]
+    
+    potential_companies = []
+    
+    for i, line in enumerate(lines[:12]):
+        line_clean = line.strip()
+        
+        if len(line_clean) < 3:
+            continue
+            
+        # Skip patterns
+        skip = False
+        for pattern in skip_patterns:
+            if re.match(pattern, line_clean, re.IGNORECASE):
+                skip = True
+                break
+        if skip:
+            continue
+        
+        # Skip numbers only or common words
+        if re.match(r'^[\d\s\.\-\(\)]+$', line_clean):
+            continue
+            
+        if line_clean.lower() in ['receipt', 'thank you', 'thanks', 'visit', 'again', 'customer', 'copy']:
+            continue
+        
+        # Good company name indicators
+        if (len(line_clean) >= 4 and 
+            not re.match(r'^\d+$', line_clean) and
+            not re.match(r'^\d+\.\d+$', line_clean) and
+            any(c.isalpha() for c in line_clean)):
+            
+            clean_name = re.sub(r'[^\w\s&\'-]', ' ', line_clean)
+            clean_name = ' '.join(clean_name.split())
+            
+            # Score the company name
+            score = 0
+            if i < 3:
+                score += 10
+            if len(clean_name.split()) <= 4:
+                score += 5
+            if clean_name.upper() == clean_name:
+                score += 3
+            if any(word in clean_name.upper() for word in ['STORE', 'MARKET', 'SHOP', 'FOODS', 'MART']):
+                score += 5
+                
+            potential_companies.append({
+                'name': clean_name.title(),
+                'score': score,
+                'position': i
+            })
+    
+    if potential_companies:
+        best = max(potential_companies, key=lambda x: x['score'])
+        return best['name']
+    
+    return "Unknown Store"
+
+def find_total_amount(text):
+    """Find total amount with better patterns"""
+    
+    # Total patterns
+    total_patterns = [
+        r'(?i)(?:total|amount\s*due|balance\s*due|grand\s*total)\s*:?\s*\$?(\d{1,4}\.\d{2})',
+        r'(?i)total\s*\$?(\d{1,4}\.\d{2})',
+        r'(?i)\$(\d{1,4}\.\d{2})\s*(?:total|due)',
+        r'(?i)(?:final|net)\s*(?:total|amount)\s*:?\s*\$?(\d{1,4}\.\d{2})',
+        r'(?i)amount\s*:?\s*\$?(\d{1,4}\.\d{2})'
+    ]
+    
+    found_amounts = []
+    
+    # Look for explicit patterns
+    for pattern in total_patterns:
+        matches = re.findall(pattern, text)
+        for match in matches:
+            try:
+                amount = float(match)
+                if 0.50 <= amount <= 9999.99:
+                    found_amounts.append(amount)
+            except:
+                continue
+    
+    if found_amounts:
+        return max(found_amounts)
+    
+    # Look near total-related words
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if re.search(r'\b(?:total|amount|due|balance|grand)\b', line, re.IGNORECASE):
+            search_lines = lines[max(0, i-1):i+3]
+            for search_line in search_lines:
+                amounts = re.findall(r'\$(\d{1,4}\.\d{2})', search_line)
+                for amount in amounts:
+                    try:
+                        val = float(amount)
+                        if 1.00 <= val <= 9999.99:
+                            found_amounts.append(val)
+                    except:
+                        continue
+    
+    if found_amounts:
+        return max(found_amounts)
+    
+    # Last resort: largest reasonable amount
+    all_amounts = re.findall(r'\$(\d{1,4}\.\d{2})', text)
+    valid_amounts = []
+    
+    for amount in all_amounts:
+        try:
+            val = float(amount)
+            if 5.00 <= val <= 999.99:
+                valid_amounts.append(val)
+        except:
+            continue
+    
+    return max(valid_amounts) if valid_amounts else 0.0
+
+MONTH_NAMES = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+
+def find_purchase_date(text):
+    """Find the purchase date printed on the receipt (UTC midnight), or None"""
+    
+    candidates = []
+    
+    # 2024-09-15 / 2024/09/15
+    for year, month, day in re.findall(r'\b(20\d{2})[/-](\d{1,2})[/-](\d{1,2})\b', text):
+        candidates.append((int(year), int(month), int(day)))
+    
+    # 09/15/2024, 9-15-24 (US month-first order)
+    for month, day, year in re.findall(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4}|\d{2})\b', text):
+        year = int(year)
+        if year < 100:
+            year += 2000
+        candidates.append((year, int(month), int(day)))
+    
+    # Sep 15, 2024 / September 15 2024
+    for month_name, day, year in re.findall(r'(?i)\b([a-z]{3})[a-z]*\.?\s+(\d{1,2}),?\s+(20\d{2})\b', text):
+        month = MONTH_NAMES.get(month_name.lower())
+        if month:
+            candidates.append((int(year), month, int(day)))
+    
+    latest_valid = datetime.now(timezone.utc) + timedelta(days=1)
+    for year, month, day in candidates:
+        try:
+            date = datetime(year, month, day, tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        if 2000 <= year and date <= latest_valid:
+            return date
+    
+    return None
+
+LINE_ITEM = re.compile(r'^\s*(?:\d{1,3}\s*[xX@]?\s+)?(?P<description>.*?[A-Za-z].*?)\s+\$?(?P<amount>\d{1,4}[.,]\d{2})\s*[A-Z]{0,2}\s*$')
+NOT_AN_ITEM = re.compile(
+    r'(?i)\b(?:sub\s*total|total|tax|change|cash|tender|visa|mastercard|amex|debit|credit|card|balance|due|tip|gratuity|savings|you saved|payment|auth)\b'
+)
+MAX_LINE_ITEMS = 100
+
+def find_line_items(text):
+    """Purchased items as [{'description', 'amount'}]: lines ending in a price that are not totals or payments"""
+    items = []
+    for line in text.split('\n'):
+        match = LINE_ITEM.match(line)
+        if not match or NOT_AN_ITEM.search(line):
+            continue
+        description = ' '.join(re.sub(r'[^\w\s&\'./-]', ' ', match.group('description')).split())
+        if sum(c.isalpha() for c in description) < 2:
+            continue
+        items.append({'description': description, 'amount': float(match.group('amount').replace(',', '.'))})
+        if len(items) >= MAX_LINE_ITEMS:
+            break
+    return items
+
+def _no_progress(stage, **details):
+    pass
+
+OCR_UNAVAILABLE = {
+    'success': False,
+    'error': 'OCR functionality not available. Please install opencv-python, Pillow, pytesseract, and numpy packages.'
+}
+
+def ocr_image(ocr, image_bytes, progress=_no_progress):
+    """OCR one image with the cheapest tier its quality allows; returns (text, tier, initial tier, image quality, languages)"""
+    # Process image
+    with stage(SCAN_STAGE_SECONDS, stage='decode'):
+        image = ocr.Image.open(io.BytesIO(image_bytes))
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    
+    # Pick the cheapest pipeline the image quality allows
+    with stage(SCAN_STAGE_SECONDS, stage='classify'):
+        gray = ocr.to_grayscale(image)
+        ocr_tier, image_quality = ocr.classify_image_quality(gray)
+    initial_tier = ocr_tier
+    
+    # Pick the traineddata for the receipt's script once, before any OCR pass
+    with stage(SCAN_STAGE_SECONDS, stage='script_detect'):
+        languages = ocr.detect_languages(gray)
+    
+    while True:
+        # Enhanced preprocessing
+        with stage(SCAN_STAGE_SECONDS, stage='enhance'):
+            processed_image = ocr.enhance_receipt_image(image, tier=ocr_tier)
+        progress('preprocessed', tier=ocr_tier)
+        
+        # Extract text
+        with stage(SCAN_STAGE_SECONDS, stage='ocr'):
+            extracted_text = ocr.extract_text_robust(
+                processed_image, tier=ocr_tier, languages=languages,
+                on_pass=lambda k, n: progress('ocr_pass', tier=ocr_tier, current=k, total=n)
+            )
+        
+        # Escalate to the next tier when a lighter pipeline could not read the receipt
+        if ocr_tier == 'heavy' or len(extracted_text.strip()) >= 10:
+            break
+        ocr_tier = 'medium' if ocr_tier == 'cheap' else 'heavy'
+    
+    return extracted_text, ocr_tier, initial_tier, image_quality, languages
+
+@profiled
+def process_receipt(file_bytes, file_name, user_id, progress=_no_progress, content_type=None, ticket=None):
+    """Run the full scan pipeline on an upload (photo, PDF, .eml or HTML); returns (response data, HTTP status)"""
+    log.info("Processing receipt for user: %s", user_id)
+    
+    source = detect_kind(file_bytes, file_name, content_type)
+    scan_details = {'source': source}
+    sent_on = None
+    
+    if source == 'image':
+        ocr = load_ocr()
+        if ocr is None:
+            return OCR_UNAVAILABLE, 503
+        extracted_text, ocr_tier, initial_tier, image_quality, languages = ocr_image(ocr, file_bytes, progress)
+    else:
+        # E-receipts: read the text layer and only OCR pages/attachments that have none
+        try:
+            with stage(SCAN_STAGE_SECONDS, stage='text_layer'):
+                document = extract(file_bytes, source)
+        except DocumentError as e:
+            SCANS_TOTAL.inc(outcome='unreadable')
+            return {'success': False, 'error': str(e)}, 400
+        except PdfSupportMissing as e:
+            return {'success': False, 'error': str(e)}, 503
+        progress('text_layer', source=source, pages=document.pages, ocr_pages=len(document.images))
+        
+        texts = [document.text]
+        ocr_tier = initial_tier = 'text'
+        image_quality = languages = None
+        ocr = load_ocr() if document.images else None
+        if document.images and ocr is None and len(document.text.strip()) < 10:
+            return OCR_UNAVAILABLE, 503
+        # Admission only charged for a text document; each page left to OCR costs as much as a photo
+        if ocr is not None and ticket is not None:
+            try:
+                ticket.charge(len(document.images) * SCAN_COSTS['image'])
+            except Rejected as e:
+                return {'success': False, 'error': e.reason, 'retry_after': e.retry_after}, e.status
+        if ocr is not None:
+            for image_bytes in document.images:
+                text, ocr_tier, initial_tier, image_quality, languages = ocr_image(ocr, image_bytes, progress)
+                texts.append(text)
+        
+        extracted_text = '\n'.join(text for text in texts if text.strip())
+        sent_on = document.sent_on
+        scan_details.update(pages=document.pages, ocr_pages=len(document.images) if ocr is not None else 0)
+    
+    OCR_TIER_TOTAL.inc(tier=ocr_tier, initial_tier=initial_tier)
+    log.info("OCR tier: %s (classified as %s, source %s)", ocr_tier, initial_tier, source)
+    
+    # Full OCR dumps are only built when debug logging is on
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Extracted text:\n%s", extracted_text)
+    
+    if not extracted_text or len(extracted_text.strip()) < 10:
+        SCANS_TOTAL.inc(outcome='unreadable')
+        return {
+            'success': False,
+            'error': 'Could not extract readable text. Please try a clearer image.',
+            'extracted_text': extracted_text
+        }, 400
+    
+    with stage(SCAN_STAGE_SECONDS, stage='parse'):
+        # Detect popular company first
+        popular_company = detect_popular_company(extracted_text)
+        
+        if popular_company:
+            company_name = popular_company['name']
+            ticker = popular_company['ticker']
+            logo = popular_company['logo']
+            confidence_boost = 30  # Boost confidence for known companies
+            category = popular_company['category']
+            category_details = {'category_score': 1.0}
+            log.info("Detected popular company: %s (%s)", company_name, ticker)
+        else:
+            company_name = find_company_name(extracted_text)
+            ticker = None
+            logo = '🏪'
+            confidence_boost = 0
+            # Unknown stores get a category and, for brands of listed companies, a likely parent
+            match = categorize_merchant(company_name)
+            category = match.category
+            category_details = {'category_score': match.score, 'parent_ticker': match.parent_ticker,
+                                'parent_name': match.parent_name}
+        
+        total_amount = find_total_amount(extracted_text)
+        line_items = find_line_items(extracted_text)
+        # E-mailed receipts without a printed date were sent on the purchase day
+        purchase_date = find_purchase_date(extracted_text) or sent_on
+    
+    # Calculate confidence with boost for popular companies
+    confidence_score = 100 + confidence_boost
+    
+    if company_name == "Unknown Store":
+        confidence_score -= 40
+    if total_amount == 0.0:
+        confidence_score -= 50
+    if len(extracted_text.strip()) < 100:
+        confidence_score -= 20
+        
+    # Cap confidence at 100
+    confidence_score = min(confidence_score, 100)
+        
+    if confidence_score >= 80:
+        confidence = "high"
+    elif confidence_score >= 50:
+        confidence = "medium"
+    else:
+        confidence = "low"
+    
+    log.info("Results: Company='%s', Amount=$%s, Confidence=%s, Ticker=%s", company_name, total_amount, confidence, ticker)
+    progress('parsed', company_name=company_name, total_amount=total_amount, ticker=ticker)
+    
+    # Save to database
+    scan_metadata = {
+        'file_name': file_name,
+        'file_size': len(file_bytes),
+        'processing_time': datetime.now().isoformat(),
+        'detected_company': popular_company is not None,
+        'ticker': ticker,
+        'logo': logo,
+        'ocr_tier': ocr_tier,
+        'ocr_initial_tier': initial_tier,
+        'image_quality': image_quality,
+        'ocr_languages': languages,
+        **category_details,
+        **scan_details
+    }
+    
+    with stage(SCAN_STAGE_SECONDS, stage='db_write'):
+        receipt_id = get_database().save_receipt_scan(
+            user_id=user_id,
+            company_name=company_name,
+            total_amount=total_amount,
+            confidence=confidence,
+            extracted_text=extracted_text,
+            scan_metadata=scan_metadata,
+            purchase_date=purchase_date,
+            line_items=line_items,
+            category=category
+        )
+    progress('saved', receipt_id=receipt_id)
+    
+    response_data = {
+        'success': True,
+        'company_name': company_name,
+        'total_amount': total_amount,
+        'confidence': confidence,
+        'extracted_text': extracted_text,
+        'line_items': line_items,
+        'category': category,
+        'parent_ticker': category_details.get('parent_ticker'),
+        'ticker': ticker,
+        'logo': logo,
+        'is_popular_company': popular_company is not None,
+        'ocr_tier': ocr_tier,
+        'source': source,
+        'purchase_date': purchase_date.strftime('%Y-%m-%d') if purchase_date else None
+    }
+    
+    if receipt_id:
+        response_data['receipt_id'] = receipt_id
+    
+    SCANS_TOTAL.inc(outcome='success')
+    return response_data, 200
+
+def run_scan_job(job, file_bytes, file_name, content_type=None, ticket=None):
+    """Background scan that reports progress on the job's event stream"""
+    if ticket is not None:
+        ticket.start()
+    try:
+        result, status = process_receipt(file_bytes, file_name, job.user_id, progress=job.progress,
+                                         content_type=content_type, ticket=ticket)
+        job.finish(result, status)
+    except Exception as e:
+        SCANS_TOTAL.inc(outcome='error')
+        log.exception("Receipt processing failed: %s", e)
+        job.finish({'success': False, 'error': f'Processing error: {str(e)}'}, 500)
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+@scan_bp.route('/scan-receipt', methods=['POST'])
+def scan_receipt():
+    """Scan an uploaded receipt photo, PDF, .eml or HTML e-receipt"""
+    try:
+        if 'receipt' not in request.files:
+            return jsonify({'error': 'No file uploaded', 'success': False}), 400
+        
+        file = request.files['receipt']
+        if not file or file.filename == '':
+            return jsonify({'error': 'No file selected', 'success': False}), 400
+
+        # Get user_id from the verified token (or the form, under AUTH_REQUIRED=false)
+        user_id, error = authorize_user(request.form.get('user_id'))
+        if error:
+            return error
+        user_id = user_id or 'anonymous_user'
+        
+        file_bytes = file.read()
+        run_async = request.args.get('async') in ('1', 'true')
+        
+        # Charge the scan's estimated CPU cost to the process budget and the caller's rate limit
+        try:
+            cost = SCAN_COSTS[detect_kind(file_bytes, file.filename, file.mimetype)]
+            ticket = admission.admit(caller_key(), cost, holds_thread=not run_async)
+        except Rejected as e:
+            return e.response()
+        
+        # ?async=1 returns a job id at once; progress is pushed on /api/stream/scans/<job_id>
+        if run_async:
+            try:
+                job = scan_jobs.submit(user_id, run_scan_job, file_bytes, file.filename, file.mimetype, ticket,
+                                       verified=g.get('principal') is not None)
+            except Exception:
+                ticket.release()
+                raise
+            return jsonify({
+                'success': True,
+                'job_id': job.job_id,
+                'status_url': f'/api/scans/{job.job_id}',
+                'stream_url': f'/api/stream/scans/{job.job_id}'
+            }), 202
+        
+        try:
+            response_data, status = process_receipt(file_bytes, file.filename, user_id, content_type=file.mimetype,
+                                                    ticket=ticket)
+        finally:
+            ticket.release()
+        response = jsonify(response_data)
+        if 'retry_after' in response_data:
+            response.headers['Retry-After'] = str(response_data['retry_after'])
+        return response, status
+    
+    except Exception as e:
+        SCANS_TOTAL.inc(outcome='error')
+        log.exception("Receipt processing failed: %s", e)
+        return jsonify({
+            'success': False,
+            'error': f'Processing error: {str(e)}'
+        }), 500
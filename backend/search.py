@@ -0,0 +1,77 @@
+"""
+Trigram search terms for receipts.
+
+Each receipt stores `search_terms`: the word trigrams of its merchant name,
+line items and OCR text, up to MAX_TERMS. A multikey (user_id, search_terms) index turns that
+field into a per-user inverted index, so a query looks up only receipts that
+share trigrams with it. Matching on trigrams instead of whole words lets
+"headphones" still find "HEADPH0NES" or "HEADPHONE5" in noisy OCR output.
+"""
+import math
+import os
+import re
+
+# Share of a query's trigrams a receipt must contain to match
+MIN_MATCH = float(os.getenv('SEARCH_MIN_MATCH', 0.6))
+# Trigrams stored per receipt, each one a multikey index entry. Merchant and
+# line items are kept first; OCR text only fills what is left, which is
+# mostly the header and the first lines the item parser could not read.
+MAX_TERMS = 256
+
+# Digits that OCR reads in place of letters, applied inside words that have letters
+OCR_CONFUSIONS = str.maketrans({'0': 'o', '1': 'l', '5': 's', '8': 'b', '|': 'l', '$': 's'})
+TOKEN = re.compile(r"[\w|][\w|$'&]*")
+
+def normalize_word(token):
+    """Lower-case a token and undo common OCR digit-for-letter swaps; None for numbers and noise"""
+    token = token.lower()
+    if not any(c.isalpha() for c in token):
+        return None
+    token = re.sub(r"[^a-z0-9]", '', token.translate(OCR_CONFUSIONS))
+    return token if len(token) >= 2 else None
+
+def word_trigrams(word):
+    """Trigrams of ' word ', so short words and word edges are indexed too"""
+    padded = f' {word} '
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def text_words(text):
+    words = (normalize_word(token) for token in TOKEN.findall(text or ''))
+    return list(dict.fromkeys(word for word in words if word))
+
+def text_terms(text):
+    """Unique trigrams of every word in the text, in order of first appearance"""
+    terms = {}
+    for word in text_words(text):
+        terms.update(dict.fromkeys(word_trigrams(word)))
+    return list(terms)
+
+def search_terms(company_name, line_items, extracted_text):
+    """The `search_terms` stored on a receipt"""
+    terms = dict.fromkeys(text_terms(company_name))
+    for item in line_items or ():
+        terms.update(dict.fromkeys(text_terms(item.get('description'))))
+    terms.update(dict.fromkeys(text_terms(extracted_text)))
+    return list(terms)[:MAX_TERMS]
+
+def parse_query(query):
+    """Query words and their trigrams; raises ValueError when nothing searchable is left"""
+    words = text_words(query)
+    if not words:
+        raise ValueError('Search query needs at least one word of two or more letters')
+    terms = list(dict.fromkeys(term for word in words for term in word_trigrams(word)))
+    return words, terms
+
+def min_matched(terms, min_match=MIN_MATCH):
+    """Trigrams a receipt must share with the query"""
+    return max(1, math.ceil(len(terms) * min_match))
+
+def matching_items(line_items, words, min_match=MIN_MATCH):
+    """Line items that contain (most of) any query word, to show why a receipt matched"""
+    word_terms = [set(word_trigrams(word)) for word in words]
+    matches = []
+    for item in line_items or ():
+        item_terms = set(text_terms(item.get('description')))
+        if any(len(terms & item_terms) >= len(terms) * min_match for terms in word_terms):
+            matches.append(item)
+    return matches
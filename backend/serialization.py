@@ -0,0 +1,93 @@
+import gzip
+import json
+import os
+from datetime import date, datetime, timezone
+
+from bson import ObjectId
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Top-level receipt fields clients may select with ?fields=... (dotted paths into these are allowed too)
+RECEIPT_FIELDS = (
+    '_id', 'user_id', 'company_name', 'category', 'total_amount', 'confidence', 'extracted_text', 'line_items',
+    'scan_date', 'purchase_date', 'month_bucket', 'metadata', 'created_at', 'updated_at'
+)
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Types neither encoder handles natively (plus datetimes/numpy for the json fallback)"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, datetime):
+        # pymongo returns naive UTC datetimes; match orjson's OPT_NAIVE_UTC output
+        return (obj if obj.tzinfo else obj.replace(tzinfo=timezone.utc)).isoformat()
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj):
+    """Serialize to compact JSON bytes; ObjectIds become strings and datetimes ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+
+def parse_fields(raw, allowed=RECEIPT_FIELDS):
+    """Parse ?fields=a,b.c into a tuple (None when absent); raises ValueError on unknown fields"""
+    if not raw:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip()))
+    unknown = [f for f in fields if f.split('.', 1)[0] not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def projection(fields):
+    """MongoDB projection for a parse_fields() result, so unselected fields never leave the server"""
+    if not fields:
+        return None
+    selected = {field: 1 for field in fields}
+    if '_id' not in fields:
+        selected['_id'] = 0
+    return selected
+
+
+def compress(body, accept_encodings):
+    """Return (body, content-encoding or None) for the client's accepted encodings"""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if brotli is not None and accept_encodings.quality('br') > 0:
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), 'gzip'
+    return body, None
+
+
+def json_response(payload, status=200):
+    """jsonify() replacement: fast encoding plus compression above RESPONSE_COMPRESS_MIN_BYTES"""
+    body, encoding = compress(dumps(payload), request.accept_encodings)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
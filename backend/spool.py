@@ -0,0 +1,173 @@
+"""
+Local append-only spool for writes the database could not take.
+
+Each process appends to its own `<name>-<host>-<pid>-<token>.jsonl` file
+(extended JSON, so ObjectIds and datetimes round-trip) and fsyncs every
+line, so a spooled scan survives a crash. The process holds an exclusive
+flock on that file for as long as it writes to it, and a replay holds one
+on every file it is replaying. The kernel drops those locks when a process
+dies, so a file whose lock can be taken is an orphan, whatever became of
+its PID. Replay claims a file by locking it and renaming it to `.replay`,
+bulk-inserts it unordered and deletes it. Documents carry their `_id` from
+the start, so a replay that is interrupted and retried, or a write that
+reached the server before timing out, only produces duplicate-key errors,
+which are ignored.
+"""
+import fcntl
+import glob
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+from observability import Counter, Gauge
+
+log = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+SPOOL_APPENDED = Counter('spool_appended_total', 'Documents written to the local spool', labelnames=('spool',))
+SPOOL_REPLAYED = Counter('spool_replayed_total', 'Spooled documents inserted on replay', labelnames=('spool',))
+SPOOL_PENDING = Gauge('spool_pending', 'Documents this process has spooled and not yet replayed',
+                      labelnames=('spool',))
+
+
+def _try_lock(path):
+    """Open and exclusively lock a spool file; None when it is gone or another live process holds it"""
+    try:
+        handle = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        # The file may have been renamed or removed between open() and flock()
+        if os.fstat(handle.fileno()).st_ino != os.stat(path).st_ino:
+            raise FileNotFoundError(path)
+    except (BlockingIOError, FileNotFoundError):
+        handle.close()
+        return None
+    return handle
+
+
+class WriteSpool:
+    """JSON-lines files of documents waiting to be inserted into one collection"""
+
+    def __init__(self, directory, name, batch_size=1000):
+        self.directory = directory
+        self.name = name
+        self.batch_size = batch_size
+        self.pending = 0
+        self.path = None
+        self._file = None
+        self._file_pid = None
+        self._append_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+
+    def _open(self):
+        """This process's locked spool file, opened on first use (and again in workers forked after that)"""
+        if self._file is not None:
+            if self._file_pid == os.getpid():
+                return self._file
+            # Inherited across fork: let go so the lock ends with the process that wrote the file
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._file_pid = os.getpid()
+        self.path = os.path.join(
+            self.directory, f'{self.name}-{socket.gethostname()}-{self._file_pid}-{uuid.uuid4().hex[:8]}.jsonl'
+        )
+        self._file = open(self.path, 'a', encoding='utf-8')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self._file
+
+    def append(self, document):
+        """Durably append one document"""
+        line = json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS) + '\n'
+        with self._append_lock:
+            spool_file = self._open()
+            spool_file.write(line)
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+            self.pending += 1
+        SPOOL_APPENDED.inc(spool=self.name)
+        SPOOL_PENDING.set(self.pending, spool=self.name)
+
+    def _claim(self):
+        """Lock and rename this process's spool and any orphaned ones to .replay files; returns [(path, locked file)]"""
+        claimed = []
+        with self._append_lock:
+            if self._file is not None and self._file_pid == os.getpid():
+                # Keep the open, locked handle: the lock moves with the file
+                target = f'{self.path}.replay'
+                os.replace(self.path, target)
+                claimed.append((target, self._file))
+                self._file = None
+                self.pending = 0
+        SPOOL_PENDING.set(self.pending, spool=self.name)
+
+        pattern = os.path.join(self.directory, f'{self.name}-*.jsonl*')
+        for path in sorted(glob.glob(pattern)):
+            if not path.endswith(('.jsonl', '.jsonl.replay')) or any(path == taken for taken, _ in claimed):
+                continue
+            handle = _try_lock(path)
+            if handle is None:
+                continue
+            if path.endswith('.jsonl'):
+                target = f'{path}.replay'
+                os.replace(path, target)
+                path = target
+            claimed.append((path, handle))
+        return claimed
+
+    def _read(self, path):
+        with open(path, encoding='utf-8') as spool_file:
+            for number, line in enumerate(spool_file, 1):
+                try:
+                    yield json_util.loads(line)
+                except ValueError:
+                    # A line torn by a crash mid-write; everything before it is intact
+                    log.warning("Skipping unreadable line %d of %s", number, path)
+
+    def _insert(self, collection, documents):
+        try:
+            collection.insert_many(documents, ordered=False)
+            return len(documents)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                raise
+            return e.details.get('nInserted', len(documents) - len(errors))
+
+    def replay(self, collection):
+        """Insert every claimable spooled document; returns the number inserted"""
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        claimed = []
+        try:
+            inserted = 0
+            claimed = self._claim()
+            for path, _ in claimed:
+                batch = []
+                for document in self._read(path):
+                    batch.append(document)
+                    if len(batch) >= self.batch_size:
+                        inserted += self._insert(collection, batch)
+                        batch = []
+                if batch:
+                    inserted += self._insert(collection, batch)
+                os.remove(path)
+            if inserted:
+                SPOOL_REPLAYED.inc(inserted, spool=self.name)
+                log.info("Replayed %d spooled %s documents", inserted, self.name)
+            return inserted
+        finally:
+            # Unlocking leaves unfinished .replay files for the next replay, here or in another process
+            for _, handle in claimed:
+                handle.close()
+            self._replay_lock.release()
+
+    def files(self):
+        return sorted(glob.glob(os.path.join(self.directory, f'{self.name}-*.jsonl*')))
@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Response, g, request, jsonify, stream_with_context
+
+from auth import authorize_user
+from observability import Counter, Gauge, Histogram
+from quotes import REQUEST_WAIT_SECONDS, quote_service, parse_symbols
+
+log = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+QUOTE_PUSH_INTERVAL = float(os.getenv('QUOTE_PUSH_INTERVAL', 30))
+SCAN_WORKERS = int(os.getenv('SCAN_WORKERS', 2))
+SCAN_JOB_RETENTION = 15 * 60
+
+SSE_CONNECTIONS = Gauge('sse_connections', 'Open server-sent event streams', labelnames=('stream',))
+SSE_EVENTS_TOTAL = Counter('sse_events_total', 'Events queued to subscribers', labelnames=('result',))
+SSE_FANOUT_SECONDS = Histogram(
+    'sse_fanout_duration_seconds', 'Time to fan one event out to all subscribers',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+)
+
+
+class Subscription:
+    def __init__(self, broker, topics, maxsize=256):
+        self.broker = broker
+        self.topics = set(topics)
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def events(self, timeout=HEARTBEAT_SECONDS):
+        """Yield encoded events, or None after `timeout` idle seconds (for heartbeats)"""
+        while True:
+            try:
+                yield self.queue.get(timeout=timeout)
+            except queue.Empty:
+                yield None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """In-process pub/sub: each event is encoded once and queued to every subscriber of its topic"""
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def topics(self, prefix=''):
+        with self._lock:
+            return [topic for topic in self._topics if topic.startswith(prefix)]
+
+    def publish(self, topic, event_type, data):
+        start = time.perf_counter()
+        with self._lock:
+            self._sequence += 1
+            subscribers = list(self._topics.get(topic, ()))
+            sequence = self._sequence
+        if not subscribers:
+            return 0
+
+        message = encode_event(event_type, data, sequence)
+        delivered = 0
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                # Slow consumer: drop rather than block the publisher
+                SSE_EVENTS_TOTAL.inc(result='dropped')
+        SSE_EVENTS_TOTAL.inc(delivered, result='delivered')
+        SSE_FANOUT_SECONDS.observe(time.perf_counter() - start)
+        return delivered
+
+    def stats(self):
+        with self._lock:
+            return {
+                'topics': len(self._topics),
+                'subscriptions': sum(len(s) for s in self._topics.values()),
+                'events_published': self._sequence
+            }
+
+
+def encode_event(event_type, data, sequence=None):
+    lines = [f'event: {event_type}']
+    if sequence is not None:
+        lines.append(f'id: {sequence}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+broker = EventBroker()
+
+
+class QuoteFanout:
+    """One background refresh per interval for the union of subscribed symbols"""
+
+    def __init__(self, broker, service, interval):
+        self.broker = broker
+        self.service = service
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='quote-fanout', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            symbols = [topic.split(':', 1)[1] for topic in self.broker.topics('quotes:')]
+            if not symbols:
+                continue
+            try:
+                for symbol, quote in self.service.get_quotes(symbols).items():
+                    self.broker.publish(f'quotes:{symbol}', 'quote', quote)
+            except Exception as e:
+                log.warning("Quote fan-out failed: %s", e)
+
+
+quote_fanout = QuoteFanout(broker, quote_service, QUOTE_PUSH_INTERVAL)
+
+
+class ScanJob:
+    def __init__(self, user_id, verified=False):
+        self.job_id = uuid.uuid4().hex
+        self.user_id = user_id
+        # Jobs submitted with a verified token can only be read with that user's token
+        self.verified = verified
+        self.topic = f'scan:{self.job_id}'
+        self.status = 'queued'
+        self.result = None
+        self.http_status = None
+        self.created_at = time.time()
+        self.history = []
+        self._lock = threading.Lock()
+
+    def _emit(self, event_type, data):
+        with self._lock:
+            self.history.append((event_type, data))
+            broker.publish(self.topic, event_type, data)
+
+    def progress(self, stage, **details):
+        self.status = stage
+        self._emit('progress', {'job_id': self.job_id, 'stage': stage, **details})
+
+    def finish(self, result, http_status):
+        self.result = result
+        self.http_status = http_status
+        self.status = 'done' if result.get('success') else 'failed'
+        self._emit('done', {'job_id': self.job_id, 'status': self.status, 'result': result})
+
+    def subscribe(self):
+        """Subscribe and return (subscription, events so far) without gaps or duplicates"""
+        with self._lock:
+            return broker.subscribe([self.topic]), list(self.history)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'result': self.result
+        }
+
+
+class ScanJobs:
+    """Runs uploads on a small worker pool and keeps recent jobs for status/stream lookups"""
+
+    def __init__(self, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan-worker')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, func, *args, verified=False):
+        job = ScanJob(user_id, verified)
+        cutoff = time.time() - SCAN_JOB_RETENTION
+        with self._lock:
+            for job_id in [j for j, old in self._jobs.items() if old.created_at < cutoff]:
+                del self._jobs[job_id]
+            self._jobs[job.job_id] = job
+        job.progress('queued')
+        self.executor.submit(func, job, *args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+scan_jobs = ScanJobs(SCAN_WORKERS)
+
+streams_bp = Blueprint('streams', __name__)
+
+
+def sse_response(generator, stream):
+    def counted():
+        SSE_CONNECTIONS.inc(stream=stream)
+        try:
+            yield from generator
+        finally:
+            SSE_CONNECTIONS.dec(stream=stream)
+
+    return Response(stream_with_context(counted()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@streams_bp.route('/stream/quotes', methods=['GET'])
+def stream_quotes():
+    """Push quote updates for ?symbols=... (one shared upstream refresh per interval)"""
+    symbols, invalid = parse_symbols(request.args.get('symbols'))
+    if invalid or not symbols:
+        return jsonify({'success': False, 'error': 'Provide supported ?symbols='}), 400
+
+    subscription = broker.subscribe([f'quotes:{s}' for s in symbols])
+    quote_fanout.ensure_running()
+    # Symbols still pending arrive with the next fan-out round
+    snapshot, _ = quote_service.get_quotes_within(symbols, REQUEST_WAIT_SECONDS)
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            for quote in snapshot.values():
+                yield encode_event('quote', quote)
+            for message in subscription.events():
+                yield message if message is not None else ': keep-alive\n\n'
+        finally:
+            subscription.close()
+
+    return sse_response(generate(), 'quotes')
+
+
+def authorize_job(job):
+    """Return None when the caller may read the job, or an error response"""
+    if job.verified and g.get('principal') is None:
+        return jsonify({'success': False, 'error': 'Authentication required'}), 401
+    _, error = authorize_user(job.user_id)
+    return error
+
+
+@streams_bp.route('/stream/scans/<job_id>', methods=['GET'])
+def stream_scan(job_id):
+    """Push progress events for an async scan job until it finishes"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown scan job'}), 404
+    error = authorize_job(job)
+    if error:
+        return error
+
+    subscription, history = job.subscribe()
+
+    def generate():
+        try:
+            for event_type, data in history:
+                yield encode_event(event_type, data)
+                if event_type == 'done':
+                    return
+            for message in subscription.events():
+                if message is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield message
+                if message.startswith('event: done'):
+                    return
+        finally:
+            subscription.close()
+
+    return sse_response(generate(), 'scans')
+
+
+@streams_bp.route('/scans/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    """Polling fallback for async scan jobs"""
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown scan job'}), 404
+    error = authorize_job(job)
+    if error:
+        return error
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@streams_bp.route('/stream/stats', methods=['GET'])
+def get_stream_stats():
+    """Subscriber and fan-out counters"""
+    return jsonify({'success': True, 'stats': broker.stats()})
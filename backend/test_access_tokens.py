@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+import database
+from access_tokens import InvalidToken, TokenSigner, issue_tokens, signer, verify_access_token, verify_refresh_token
+
+mongomock = pytest.importorskip('mongomock')
+
+
+def test_access_token_round_trip():
+    tokens = issue_tokens('u1', 'a@example.com', 'A')
+    principal = verify_access_token(tokens['access_token'])
+    assert (principal.user_id, principal.email, principal.name) == ('u1', 'a@example.com', 'A')
+    assert verify_refresh_token(tokens['refresh_token'])['sub'] == 'u1'
+
+
+def test_token_types_are_not_interchangeable():
+    tokens = issue_tokens('u1', 'a@example.com', 'A')
+    with pytest.raises(InvalidToken):
+        verify_access_token(tokens['refresh_token'])
+    with pytest.raises(InvalidToken):
+        verify_refresh_token(tokens['access_token'])
+
+
+@pytest.mark.parametrize('claims', [
+    {'iss': 'someone-else', 'typ': 'access', 'sub': 'u1', 'exp': time.time() + 60},
+    {'typ': 'access', 'sub': 'u1', 'exp': time.time() + 60},
+    {'iss': 'finlit', 'typ': 'access', 'sub': 'u1', 'exp': time.time() - 1},
+])
+def test_rejects_foreign_or_expired_claims(claims):
+    with pytest.raises(InvalidToken):
+        verify_access_token(signer.encode(claims))
+
+
+def test_rejects_other_keys_and_tampering():
+    foreign = TokenSigner('another-secret').encode({'iss': 'finlit', 'typ': 'access', 'sub': 'u1', 'exp': time.time() + 60})
+    with pytest.raises(InvalidToken):
+        verify_access_token(foreign)
+
+    header, payload, signature = issue_tokens('u1', 'a@example.com', 'A')['access_token'].split('.')
+    other_payload = issue_tokens('u2', 'b@example.com', 'B')['access_token'].split('.')[1]
+    with pytest.raises(InvalidToken):
+        verify_access_token(f'{header}.{other_payload}.{signature}')
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import auth
+    from scanner import create_app
+
+    monkeypatch.setattr(database, '_shared_database', database.ReceiptDatabase(client=mongomock.MongoClient()))
+    monkeypatch.setattr(auth, '_refresh_indexes_ready', False)
+    return create_app('auth').test_client()
+
+
+def test_refresh_token_is_single_use(client):
+    import auth
+
+    refresh_token = auth.issue_session('u1', 'a@example.com', 'A')['refresh_token']
+    response = client.post('/auth/refresh', json={'refresh_token': refresh_token})
+    assert response.status_code == 200
+    rotated = response.get_json()['refresh_token']
+
+    assert client.post('/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+    assert client.post('/auth/refresh', json={'refresh_token': rotated}).status_code == 200
+
+
+def test_logout_revokes_refresh_token(client):
+    import auth
+
+    refresh_token = auth.issue_session('u1', 'a@example.com', 'A')['refresh_token']
+    assert client.post('/auth/logout', json={'refresh_token': refresh_token}).status_code == 200
+    assert client.post('/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+
+def test_unrecorded_refresh_token_is_refused(client):
+    refresh_token = issue_tokens('u1', 'a@example.com', 'A')['refresh_token']
+    assert client.post('/auth/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    from scanner import create_app
+
+    monkeypatch.setattr(database, '_shared_database', database.ReceiptDatabase(client=mongomock.MongoClient()))
+    return create_app('api').test_client()
+
+
+def bearer(user_id):
+    return {'Authorization': 'Bearer ' + issue_tokens(user_id, f'{user_id}@example.com', user_id)['access_token']}
+
+
+@pytest.mark.parametrize('method, url', [
+    ('get', '/api/dashboard/receipts/u1'),
+    ('get', '/api/dashboard/search/u1?q=coffee'),
+    ('get', '/api/trading/portfolio/u1'),
+    ('put', '/api/compliance/u1/status'),
+])
+def test_user_routes_require_the_users_token(api_client, method, url):
+    call = getattr(api_client, method)
+    assert call(url, json={'status': 'H-1B'}).status_code == 401
+    assert call(url, json={'status': 'H-1B'}, headers=bearer('u2')).status_code == 403
+    assert call(url, json={'status': 'H-1B'}, headers=bearer('u1')).status_code == 200
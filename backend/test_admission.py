@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from admission import AdmissionController, Rejected
+
+
+def test_queue_wait_is_not_counted_as_scan_time():
+    controller = AdmissionController(cpu_budget=4, rate_per_minute=600, burst=100)
+    ticket = controller.admit('user:u1', 1.0, holds_thread=False)
+    time.sleep(0.3)
+    ticket.start()
+    ticket.release()
+    # The moving average starts at 3 s and moves a fifth of the way toward the ~0 s scan
+    assert controller.state()['estimated_scan_seconds'] == pytest.approx(2.4, abs=0.05)
+
+
+def test_unstarted_ticket_leaves_estimate_alone():
+    controller = AdmissionController(cpu_budget=4, rate_per_minute=600, burst=100)
+    controller.admit('user:u1', 1.0, holds_thread=False).release()
+    assert controller.state()['estimated_scan_seconds'] == 3.0
+
+
+def test_sheds_over_budget_and_rate_limits():
+    controller = AdmissionController(cpu_budget=1.5, rate_per_minute=60, burst=1.25)
+    controller.admit('user:u1', 1.0)
+    with pytest.raises(Rejected) as shed:
+        controller.admit('user:u2', 1.0)
+    assert shed.value.status == 503
+
+    controller.admit('user:u1', 0.25, holds_thread=False)
+    with pytest.raises(Rejected) as limited:
+        controller.admit('user:u1', 0.25, holds_thread=False)
+    assert limited.value.status == 429
+
+
+def test_ocr_pages_found_after_admission_are_charged():
+    controller = AdmissionController(cpu_budget=10, rate_per_minute=60, burst=5)
+    ticket = controller.admit('user:u1', 0.25)
+    ticket.charge(3.0)
+    assert controller.state()['in_flight_cost'] == 3.25
+
+    # The caller's bucket has 1.75 left, so a second document's pages are refused
+    other = controller.admit('user:u1', 0.25, holds_thread=False)
+    with pytest.raises(Rejected) as limited:
+        other.charge(2.0)
+    assert limited.value.status == 429
+    assert controller.state()['in_flight_cost'] == 3.5
+
+    ticket.release()
+    other.release()
+    assert controller.state()['in_flight_cost'] == 0.0
+
+
+def test_top_up_over_budget_is_shed_unless_the_scan_runs_alone():
+    controller = AdmissionController(cpu_budget=2, rate_per_minute=600, burst=100)
+    alone = controller.admit('user:u1', 0.25)
+    alone.charge(10.0)
+    alone.release()
+
+    first = controller.admit('user:u1', 1.0)
+    second = controller.admit('user:u2', 0.25)
+    with pytest.raises(Rejected) as shed:
+        second.charge(1.0)
+    assert shed.value.status == 503
+    first.release()
+    second.release()
@@ -0,0 +1,55 @@
+from datetime import date
+
+import numpy as np
+
+from backtest import run_backtest
+
+# Offset calendars: AAA misses Jan 4 and 8, BBB misses Jan 2 and 5
+PRICES = {
+    'AAA': (np.array(['2024-01-02', '2024-01-03', '2024-01-05'], dtype='datetime64[D]'),
+            np.array([10.0, 20.0, 25.0])),
+    'BBB': (np.array(['2024-01-03', '2024-01-04', '2024-01-08'], dtype='datetime64[D]'),
+            np.array([5.0, 4.0, 8.0])),
+}
+
+PURCHASES = [
+    ('AAA', date(2024, 1, 1), 100.0),   # fills Jan 2 at 10 -> 10 shares
+    ('AAA', date(2024, 1, 4), 50.0),    # fills Jan 5 at 25 -> 2 shares
+    ('BBB', date(2024, 1, 3), 20.0),    # fills Jan 3 at 5 -> 4 shares
+    ('BBB', date(2024, 1, 9), 30.0),    # after BBB's last close: pending
+    ('ZZZ', date(2024, 1, 2), 10.0),    # no price history
+]
+
+
+def test_purchases_fill_at_the_next_close_on_a_shared_calendar():
+    result = run_backtest(PURCHASES, PRICES.get)
+
+    assert result['missing_prices'] == ['ZZZ']
+    assert result['pending_purchases'] == 1
+    assert result['series'] == [
+        {'date': '2024-01-02', 'invested': 100.0, 'value': 100.0},
+        {'date': '2024-01-03', 'invested': 120.0, 'value': 220.0},
+        {'date': '2024-01-04', 'invested': 120.0, 'value': 216.0},
+        {'date': '2024-01-05', 'invested': 170.0, 'value': 316.0},
+        {'date': '2024-01-08', 'invested': 170.0, 'value': 332.0},
+    ]
+    assert result['summary'] == {'invested': 170.0, 'value': 332.0, 'gain': 162.0,
+                                 'return_pct': 95.29, 'purchases': 3}
+    assert [(t['ticker'], t['purchases'], t['shares'], t['value'], t['return_pct'])
+            for t in result['tickers']] == [('AAA', 2, 12.0, 300.0, 100.0), ('BBB', 1, 4.0, 32.0, 60.0)]
+
+
+def test_end_date_drops_later_closes():
+    result = run_backtest(PURCHASES, PRICES.get, end_date=date(2024, 1, 4))
+
+    # AAA's Jan 4 purchase now has no close to fill at
+    assert result['pending_purchases'] == 2
+    assert result['series'][-1] == {'date': '2024-01-04', 'invested': 120.0, 'value': 216.0}
+    assert result['summary']['purchases'] == 2
+
+
+def test_no_prices_at_all():
+    result = run_backtest([('ZZZ', date(2024, 1, 2), 10.0)], PRICES.get)
+    assert result['missing_prices'] == ['ZZZ']
+    assert result['series'] == []
+    assert result['summary']['purchases'] == 0
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from compliance import ComplianceEngine, TradeWindow, account_equity, market_day
+from trading import Position
+
+# Wednesday 2025-03-05, mid-session in New York
+WEDNESDAY = datetime(2025, 3, 5, 15, 0, tzinfo=timezone.utc)
+
+
+def test_market_day_uses_new_york_dates_and_folds_weekends_into_monday():
+    ordinal, business_day = market_day(WEDNESDAY)
+    # 01:00 UTC Thursday is still Wednesday evening in New York
+    assert market_day(datetime(2025, 3, 6, 1, 0, tzinfo=timezone.utc)) == (ordinal, business_day)
+    saturday = market_day(WEDNESDAY + timedelta(days=3))
+    monday = market_day(WEDNESDAY + timedelta(days=5))
+    assert saturday[1] == monday[1] == business_day + 3
+
+
+def test_day_trades_leave_the_window_after_five_business_days():
+    window = TradeWindow()
+    day, business_day = market_day(WEDNESDAY)
+    window.record(day, business_day, 'AAPL', 'buy')
+    window.record(day, business_day, 'AAPL', 'sell')
+    assert len(window.day_trades) == 1
+
+    # Four business days later (Tuesday) it still counts; on the fifth (Wednesday) it is gone
+    window.advance(*market_day(WEDNESDAY + timedelta(days=6)))
+    assert len(window.day_trades) == 1
+    window.advance(*market_day(WEDNESDAY + timedelta(days=7)))
+    assert len(window.day_trades) == 0
+
+
+def test_trades_leave_the_frequency_window_after_seven_days():
+    window = TradeWindow()
+    window.record(*market_day(WEDNESDAY), 'AAPL', 'buy')
+    window.advance(*market_day(WEDNESDAY + timedelta(days=6)))
+    assert len(window.trade_days) == 1
+    window.advance(*market_day(WEDNESDAY + timedelta(days=7)))
+    assert len(window.trade_days) == 0
+
+
+def test_fourth_day_trade_is_blocked_under_pdt_equity():
+    engine = ComplianceEngine()
+    engine.set_status('u1', 'H-1B')
+    for hours in range(3):
+        now = WEDNESDAY + timedelta(hours=hours)
+        engine.record_fill('u1', 'AAPL', 'buy', now)
+        engine.record_fill('u1', 'AAPL', 'sell', now)
+
+    decision, violations = engine.evaluate('u1', 'AAPL', 'sell', 1, 10.0, equity=lambda: 1000.0,
+                                           now=WEDNESDAY + timedelta(hours=4))
+    assert decision == 'block'
+    assert [v.rule for v in violations] == ['pattern_day_trader']
+
+    decision, _ = engine.evaluate('u1', 'AAPL', 'sell', 1, 10.0, equity=lambda: 30000.0,
+                                  now=WEDNESDAY + timedelta(hours=4))
+    assert decision == 'warn'
+
+
+
+def test_account_equity_marks_positions_at_the_engines_last_quotes():
+    engine = ComplianceEngine()
+    engine.set_status('u1', 'H-1B')
+    for hours in range(3):
+        now = WEDNESDAY + timedelta(hours=hours)
+        engine.record_fill('u1', 'AAPL', 'buy', now)
+        engine.record_fill('u1', 'AAPL', 'sell', now)
+    account = SimpleNamespace(user_id='u1', cash=1000.0, positions={'AAPL': SimpleNamespace(quantity=200)})
+    trading = SimpleNamespace(marks={})
+
+    def decide():
+        return engine.evaluate('u1', 'AAPL', 'sell', 1, 10.0, equity=account_equity(trading, account),
+                               now=WEDNESDAY + timedelta(hours=4))[0]
+
+    assert decide() == 'block'
+    trading.marks['AAPL'] = 150.0
+    assert decide() == 'warn'
+
+
+def test_holding_period_only_checks_the_lots_a_sell_consumes():
+    engine = ComplianceEngine()
+    engine.set_status('u1', 'F-1')
+    position = Position('AAPL')
+    position.buy(5, 100.0, WEDNESDAY - timedelta(days=60))
+    position.buy(5, 100.0, WEDNESDAY - timedelta(days=2))
+    account = SimpleNamespace(positions={'AAPL': position})
+
+    decision, _ = engine.evaluate('u1', 'AAPL', 'sell', 5, 100.0, account=account, now=WEDNESDAY)
+    assert decision == 'allow'
+    decision, violations = engine.evaluate('u1', 'AAPL', 'sell', 6, 100.0, account=account, now=WEDNESDAY)
+    assert decision == 'warn' and [v.rule for v in violations] == ['holding_period']
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from database import ReceiptDatabase, month_bucket, months_back_bucket
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    monkeypatch.setattr('database.SPOOL_DIR', str(tmp_path))
+    return ReceiptDatabase(client=mongomock.MongoClient())
+
+
+def test_month_bucket():
+    assert month_bucket(datetime(2024, 9, 30, tzinfo=timezone.utc)) == 202409
+    assert month_bucket(datetime(2025, 1, 1, tzinfo=timezone.utc)) == 202501
+
+
+def test_months_back_bucket_crosses_years():
+    now = datetime(2025, 2, 15, tzinfo=timezone.utc)
+    assert months_back_bucket(1, now) == 202502
+    assert months_back_bucket(3, now) == 202412
+    assert months_back_bucket(14, now) == 202401
+    # A window of zero or fewer months still covers the current one
+    assert months_back_bucket(0, now) == 202502
+
+
+def test_failed_index_creation_is_retried(db, monkeypatch):
+    create_index = db.collection.create_index
+    calls = []
+
+    def flaky(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError('server selection timed out')
+        return create_index(*args, **kwargs)
+
+    monkeypatch.setattr(db.collection, 'create_index', flaky)
+    db.ensure_indexes()
+    assert not db._indexes_ready
+
+    db._indexes_retry_at = 0
+    db.ensure_indexes()
+    assert db._indexes_ready
+    assert 'user_id_1_month_bucket_-1' in db.collection.index_information()
+
+
+def test_backfill_month_buckets(db):
+    scanned = datetime(2024, 3, 5, tzinfo=timezone.utc)
+    db.collection.insert_one({'user_id': 'u1', 'scan_date': scanned})
+    assert db.backfill_month_buckets() == 1
+    assert db.collection.find_one({'user_id': 'u1'})['month_bucket'] == 202403
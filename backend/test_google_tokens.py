@@ -0,0 +1,103 @@
+import base64
+import time
+
+import pytest
+
+pytest.importorskip('google.auth')
+pytest.importorskip('cryptography')
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+import google_tokens
+from google_tokens import GoogleTokenVerifier
+
+CLIENT_ID = 'client-123.apps.googleusercontent.com'
+
+
+def _b64(number):
+    return base64.urlsafe_b64encode(number.to_bytes((number.bit_length() + 7) // 8, 'big')).rstrip(b'=').decode()
+
+
+@pytest.fixture(scope='module')
+def private_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def jwks(private_key, kid):
+    numbers = private_key.public_key().public_numbers()
+    return {'keys': [{'kty': 'RSA', 'kid': kid, 'alg': 'RS256', 'n': _b64(numbers.n), 'e': _b64(numbers.e)}]}
+
+
+def sign(private_key, kid='k1', **claims):
+    pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    now = int(time.time())
+    payload = {'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': 'g-1',
+               'email': 'a@example.com', 'iat': now, 'exp': now + 3600, **claims}
+    return jwt.encode(crypt.RSASigner.from_string(pem, key_id=kid), payload).decode()
+
+
+class CertsSession:
+    """Stands in for requests.Session and counts cert fetches"""
+
+    def __init__(self, body):
+        self.body = body
+        self.fetches = 0
+
+    def get(self, url, timeout=None):
+        self.fetches += 1
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+    headers = {'Cache-Control': 'public, max-age=3600'}
+
+
+def test_verified_tokens_are_cached_until_they_expire(private_key, monkeypatch):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs=jwks(private_key, 'k1'))
+    token = sign(private_key)
+    assert verifier.verify(token)['sub'] == 'g-1'
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError('cache miss')
+
+    monkeypatch.setattr(jwt, 'decode', no_decode)
+    assert verifier.verify(token)['email'] == 'a@example.com'
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval(private_key):
+    session = CertsSession(jwks(private_key, 'k1'))
+    verifier = GoogleTokenVerifier(CLIENT_ID, session=session)
+    verifier.verify(sign(private_key))
+    assert session.fetches == 1
+
+    with pytest.raises(ValueError):
+        verifier.verify(sign(private_key, kid='forged'))
+    with pytest.raises(ValueError):
+        verifier.verify(sign(private_key, kid='forged', sub='g-2'))
+    assert session.fetches == 1
+
+    # Once the interval has passed a rotated key is picked up
+    verifier._certs_fetched_at -= google_tokens.MIN_FORCED_REFRESH_INTERVAL
+    session.body = jwks(private_key, 'k2')
+    assert verifier.verify(sign(private_key, kid='k2', sub='g-3'))['sub'] == 'g-3'
+    assert session.fetches == 2
+
+
+def test_expired_tokens_are_rejected(private_key):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs=jwks(private_key, 'k1'))
+    now = int(time.time())
+    with pytest.raises(ValueError):
+        verifier.verify(sign(private_key, iat=now - 7200, exp=now - 3600))
+
+
+def test_wrong_issuer_is_rejected(private_key):
+    verifier = GoogleTokenVerifier(CLIENT_ID, certs=jwks(private_key, 'k1'))
+    with pytest.raises(ValueError, match='Wrong issuer'):
+        verifier.verify(sign(private_key, iss='https://evil.example.com'))
@@ -0,0 +1,36 @@
+import threading
+import time
+
+from observability import Histogram
+
+
+def test_decorated_timer_is_per_call():
+    histogram = Histogram('test_timer_seconds', 'Concurrent timer test', buckets=(0.05, 0.15, 1.0))
+    release = threading.Event()
+
+    @histogram.time()
+    def handle(wait):
+        if wait:
+            release.wait(1)
+
+    worker = threading.Thread(target=handle, args=(True,))
+    worker.start()
+    time.sleep(0.1)
+    # A fast call made while the slow one runs must not reset the slow call's start time
+    handle(False)
+    release.set()
+    worker.join()
+
+    counts, total, count = histogram._series[()]
+    assert count == 2
+    assert counts[0] == 1  # fast call, under 50 ms
+    assert counts[1] == 1  # slow call, about 100 ms
+    assert total >= 0.1
+
+
+def test_context_manager_records_elapsed():
+    histogram = Histogram('test_block_seconds', 'Block timer test', labelnames=('stage',))
+    with histogram.time(stage='parse') as timer:
+        time.sleep(0.01)
+    assert timer.elapsed >= 0.01
+    assert histogram.count(stage='parse') == 1
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+
+from price_store import ROW_BYTES, PriceStore
+
+
+def bars(*days, close=1.0):
+    return {'date': np.array(days, dtype='datetime64[D]'), 'close': np.full(len(days), close)}
+
+
+def test_seed_from_fixtures_loads_each_csv(tmp_path):
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    (fixtures / 'aapl.csv').write_text('date,close,volume\n2024-01-03,11.0,200\n2024-01-02,10.0,100\n')
+    (fixtures / 'msft.csv').write_text('date,close\n2024-01-02,300.5\n')
+    (fixtures / 'empty.csv').write_text('date,close\n')
+    store = PriceStore(str(tmp_path / 'prices'))
+
+    assert store.seed_from_fixtures(str(fixtures)) == {'AAPL': 2, 'MSFT': 1}
+    assert store.tickers() == ['AAPL', 'MSFT']
+    data = store.read('AAPL', columns=('date', 'open', 'close', 'volume'))
+    assert [str(d) for d in data['date']] == ['2024-01-02', '2024-01-03']
+    assert list(data['close']) == [10.0, 11.0]
+    # Price columns missing from the fixture are filled with the close
+    assert list(data['open']) == [10.0, 11.0]
+    assert list(data['volume']) == [100, 200]
+    # Seeding again adds nothing
+    assert store.seed_from_fixtures(str(fixtures)) == {'AAPL': 0, 'MSFT': 0}
+
+
+def test_overlapping_and_older_bars_are_not_appended(tmp_path):
+    store = PriceStore(str(tmp_path))
+    assert store.append('AAPL', bars('2024-01-02', '2024-01-03', '2024-01-03')) == 2
+
+    assert store.append('AAPL', bars('2024-01-01', '2024-01-03', close=9.0)) == 0
+    assert store.append('AAPL', bars('2024-01-03', '2024-01-04', close=9.0)) == 1
+    data = store.read('AAPL')
+    assert [str(d) for d in data['date']] == ['2024-01-02', '2024-01-03', '2024-01-04']
+    assert list(data['close']) == [1.0, 1.0, 9.0]
+
+
+def test_read_bounds_are_inclusive(tmp_path):
+    store = PriceStore(str(tmp_path))
+    store.append('AAPL', bars('2024-01-02', '2024-01-03', '2024-01-05', '2024-01-08'))
+
+    def dates(start, end):
+        return [str(d) for d in store.read('AAPL', start=start, end=end)['date']]
+
+    assert dates('2024-01-03', '2024-01-05') == ['2024-01-03', '2024-01-05']
+    assert dates('2024-01-04', '2024-01-07') == ['2024-01-05']
+    assert dates(None, '2024-01-02') == ['2024-01-02']
+    assert dates('2024-01-08', None) == ['2024-01-08']
+    assert dates('2024-01-09', None) == []
+    assert store.read('MSFT') is None
+
+
+def test_torn_append_is_truncated_to_the_date_column(tmp_path):
+    store = PriceStore(str(tmp_path))
+    store.append('AAPL', bars('2024-01-02', '2024-01-03'))
+    # A crash after writing `close` but before `date`
+    with open(os.path.join(str(tmp_path), 'AAPL', 'close.bin'), 'ab') as f:
+        f.write(np.array([99.0]).tobytes())
+    assert store.rows('AAPL') == 2
+
+    assert store.append('AAPL', bars('2024-01-04', close=3.0)) == 1
+    for column in ('open', 'high', 'low', 'close', 'volume', 'date'):
+        assert os.path.getsize(os.path.join(str(tmp_path), 'AAPL', f'{column}.bin')) == 3 * ROW_BYTES
+    assert list(store.read('AAPL')['close']) == [1.0, 1.0, 3.0]
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from quotes import QuoteService, TokenBucket
+
+
+class SlowProvider:
+    name = 'slow'
+    max_batch_size = 2
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def fetch_quotes(self, symbols):
+        self.calls += 1
+        self.release.wait(5)
+        return {symbol: {'symbol': symbol, 'price': 10.0 + self.calls} for symbol in symbols}
+
+
+def test_bounded_wait_returns_stale_and_pending():
+    provider = SlowProvider()
+    service = QuoteService(provider, ttl=0, limiter=TokenBucket(rate=100, capacity=100))
+    provider.release.set()
+    assert service.get_quotes(['AAPL'])['AAPL']['price'] == 11.0
+    provider.release.clear()
+
+    start = time.monotonic()
+    quotes, pending = service.get_quotes_within(['AAPL', 'MSFT'], wait=0.1)
+    assert time.monotonic() - start < 1
+    assert pending == ['AAPL', 'MSFT']
+    assert quotes == {'AAPL': {'symbol': 'AAPL', 'price': 11.0}}
+
+    # The background fetch completes and fills the cache for the next caller
+    provider.release.set()
+    service.ttl = 60
+    deadline = time.monotonic() + 5
+    while service.stats()['inflight_symbols'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    quotes, pending = service.get_quotes_within(['AAPL', 'MSFT'], wait=0.1)
+    assert pending == []
+    assert quotes['MSFT']['price'] == 12.0
+
+
+def test_bounded_wait_joins_inflight_fetch():
+    provider = SlowProvider()
+    service = QuoteService(provider, ttl=60, limiter=TokenBucket(rate=100, capacity=100))
+    service.get_quotes_within(['AAPL'], wait=0)
+    _, pending = service.get_quotes_within(['AAPL'], wait=0)
+    assert pending == ['AAPL']
+    assert provider.calls == 1
+    provider.release.set()
+    quotes, pending = service.get_quotes_within(['AAPL'], wait=5)
+    assert quotes['AAPL']['price'] == 11.0 and pending == []
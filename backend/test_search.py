@@ -0,0 +1,14 @@
+from search import MAX_TERMS, parse_query, search_terms, text_terms
+
+
+def test_search_terms_keep_merchant_and_items_under_the_cap():
+    noise = ' '.join(f'noise{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}' for i in range(1000))
+    terms = search_terms('Target', [{'description': 'Sony Headphones'}], noise)
+    assert len(terms) == MAX_TERMS
+    assert set(text_terms('Target')) <= set(terms)
+    assert set(text_terms('Sony Headphones')) <= set(terms)
+
+
+def test_query_trigrams_undo_ocr_swaps():
+    _, terms = parse_query('HEADPH0NES')
+    assert terms == parse_query('headphones')[1]
@@ -0,0 +1,66 @@
+import fcntl
+import os
+
+import pytest
+from bson import ObjectId, json_util
+
+from spool import WriteSpool
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def collection():
+    return mongomock.MongoClient().db.receipts
+
+
+def write_spool_file(path, documents):
+    with open(path, 'w', encoding='utf-8') as spool_file:
+        spool_file.writelines(json_util.dumps(document) + '\n' for document in documents)
+
+
+def test_replay_inserts_once(tmp_path, collection):
+    spool = WriteSpool(str(tmp_path), 'receipts')
+    documents = [{'_id': ObjectId(), 'total_amount': i} for i in range(5)]
+    for document in documents:
+        spool.append(document)
+    assert spool.pending == 5
+
+    assert spool.replay(collection) == 5
+    assert spool.replay(collection) == 0
+    assert spool.pending == 0 and spool.files() == []
+    assert collection.count_documents({}) == 5
+
+
+def test_interrupted_replay_skips_documents_already_inserted(tmp_path, collection):
+    documents = [{'_id': ObjectId(), 'total_amount': i} for i in range(4)]
+    collection.insert_many(documents[:2])
+    # A replay that died after its first batch leaves its .replay file behind, unlocked
+    write_spool_file(tmp_path / 'receipts-otherhost-123-abcd1234.jsonl.replay', documents)
+
+    assert WriteSpool(str(tmp_path), 'receipts').replay(collection) == 2
+    assert collection.count_documents({}) == 4
+
+
+def test_files_locked_by_a_live_process_are_left_alone(tmp_path, collection):
+    live = tmp_path / 'receipts-otherhost-123-abcd1234.jsonl'
+    orphan = tmp_path / 'receipts-otherhost-456-ef567890.jsonl'
+    write_spool_file(live, [{'_id': ObjectId()}])
+    write_spool_file(orphan, [{'_id': ObjectId()}])
+
+    with open(live, 'a') as owner:
+        fcntl.flock(owner, fcntl.LOCK_EX)
+        assert WriteSpool(str(tmp_path), 'receipts').replay(collection) == 1
+        assert os.path.exists(live) and not os.path.exists(orphan)
+    assert WriteSpool(str(tmp_path), 'receipts').replay(collection) == 1
+    assert collection.count_documents({}) == 2
+
+
+def test_appends_after_replay_go_to_a_new_file(tmp_path, collection):
+    spool = WriteSpool(str(tmp_path), 'receipts')
+    spool.append({'_id': ObjectId()})
+    first = spool.path
+    spool.replay(collection)
+    spool.append({'_id': ObjectId()})
+    assert spool.path != first and spool.files() == [spool.path]
+    assert spool.replay(collection) == 1
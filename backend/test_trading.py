@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from trading import STARTING_CASH, PaperTradingEngine, Position, QuotePending
+
+OPENED = datetime(2025, 3, 3, tzinfo=timezone.utc)
+
+
+def test_sell_consumes_lots_first_in_first_out():
+    position = Position('AAPL')
+    position.buy(10, 100.0, OPENED)
+    position.buy(10, 110.0, OPENED)
+
+    assert position.sell(15, 120.0) == pytest.approx(10 * 20 + 5 * 10)
+    assert position.quantity == pytest.approx(5)
+    assert position.cost_basis == pytest.approx(5 * 110)
+    assert [(lot.quantity, lot.price) for lot in position.lots] == [(5, 110.0)]
+    assert position.unrealized_pnl(100.0) == pytest.approx(-50)
+
+
+def test_closing_a_position_clears_rounding_residue():
+    position = Position('AAPL')
+    position.buy(0.1, 100.0, OPENED)
+    position.buy(0.2, 100.0, OPENED)
+    position.sell(0.3, 90.0)
+    assert not position.lots
+    assert position.quantity == 0.0 and position.cost_basis == 0.0
+    assert position.realized_pnl == pytest.approx(-3.0)
+
+
+def test_document_round_trip_keeps_lot_order():
+    position = Position('MSFT')
+    position.buy(2, 300.0, OPENED)
+    position.buy(1, 310.0, OPENED)
+    position.sell(1, 320.0)
+
+    restored = Position.from_doc('MSFT', position.to_doc())
+    assert restored.to_doc() == position.to_doc()
+    assert restored.sell(2, 330.0) == pytest.approx(30 + 20)
+
+
+class PendingQuotes:
+    """Quote service whose provider has not answered yet; AAPL has a stale quote"""
+
+    def add_listener(self, callback):
+        pass
+
+    def get_quotes_within(self, symbols, wait):
+        return {s: {'symbol': s, 'price': 150.0} for s in symbols if s == 'AAPL'}, list(symbols)
+
+
+def test_market_order_on_a_pending_quote_asks_for_a_retry():
+    engine = PaperTradingEngine(PendingQuotes())
+    with pytest.raises(QuotePending):
+        engine.place_order('u1', 'AAPL', 'buy', 1)
+    assert engine.account('u1').cash == STARTING_CASH
+
+
+def test_portfolio_marks_to_stale_quotes():
+    engine = PaperTradingEngine(PendingQuotes())
+    engine.account('u1').positions['AAPL'] = position = Position('AAPL')
+    position.buy(2, 100.0, OPENED)
+
+    portfolio = engine.portfolio('u1')
+    assert portfolio['pending_quotes'] == ['AAPL']
+    assert portfolio['positions'][0]['mark'] == 150.0
+    assert portfolio['positions'][0]['stale'] is True
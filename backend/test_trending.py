@@ -0,0 +1,93 @@
+import random
+import time
+from collections import Counter
+
+import pytest
+
+from trending import DECAY_SECONDS, CohortTrends, HyperLogLog, SpaceSaving
+
+
+def test_hll_merge_matches_a_sketch_of_the_union():
+    left, right, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i in range(6000):
+        (left if i % 2 else right).add(f'user-{i}')
+        union.add(f'user-{i}')
+    left.merge(right)
+    assert left.registers == union.registers
+    assert left.count() == pytest.approx(6000, rel=0.1)
+
+
+def test_hll_small_counts_use_linear_counting():
+    sketch = HyperLogLog()
+    for i in range(50):
+        sketch.add(i)
+        sketch.add(i)
+    assert sketch.count() == pytest.approx(50, abs=3)
+
+
+def stream(seed, n=5000):
+    rng = random.Random(seed)
+    # A few heavy merchants in a long tail of small ones
+    return [(f'm{min(int(rng.paretovariate(1.2)), 500)}', rng.uniform(1, 50)) for _ in range(n)]
+
+
+def assert_bounds(sketch, truth):
+    for key, entry in sketch.entries.items():
+        assert entry['count'] - entry['error'] - 1e-6 <= truth[key] <= entry['count'] + 1e-6
+
+
+def test_space_saving_counts_bound_the_true_weight():
+    truth = Counter()
+    sketch = SpaceSaving(capacity=20)
+    for key, weight in stream(1):
+        truth[key] += weight
+        sketch.add(key, weight)
+    assert_bounds(sketch, truth)
+    # Anything with over 1/capacity of the total weight is guaranteed a counter
+    total = sum(truth.values())
+    assert {key for key, weight in truth.items() if weight > total / 20} <= set(sketch.entries)
+
+
+def test_space_saving_merge_keeps_bounds_and_heavy_hitters():
+    truth = Counter()
+    sketches = []
+    for seed in (1, 2):
+        sketch = SpaceSaving(capacity=20, track_users=True)
+        for i, (key, weight) in enumerate(stream(seed)):
+            truth[key] += weight
+            sketch.add(key, weight, user_id=f'{seed}-{i % 40}')
+        sketches.append(sketch)
+    merged = sketches[0].merge(sketches[1])
+
+    assert len(merged.entries) <= 20
+    assert_bounds(merged, truth)
+    total = sum(truth.values())
+    assert {key for key, weight in truth.items() if weight > total / 20} <= set(merged.entries)
+    top_key = max(truth, key=truth.get)
+    assert merged.top(1)[0][0] == top_key
+    assert merged.entries[top_key]['users'].count() == pytest.approx(80, abs=5)
+
+
+def test_sketch_documents_round_trip():
+    sketch = SpaceSaving(capacity=5, track_users=True)
+    for key, weight in stream(3, n=200):
+        sketch.add(key, weight, name=key.upper(), user_id=key)
+    restored = SpaceSaving.from_doc(sketch.to_doc(), capacity=5, track_users=True)
+    assert restored.to_doc() == sketch.to_doc()
+
+
+def test_cohort_merge_rebases_decayed_spend():
+    # Recent enough that merge() does not rebase onto today
+    landmark = time.time() // 86400 * 86400 - 2 * 86400
+    a, b = CohortTrends(landmark), CohortTrends(landmark + 86400)
+    a.add('u1', 'Target', 'TGT', 10.0, landmark + 3600)
+    b.add('u2', 'Target', 'TGT', 20.0, landmark + 90000)
+
+    expected = 10.0 * a.weight(landmark + 3600) + 20.0 * a.weight(landmark + 90000)
+    a.merge(b)
+    assert a.landmark == landmark
+    assert a.spend == 30.0 and a.receipts == 2
+    assert a.decayed_spend == pytest.approx(expected)
+    assert a.tickers['TGT']['decayed'] == pytest.approx(expected)
+    assert a.recent.entries['target']['count'] == pytest.approx(expected)
+    assert a.weight(landmark + DECAY_SECONDS) == pytest.approx(2.718281828)
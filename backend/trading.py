@@ -0,0 +1,649 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from flask import Blueprint, request, jsonify
+from pymongo import ReplaceOne, UpdateOne
+
+from auth import authorize_user, user_route
+from observability import Counter, DB_OPERATION_SECONDS, DB_ERRORS_TOTAL
+from quotes import REQUEST_WAIT_SECONDS, quote_service, parse_symbols
+
+log = logging.getLogger(__name__)
+
+STARTING_CASH = float(os.getenv('PAPER_STARTING_CASH', 10000))
+FLUSH_INTERVAL = float(os.getenv('PAPER_FLUSH_INTERVAL', 1.0))
+FLUSH_BATCH_SIZE = int(os.getenv('PAPER_FLUSH_BATCH_SIZE', 500))
+EPSILON = 1e-9
+
+PAPER_ORDERS_TOTAL = Counter('paper_orders_total', 'Paper trading orders by type and outcome', labelnames=('type', 'outcome'))
+PAPER_FILLS_TOTAL = Counter('paper_fills_total', 'Paper trading fills', labelnames=('side',))
+
+
+class OrderRejected(ValueError):
+    pass
+
+
+class QuotePending(OrderRejected):
+    """The symbol's quote is still being fetched; the same order can be retried shortly"""
+    retry_after = 1
+
+
+class Lot:
+    """One buy still (partly) held; sells consume lots first-in first-out"""
+    __slots__ = ('quantity', 'price', 'opened_at')
+
+    def __init__(self, quantity, price, opened_at):
+        self.quantity = quantity
+        self.price = price
+        self.opened_at = opened_at
+
+
+class Position:
+    """Quantity, cost basis and realised P&L, all updated in O(lots consumed) per fill"""
+    __slots__ = ('symbol', 'quantity', 'cost_basis', 'realized_pnl', 'lots')
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.quantity = 0.0
+        self.cost_basis = 0.0
+        self.realized_pnl = 0.0
+        self.lots = deque()
+
+    def buy(self, quantity, price, at):
+        self.lots.append(Lot(quantity, price, at))
+        self.quantity += quantity
+        self.cost_basis += quantity * price
+
+    def sell(self, quantity, price):
+        realized = 0.0
+        remaining = quantity
+        while remaining > EPSILON:
+            lot = self.lots[0]
+            taken = min(remaining, lot.quantity)
+            realized += taken * (price - lot.price)
+            self.cost_basis -= taken * lot.price
+            lot.quantity -= taken
+            remaining -= taken
+            if lot.quantity <= EPSILON:
+                self.lots.popleft()
+        self.quantity -= quantity
+        if not self.lots:
+            self.quantity = self.cost_basis = 0.0
+        self.realized_pnl += realized
+        return realized
+
+    def unrealized_pnl(self, mark):
+        return self.quantity * mark - self.cost_basis
+
+    def to_doc(self):
+        return {
+            'quantity': self.quantity,
+            'cost_basis': self.cost_basis,
+            'realized_pnl': self.realized_pnl,
+            'lots': [[lot.quantity, lot.price, lot.opened_at] for lot in self.lots]
+        }
+
+    @classmethod
+    def from_doc(cls, symbol, doc):
+        position = cls(symbol)
+        position.quantity = doc['quantity']
+        position.cost_basis = doc['cost_basis']
+        position.realized_pnl = doc['realized_pnl']
+        position.lots = deque(Lot(*lot) for lot in doc['lots'])
+        return position
+
+
+class Order:
+    __slots__ = ('order_id', 'user_id', 'symbol', 'side', 'order_type', 'quantity', 'limit_price',
+                 'status', 'created_at', 'fill_price', 'filled_at', 'warnings')
+
+    def __init__(self, user_id, symbol, side, order_type, quantity, limit_price, created_at):
+        self.order_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.status = 'open'
+        self.created_at = created_at
+        self.fill_price = None
+        self.filled_at = None
+        self.warnings = []
+
+    def to_doc(self):
+        return {
+            'order_id': self.order_id,
+            'user_id': self.user_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'type': self.order_type,
+            'quantity': self.quantity,
+            'limit_price': self.limit_price,
+            'status': self.status,
+            'created_at': self.created_at,
+            'fill_price': self.fill_price,
+            'filled_at': self.filled_at,
+            'warnings': self.warnings
+        }
+
+
+class Account:
+    __slots__ = ('user_id', 'cash', 'reserved_cash', 'reserved_shares', 'realized_pnl', 'positions', 'open_orders')
+
+    def __init__(self, user_id, cash=STARTING_CASH):
+        self.user_id = user_id
+        self.cash = cash
+        self.reserved_cash = 0.0
+        self.reserved_shares = {}
+        self.realized_pnl = 0.0
+        self.positions = {}
+        self.open_orders = {}
+
+    def available_shares(self, symbol):
+        position = self.positions.get(symbol)
+        return (position.quantity if position else 0.0) - self.reserved_shares.get(symbol, 0.0)
+
+    def to_doc(self):
+        return {
+            'cash': self.cash,
+            'realized_pnl': self.realized_pnl,
+            'positions': {symbol: p.to_doc() for symbol, p in self.positions.items() if p.lots},
+            'updated_at': datetime.now(timezone.utc)
+        }
+
+
+class OrderBook:
+    """Resting limit orders for one symbol; cancelled orders are skipped lazily when popped"""
+
+    def __init__(self):
+        self.bids = []      # (-limit, sequence, order)
+        self.asks = []      # (limit, sequence, order)
+
+    def add(self, order, sequence):
+        if order.side == 'buy':
+            heapq.heappush(self.bids, (-order.limit_price, sequence, order))
+        else:
+            heapq.heappush(self.asks, (order.limit_price, sequence, order))
+
+    def crossed(self, price):
+        """Pop every open order the price now satisfies, best limit (then oldest) first"""
+        crossed = []
+        while self.bids and -self.bids[0][0] >= price:
+            order = heapq.heappop(self.bids)[2]
+            if order.status == 'open':
+                crossed.append(order)
+        while self.asks and self.asks[0][0] <= price:
+            order = heapq.heappop(self.asks)[2]
+            if order.status == 'open':
+                crossed.append(order)
+        return crossed
+
+    def depth(self):
+        return {
+            'bids': sum(1 for _, _, o in self.bids if o.status == 'open'),
+            'asks': sum(1 for _, _, o in self.asks if o.status == 'open')
+        }
+
+
+class PaperTradingEngine:
+    """
+    In-memory paper trading against the shared quote cache.
+
+    Market orders fill at the current quote; limit orders fill at once if
+    the quote already satisfies them, otherwise they rest in a per-symbol
+    book and fill when a fresh quote crosses them. Accounts keep FIFO lots
+    and update cash and P&L incrementally on each fill. Fills, order changes
+    and account snapshots are buffered and written with bulk_write, at most
+    every `flush_interval` seconds or `batch_size` events.
+    """
+
+    def __init__(self, quotes, database=None, flush_interval=FLUSH_INTERVAL, batch_size=FLUSH_BATCH_SIZE):
+        self.quotes = quotes
+        self.database = None
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # check(account, order, price) -> list of warnings; raise OrderRejected to refuse the order
+        self.pre_trade_checks = []
+        # listener(order), called under the engine lock after each fill
+        self.fill_listeners = []
+        self.marks = {}
+
+        self._accounts = {}
+        self._books = {}
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+
+        self._pending_fills = []
+        self._pending_orders = {}
+        self._dirty_accounts = set()
+        self._flush_lock = threading.Lock()
+        self._flush_wakeup = threading.Event()
+        self._flusher = None
+        self._indexes_ready = False
+
+        if database is not None:
+            self.bind(database)
+        quotes.add_listener(self.on_quotes)
+
+    def bind(self, database):
+        """Persist to the given pymongo Database (None keeps the engine in memory only)"""
+        self.database = database
+        self._indexes_ready = False
+
+    def ensure_indexes(self):
+        """Create indexes once, from the first flush rather than at startup"""
+        if self._indexes_ready or self.database is None:
+            return
+        self._indexes_ready = True
+        try:
+            self.database['paper_fills'].create_index([('user_id', 1), ('filled_at', -1)])
+            self.database['paper_orders'].create_index([('user_id', 1), ('status', 1)])
+        except Exception as e:
+            log.warning("Paper trading index creation failed: %s", e)
+
+    # -- accounts -----------------------------------------------------------
+
+    def _load_account(self, user_id):
+        """Return (account, its open orders) from the database, or a fresh account"""
+        account, orders = Account(user_id), []
+        if self.database is None:
+            return account, orders
+        try:
+            doc = self.database['paper_accounts'].find_one({'_id': user_id})
+            if doc:
+                account.cash = doc['cash']
+                account.realized_pnl = doc['realized_pnl']
+                account.positions = {s: Position.from_doc(s, p) for s, p in doc['positions'].items()}
+            for order_doc in self.database['paper_orders'].find({'user_id': user_id, 'status': 'open'}):
+                order = Order(user_id, order_doc['symbol'], order_doc['side'], order_doc['type'],
+                              order_doc['quantity'], order_doc['limit_price'], order_doc['created_at'])
+                order.order_id = order_doc['_id']
+                orders.append(order)
+        except Exception as e:
+            DB_ERRORS_TOTAL.inc(method='paper_load_account')
+            log.error("Failed to load paper account %s: %s", user_id, e)
+        return account, orders
+
+    def account(self, user_id):
+        account = self._accounts.get(user_id)
+        if account is not None:
+            return account
+        loaded, orders = self._load_account(user_id)
+        with self._lock:
+            account = self._accounts.get(user_id)
+            if account is None:
+                account = self._accounts[user_id] = loaded
+                for order in orders:
+                    self._reserve(account, order)
+                    self._book(order.symbol).add(order, next(self._sequence))
+        return account
+
+    def _book(self, symbol):
+        book = self._books.get(symbol)
+        if book is None:
+            book = self._books[symbol] = OrderBook()
+        return book
+
+    # -- orders -------------------------------------------------------------
+
+    def _price(self, symbol):
+        # Bounded wait: a drained quote budget must not hold the request thread
+        quotes, pending = self.quotes.get_quotes_within([symbol], REQUEST_WAIT_SECONDS)
+        if symbol in pending:
+            # A stale quote is fine for display, not for filling a market order
+            raise QuotePending(f'Quote for {symbol} is still being fetched, retry shortly')
+        quote = quotes.get(symbol)
+        if quote is None:
+            raise OrderRejected(f'No quote available for {symbol}')
+        return quote['price']
+
+    def _reserve(self, account, order):
+        account.open_orders[order.order_id] = order
+        if order.side == 'buy':
+            account.reserved_cash += order.quantity * order.limit_price
+        else:
+            account.reserved_shares[order.symbol] = account.reserved_shares.get(order.symbol, 0.0) + order.quantity
+
+    def _release(self, account, order):
+        account.open_orders.pop(order.order_id, None)
+        if order.side == 'buy':
+            account.reserved_cash -= order.quantity * order.limit_price
+        else:
+            account.reserved_shares[order.symbol] -= order.quantity
+
+    def place_order(self, user_id, symbol, side, quantity, order_type='market', limit_price=None):
+        """Validate, then fill or rest an order; raises OrderRejected"""
+        if side not in ('buy', 'sell'):
+            raise OrderRejected("side must be 'buy' or 'sell'")
+        if order_type not in ('market', 'limit'):
+            raise OrderRejected("type must be 'market' or 'limit'")
+        quantity = float(quantity)
+        if quantity <= 0:
+            raise OrderRejected('quantity must be positive')
+        if order_type == 'limit':
+            if limit_price is None or float(limit_price) <= 0:
+                raise OrderRejected('limit orders need a positive limit_price')
+            limit_price = float(limit_price)
+        else:
+            limit_price = None
+
+        # Quote lookups may wait (briefly) on the provider, so they happen outside the engine lock
+        price = self._price(symbol)
+        account = self.account(user_id)
+        now = datetime.now(timezone.utc)
+
+        with self._lock:
+            order = Order(user_id, symbol, side, order_type, quantity, limit_price, now)
+            for check in self.pre_trade_checks:
+                try:
+                    order.warnings.extend(check(account, order, price) or ())
+                except OrderRejected:
+                    PAPER_ORDERS_TOTAL.inc(type=order_type, outcome='rejected')
+                    raise
+
+            if side == 'buy':
+                needed = quantity * (limit_price if order_type == 'limit' else price)
+                if account.cash - account.reserved_cash < needed - EPSILON:
+                    PAPER_ORDERS_TOTAL.inc(type=order_type, outcome='rejected')
+                    raise OrderRejected('Insufficient buying power')
+            elif account.available_shares(symbol) < quantity - EPSILON:
+                PAPER_ORDERS_TOTAL.inc(type=order_type, outcome='rejected')
+                raise OrderRejected(f'Insufficient {symbol} shares')
+
+            if order_type == 'market' or (side == 'buy' and price <= limit_price) or (side == 'sell' and price >= limit_price):
+                self._fill(account, order, price, now)
+                PAPER_ORDERS_TOTAL.inc(type=order_type, outcome='filled')
+            else:
+                self._reserve(account, order)
+                self._book(symbol).add(order, next(self._sequence))
+                self._record(order)
+                PAPER_ORDERS_TOTAL.inc(type=order_type, outcome='resting')
+
+        self._after_write()
+        return order
+
+    def cancel_order(self, user_id, order_id):
+        account = self.account(user_id)
+        with self._lock:
+            order = account.open_orders.get(order_id)
+            if order is None:
+                return None
+            self._release(account, order)
+            order.status = 'cancelled'
+            self._record(order)
+        self._after_write()
+        return order
+
+    def _fill(self, account, order, price, now):
+        """Apply a fill to the account (engine lock held)"""
+        if order.status == 'open' and order.order_id in account.open_orders:
+            self._release(account, order)
+
+        position = account.positions.get(order.symbol)
+        if position is None:
+            position = account.positions[order.symbol] = Position(order.symbol)
+
+        realized = 0.0
+        if order.side == 'buy':
+            account.cash -= order.quantity * price
+            position.buy(order.quantity, price, now)
+        else:
+            realized = position.sell(order.quantity, price)
+            account.cash += order.quantity * price
+            account.realized_pnl += realized
+
+        order.status = 'filled'
+        order.fill_price = price
+        order.filled_at = now
+        self.marks[order.symbol] = price
+        PAPER_FILLS_TOTAL.inc(side=order.side)
+        for listener in self.fill_listeners:
+            listener(order)
+
+        self._record(order, {
+            '_id': order.order_id,
+            'user_id': account.user_id,
+            'symbol': order.symbol,
+            'side': order.side,
+            'quantity': order.quantity,
+            'price': price,
+            'realized_pnl': realized,
+            'filled_at': now
+        })
+
+    def _record(self, order, fill=None):
+        """Buffer an order change (and fill) for the next flush (engine lock held)"""
+        if self.database is None:
+            return
+        self._pending_orders[order.order_id] = order
+        if fill is not None:
+            self._pending_fills.append(fill)
+            self._dirty_accounts.add(order.user_id)
+
+    def on_quotes(self, quotes):
+        """Quote listener: record marks and fill resting orders the new prices cross"""
+        now = datetime.now(timezone.utc)
+        filled = False
+        with self._lock:
+            for symbol, quote in quotes.items():
+                price = quote['price']
+                self.marks[symbol] = price
+                book = self._books.get(symbol)
+                if book is None:
+                    continue
+                for order in book.crossed(price):
+                    # Limit orders never fill worse than their limit
+                    fill_price = min(price, order.limit_price) if order.side == 'buy' else max(price, order.limit_price)
+                    self._fill(self._accounts[order.user_id], order, fill_price, now)
+                    filled = True
+        if filled:
+            self._after_write()
+
+    # -- reads --------------------------------------------------------------
+
+    def portfolio(self, user_id):
+        account = self.account(user_id)
+        symbols = [s for s, p in account.positions.items() if p.lots]
+        quotes, pending = {}, []
+        if symbols:
+            # Refreshes marks through the quote cache (and fills any crossed orders); symbols
+            # still being fetched keep their last mark
+            quotes, pending = self.quotes.get_quotes_within(symbols, REQUEST_WAIT_SECONDS)
+
+        with self._lock:
+            positions = []
+            market_value = unrealized = 0.0
+            for symbol in symbols:
+                position = account.positions[symbol]
+                quote = quotes.get(symbol)
+                mark = self.marks.get(symbol, quote['price'] if quote else position.cost_basis / position.quantity)
+                value = position.quantity * mark
+                market_value += value
+                unrealized += position.unrealized_pnl(mark)
+                positions.append({
+                    'symbol': symbol,
+                    'quantity': round(position.quantity, 6),
+                    'average_cost': round(position.cost_basis / position.quantity, 4),
+                    'mark': mark,
+                    'market_value': round(value, 2),
+                    'unrealized_pnl': round(position.unrealized_pnl(mark), 2),
+                    'realized_pnl': round(position.realized_pnl, 2),
+                    'lots': len(position.lots),
+                    'stale': symbol in pending
+                })
+            return {
+                'cash': round(account.cash, 2),
+                'buying_power': round(account.cash - account.reserved_cash, 2),
+                'market_value': round(market_value, 2),
+                'equity': round(account.cash + market_value, 2),
+                'realized_pnl': round(account.realized_pnl, 2),
+                'unrealized_pnl': round(unrealized, 2),
+                'positions': sorted(positions, key=lambda p: p['market_value'], reverse=True),
+                'open_orders': len(account.open_orders),
+                'pending_quotes': pending
+            }
+
+    def open_orders(self, user_id):
+        account = self.account(user_id)
+        with self._lock:
+            return [order.to_doc() for order in account.open_orders.values()]
+
+    def book_depth(self, symbol):
+        with self._lock:
+            book = self._books.get(symbol)
+            return book.depth() if book else {'bids': 0, 'asks': 0}
+
+    # -- persistence --------------------------------------------------------
+
+    def _after_write(self):
+        if self.database is None:
+            return
+        if len(self._pending_fills) + len(self._pending_orders) >= self.batch_size:
+            self._flush_wakeup.set()
+        if self._flusher is None and self.flush_interval:
+            with self._flush_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='paper-trading-flush', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            self.flush()
+
+    @DB_OPERATION_SECONDS.time(method='paper_trading_flush')
+    def flush(self):
+        """Write buffered fills, order changes and account snapshots; return the number of writes"""
+        if self.database is None:
+            return 0
+
+        with self._flush_lock:
+            self.ensure_indexes()
+            with self._lock:
+                fills, self._pending_fills = self._pending_fills, []
+                orders, self._pending_orders = self._pending_orders, {}
+                dirty, self._dirty_accounts = self._dirty_accounts, set()
+                order_docs = [order.to_doc() for order in orders.values()]
+                snapshots = {user_id: self._accounts[user_id].to_doc() for user_id in dirty}
+
+            try:
+                # Every write is an upsert keyed by id, so a retried batch cannot duplicate rows
+                if fills:
+                    self.database['paper_fills'].bulk_write([
+                        ReplaceOne({'_id': fill['_id']}, fill, upsert=True) for fill in fills
+                    ], ordered=False)
+                if order_docs:
+                    self.database['paper_orders'].bulk_write([
+                        UpdateOne({'_id': doc.pop('order_id')}, {'$set': doc}, upsert=True) for doc in order_docs
+                    ], ordered=False)
+                if snapshots:
+                    self.database['paper_accounts'].bulk_write([
+                        UpdateOne({'_id': user_id}, {'$set': doc}, upsert=True) for user_id, doc in snapshots.items()
+                    ], ordered=False)
+            except Exception as e:
+                DB_ERRORS_TOTAL.inc(method='paper_trading_flush')
+                log.error("Paper trading flush failed, will retry: %s", e)
+                with self._lock:
+                    self._pending_fills[:0] = fills
+                    for order in orders.values():
+                        self._pending_orders.setdefault(order.order_id, order)
+                    self._dirty_accounts |= dirty
+                return 0
+
+            return len(fills) + len(order_docs) + len(snapshots)
+
+
+trading_engine = PaperTradingEngine(quote_service)
+
+trading_bp = Blueprint('trading', __name__)
+
+
+@trading_bp.route('/orders', methods=['POST'])
+def place_order():
+    """Place a paper market or limit order"""
+    try:
+        data = request.get_json() or {}
+        user_id, error = authorize_user(data.get('user_id'))
+        if error:
+            return error
+        if not user_id:
+            return jsonify({'success': False, 'error': 'user_id is required'}), 400
+
+        symbols, invalid = parse_symbols(data.get('symbol'))
+        if invalid or len(symbols) != 1:
+            return jsonify({'success': False, 'error': f"Unsupported symbol: {data.get('symbol')}"}), 400
+
+        order = trading_engine.place_order(
+            user_id,
+            symbols[0],
+            data.get('side'),
+            data.get('quantity', 0),
+            order_type=data.get('type', 'market'),
+            limit_price=data.get('limit_price')
+        )
+        return jsonify({'success': True, 'order': order.to_doc()}), 201
+
+    except QuotePending as e:
+        return jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after}), 503, {
+            'Retry-After': str(e.retry_after)
+        }
+    except OrderRejected as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@trading_bp.route('/orders/<order_id>', methods=['DELETE'])
+def cancel_order(order_id):
+    """Cancel a resting limit order"""
+    user_id, error = authorize_user(request.args.get('user_id'))
+    if error:
+        return error
+    if not user_id:
+        return jsonify({'success': False, 'error': 'user_id is required'}), 400
+    order = trading_engine.cancel_order(user_id, order_id)
+    if order is None:
+        return jsonify({'success': False, 'error': 'Open order not found'}), 404
+    return jsonify({'success': True, 'order': order.to_doc()})
+
+
+@trading_bp.route('/orders/<user_id>', methods=['GET'])
+@user_route
+def get_open_orders(user_id):
+    """Resting limit orders for a user"""
+    return jsonify({'success': True, 'orders': trading_engine.open_orders(user_id)})
+
+
+@trading_bp.route('/portfolio/<user_id>', methods=['GET'])
+@user_route
+def get_portfolio(user_id):
+    """Cash, positions and P&L marked to the latest cached quotes"""
+    try:
+        return jsonify({'success': True, 'portfolio': trading_engine.portfolio(user_id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@trading_bp.route('/fills/<user_id>', methods=['GET'])
+@user_route
+def get_fills(user_id):
+    """Recent persisted fills (newest first)"""
+    if trading_engine.database is None:
+        return jsonify({'success': True, 'fills': []})
+    try:
+        fills = list(trading_engine.database['paper_fills'].find(
+            {'user_id': user_id}
+        ).sort('filled_at', -1).limit(int(request.args.get('limit', 50))))
+        for fill in fills:
+            fill['order_id'] = fill.pop('_id')
+        return jsonify({'success': True, 'fills': fills})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
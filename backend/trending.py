@@ -0,0 +1,507 @@
+"""
+Global and per-cohort merchant popularity, maintained incrementally.
+
+Every saved scan is recorded in memory and flushed every
+TRENDS_FLUSH_INTERVAL seconds into one `merchant_trends` document per
+cohort: 'global', plus 'status:<immigration status>' for users with a
+compliance profile. Each document is bounded, so the trending endpoints
+read a single small document however many receipts exist. It holds:
+
+- spend and receipt totals per ticker (catalogue and parent-brand tickers);
+- a Space-Saving top-K sketch of merchants by all-time spend, each counter
+  carrying its receipt count and a HyperLogLog of the users who shop there;
+- a second Space-Saving sketch weighted by forward-decayed spend. Weights
+  grow as exp((t - landmark) / TRENDS_DECAY_DAYS), so increments never need
+  rewriting, and dividing by the current weight at read time gives spend
+  over roughly the last TRENDS_DECAY_DAYS days ("this week").
+
+All three summaries are mergeable: each process flushes its pending scans
+as a delta, merged into the stored document with a version check, so
+concurrent OCR workers never lose each other's updates.
+"""
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from flask import Blueprint, request, jsonify
+from pymongo.errors import DuplicateKeyError
+
+from observability import Counter, DB_OPERATION_SECONDS, DB_ERRORS_TOTAL
+
+log = logging.getLogger(__name__)
+
+# Merchants tracked per sketch; any merchant with over 1/K of the spend is always among them
+TOP_K = int(os.getenv('TRENDS_TOP_K', 200))
+# 2**p HyperLogLog registers per tracked merchant (p=10: 1 KB, about 3% error)
+HLL_PRECISION = int(os.getenv('TRENDS_HLL_PRECISION', 10))
+DECAY_DAYS = float(os.getenv('TRENDS_DECAY_DAYS', 7))
+FLUSH_INTERVAL = float(os.getenv('TRENDS_FLUSH_INTERVAL', 5))
+# Scans buffered between flushes; the oldest are dropped beyond this while the database is down
+MAX_PENDING = int(os.getenv('TRENDS_MAX_PENDING', 50000))
+# Cohort merchants shopped at by fewer estimated users are left out of cohort results
+MIN_COHORT_USERS = int(os.getenv('TRENDS_MIN_COHORT_USERS', 5))
+CACHE_SECONDS = float(os.getenv('TRENDS_CACHE_SECONDS', 5))
+CAS_RETRIES = 5
+
+DECAY_SECONDS = DECAY_DAYS * 86400
+# Decayed weights are rebased once they exceed e**REBASE_AFTER, long before float overflow
+REBASE_AFTER = 200
+GLOBAL = 'global'
+WINDOWS = ('all', 'week')
+
+TRENDS_DROPPED = Counter('trends_dropped_total', 'Scans dropped from the trend buffer while flushes failed')
+
+
+def merchant_key(name):
+    return ' '.join((name or '').lower().split())
+
+
+def cohort_id(status):
+    return f'status:{status}'
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 2**p one-byte registers"""
+
+    def __init__(self, p=HLL_PRECISION, registers=None):
+        self.p = p
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << p)
+
+    def add(self, item):
+        value = int.from_bytes(hashlib.blake2b(str(item).encode(), digest_size=8).digest(), 'big')
+        index = value >> (64 - self.p)
+        rest = value & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        np.maximum(np.frombuffer(self.registers, np.uint8), np.frombuffer(other.registers, np.uint8),
+                   out=np.frombuffer(self.registers, np.uint8))
+        return self
+
+    def count(self):
+        registers = np.frombuffer(self.registers, np.uint8)
+        m = len(registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / np.ldexp(1.0, -registers.astype(np.int32)).sum()
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while few registers are set
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class SpaceSaving:
+    """
+    Weighted Space-Saving heavy hitters, keeping at most `capacity` counters.
+
+    A new key that arrives when the sketch is full takes over the smallest
+    counter, inheriting its count as `error`, so `count` overestimates the
+    true weight by at most `error`. Each counter also carries the receipt
+    count, display name, ticker and (optionally) a HyperLogLog of users
+    seen since the key was admitted.
+    """
+
+    def __init__(self, capacity=TOP_K, track_users=False):
+        self.capacity = capacity
+        self.track_users = track_users
+        self.entries = {}
+
+    def _new_entry(self, count=0.0, error=0.0):
+        return {'count': count, 'error': error, 'receipts': 0, 'name': None, 'ticker': None,
+                'users': HyperLogLog() if self.track_users else None}
+
+    def _floor(self):
+        return min(entry['count'] for entry in self.entries.values()) if len(self.entries) >= self.capacity else 0.0
+
+    def add(self, key, weight, name=None, ticker=None, user_id=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            if len(self.entries) >= self.capacity:
+                evicted = min(self.entries, key=lambda k: self.entries[k]['count'])
+                floor = self.entries.pop(evicted)['count']
+                entry = self._new_entry(floor, floor)
+            else:
+                entry = self._new_entry()
+            self.entries[key] = entry
+        entry['count'] += weight
+        entry['receipts'] += 1
+        entry['name'] = entry['name'] or name
+        entry['ticker'] = entry['ticker'] or ticker
+        if entry['users'] is not None and user_id is not None:
+            entry['users'].add(user_id)
+
+    def scale(self, factor):
+        for entry in self.entries.values():
+            entry['count'] *= factor
+            entry['error'] *= factor
+
+    def merge(self, other):
+        """Combine two sketches; a key missing from a full sketch is credited with that sketch's floor"""
+        own_floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for key in self.entries.keys() | other.entries.keys():
+            mine, theirs = self.entries.get(key), other.entries.get(key)
+            entry = self._new_entry(
+                (mine['count'] if mine else own_floor) + (theirs['count'] if theirs else other_floor),
+                (mine['error'] if mine else own_floor) + (theirs['error'] if theirs else other_floor)
+            )
+            for part in (mine, theirs):
+                if part is None:
+                    continue
+                entry['receipts'] += part['receipts']
+                entry['name'] = entry['name'] or part['name']
+                entry['ticker'] = entry['ticker'] or part['ticker']
+                if entry['users'] is not None and part['users'] is not None:
+                    entry['users'].merge(part['users'])
+            merged[key] = entry
+        top = sorted(merged, key=lambda k: merged[k]['count'], reverse=True)[:self.capacity]
+        self.entries = {key: merged[key] for key in top}
+        return self
+
+    def top(self, limit):
+        return sorted(self.entries.items(), key=lambda item: item[1]['count'], reverse=True)[:limit]
+
+    def to_doc(self):
+        return [{
+            'key': key, 'count': entry['count'], 'error': entry['error'], 'receipts': entry['receipts'],
+            'name': entry['name'], 'ticker': entry['ticker'],
+            **({'users': bytes(entry['users'].registers)} if entry['users'] is not None else {})
+        } for key, entry in self.entries.items()]
+
+    @classmethod
+    def from_doc(cls, items, capacity=TOP_K, track_users=False):
+        sketch = cls(capacity, track_users)
+        for item in items or []:
+            entry = sketch._new_entry(item['count'], item['error'])
+            entry.update(receipts=item['receipts'], name=item.get('name'), ticker=item.get('ticker'))
+            if track_users:
+                registers = item.get('users')
+                entry['users'] = HyperLogLog(registers=registers) if registers else HyperLogLog()
+            sketch.entries[item['key']] = entry
+        return sketch
+
+
+class CohortTrends:
+    """Ticker totals plus all-time and decayed merchant sketches for one cohort"""
+
+    def __init__(self, landmark=None):
+        # Decayed weights are relative to this epoch second
+        self.landmark = landmark if landmark is not None else time.time() // 86400 * 86400
+        self.receipts = 0
+        self.spend = 0.0
+        self.decayed_spend = 0.0
+        self.tickers = {}
+        self.merchants = SpaceSaving(track_users=True)
+        self.recent = SpaceSaving()
+
+    def weight(self, timestamp):
+        return math.exp((timestamp - self.landmark) / DECAY_SECONDS)
+
+    def add(self, user_id, name, ticker, amount, timestamp):
+        key = merchant_key(name)
+        decayed = amount * self.weight(timestamp)
+        self.receipts += 1
+        self.spend += amount
+        self.decayed_spend += decayed
+        if ticker:
+            totals = self.tickers.setdefault(ticker, {'spend': 0.0, 'receipts': 0, 'decayed': 0.0})
+            totals['spend'] += amount
+            totals['receipts'] += 1
+            totals['decayed'] += decayed
+        if key:
+            self.merchants.add(key, amount, name, ticker, user_id)
+            self.recent.add(key, decayed, name, ticker)
+
+    def rebase(self, landmark):
+        """Move the decay epoch to `landmark`, rescaling the decayed counts"""
+        factor = math.exp((self.landmark - landmark) / DECAY_SECONDS)
+        self.decayed_spend *= factor
+        for totals in self.tickers.values():
+            totals['decayed'] *= factor
+        self.recent.scale(factor)
+        self.landmark = landmark
+
+    def merge(self, other):
+        if other.landmark != self.landmark:
+            other.rebase(self.landmark)
+        self.receipts += other.receipts
+        self.spend += other.spend
+        self.decayed_spend += other.decayed_spend
+        for ticker, delta in other.tickers.items():
+            totals = self.tickers.setdefault(ticker, {'spend': 0.0, 'receipts': 0, 'decayed': 0.0})
+            for field in totals:
+                totals[field] += delta[field]
+        self.merchants.merge(other.merchants)
+        self.recent.merge(other.recent)
+        now = time.time()
+        if (now - self.landmark) / DECAY_SECONDS > REBASE_AFTER:
+            self.rebase(now // 86400 * 86400)
+        return self
+
+    def decay_now(self):
+        """Multiplier turning stored decayed counts into current values"""
+        return math.exp((self.landmark - time.time()) / DECAY_SECONDS)
+
+    def to_doc(self):
+        return {
+            'landmark': self.landmark,
+            'receipts': self.receipts,
+            'spend': self.spend,
+            'decayed_spend': self.decayed_spend,
+            'tickers': self.tickers,
+            'merchants': self.merchants.to_doc(),
+            'recent': self.recent.to_doc(),
+            'updated_at': datetime.now(timezone.utc)
+        }
+
+    @classmethod
+    def from_doc(cls, doc):
+        trends = cls(doc['landmark'])
+        trends.receipts = doc.get('receipts', 0)
+        trends.spend = doc.get('spend', 0.0)
+        trends.decayed_spend = doc.get('decayed_spend', 0.0)
+        trends.tickers = doc.get('tickers') or {}
+        trends.merchants = SpaceSaving.from_doc(doc.get('merchants'), track_users=True)
+        trends.recent = SpaceSaving.from_doc(doc.get('recent'))
+        return trends
+
+
+class TrendTracker:
+    """Buffers scans and merges them into the stored cohort documents on a background flush"""
+
+    def __init__(self, database=None, flush_interval=FLUSH_INTERVAL):
+        self.database = database
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flusher = None
+        self._unmerged = {}
+        self._cache = {}
+
+    @property
+    def collection(self):
+        return self.database['merchant_trends']
+
+    def record(self, user_id, company_name, ticker, amount, when=None):
+        """Count one saved receipt; cheap, the database is only touched by the flush"""
+        timestamp = min((when or datetime.now(timezone.utc)).timestamp(), time.time())
+        with self._lock:
+            self._pending.append((user_id, company_name, ticker, max(float(amount or 0), 0.0), timestamp))
+            if len(self._pending) > MAX_PENDING:
+                dropped = len(self._pending) - MAX_PENDING
+                del self._pending[:dropped]
+                TRENDS_DROPPED.inc(dropped)
+        if self._flusher is None and self.database is not None and self.flush_interval:
+            with self._flush_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name='trends-flush', daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _statuses(self, user_ids):
+        """Immigration status of each user with a compliance profile"""
+        profiles = self.database['compliance_profiles'].find({'_id': {'$in': list(user_ids)}}, {'status': 1})
+        return {profile['_id']: profile['status'] for profile in profiles if profile.get('status')}
+
+    def deltas(self, events, statuses):
+        """Per-cohort CohortTrends for a batch of (user_id, name, ticker, amount, timestamp) events"""
+        deltas = {}
+        for user_id, name, ticker, amount, timestamp in events:
+            cohorts = [GLOBAL]
+            if user_id in statuses:
+                cohorts.append(cohort_id(statuses[user_id]))
+            for cohort in cohorts:
+                if cohort not in deltas:
+                    deltas[cohort] = CohortTrends()
+                deltas[cohort].add(user_id, name, ticker, amount, timestamp)
+        return deltas
+
+    def _merge_into(self, cohort, delta):
+        for _ in range(CAS_RETRIES):
+            doc = self.collection.find_one({'_id': cohort})
+            stored = CohortTrends.from_doc(doc) if doc else CohortTrends(delta.landmark)
+            update = stored.merge(delta).to_doc()
+            if doc is None:
+                try:
+                    self.collection.insert_one({'_id': cohort, 'version': 1, **update})
+                    return
+                except DuplicateKeyError:
+                    continue
+            result = self.collection.replace_one(
+                {'_id': cohort, 'version': doc['version']}, {'version': doc['version'] + 1, **update}
+            )
+            if result.matched_count:
+                return
+        raise RuntimeError(f'{cohort} kept changing during {CAS_RETRIES} merge attempts')
+
+    @DB_OPERATION_SECONDS.time(method='trends_flush')
+    def flush(self):
+        """Merge buffered scans into the stored trends; returns the number of scans written"""
+        if self.database is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+            if not events and not self._unmerged:
+                return 0
+            try:
+                statuses = self._statuses({event[0] for event in events}) if events else {}
+            except Exception as e:
+                DB_ERRORS_TOTAL.inc(method='trends_flush')
+                log.error("Trend flush failed, will retry: %s", e)
+                with self._lock:
+                    self._pending[:0] = events
+                return 0
+
+            deltas = self.deltas(events, statuses)
+            for cohort, leftover in self._unmerged.items():
+                deltas[cohort] = leftover.merge(deltas[cohort]) if cohort in deltas else leftover
+            # Deltas are kept per cohort, so a cohort that fails is retried without re-counting the others
+            self._unmerged = {}
+            for cohort, delta in deltas.items():
+                try:
+                    self._merge_into(cohort, delta)
+                except Exception as e:
+                    DB_ERRORS_TOTAL.inc(method='trends_flush')
+                    log.error("Trend flush for %s failed, will retry: %s", cohort, e)
+                    self._unmerged[cohort] = delta
+            return len(events)
+
+    def load(self, cohort):
+        """The stored CohortTrends for a cohort, cached for TRENDS_CACHE_SECONDS"""
+        cached = self._cache.get(cohort)
+        if cached and time.monotonic() - cached[0] < CACHE_SECONDS:
+            return cached[1]
+        doc = self.collection.find_one({'_id': cohort}) if self.database is not None else None
+        trends = CohortTrends.from_doc(doc) if doc else None
+        if len(self._cache) > 64:
+            self._cache.clear()
+        self._cache[cohort] = (time.monotonic(), trends)
+        return trends
+
+    def top_merchants(self, cohort=GLOBAL, window='all', limit=20):
+        trends = self.load(cohort)
+        if trends is None:
+            return []
+        results = []
+        if window == 'week':
+            scale = trends.decay_now()
+            for key, entry in trends.recent.top(len(trends.recent.entries)):
+                users = trends.merchants.entries.get(key, {}).get('users')
+                results.append((key, entry, entry['count'] * scale, entry['error'] * scale, users))
+        else:
+            for key, entry in trends.merchants.top(len(trends.merchants.entries)):
+                results.append((key, entry, entry['count'], entry['error'], entry['users']))
+
+        merchants = []
+        for key, entry, spend, error, users in results:
+            unique_users = users.count() if users is not None else None
+            # Small cohorts could expose one person's spending
+            if cohort != GLOBAL and (unique_users or 0) < MIN_COHORT_USERS:
+                continue
+            merchants.append({
+                'merchant': entry['name'] or key,
+                'ticker': entry['ticker'],
+                'spend': round(spend, 2),
+                'spend_error': round(error, 2),
+                'receipts': entry['receipts'],
+                'unique_users': unique_users
+            })
+            if len(merchants) >= limit:
+                break
+        return merchants
+
+    def top_tickers(self, cohort=GLOBAL, window='all', limit=20):
+        trends = self.load(cohort)
+        if trends is None:
+            return []
+        scale = trends.decay_now()
+        field = 'decayed' if window == 'week' else 'spend'
+        ranked = sorted(trends.tickers.items(), key=lambda item: item[1][field], reverse=True)[:limit]
+        return [{
+            'ticker': ticker,
+            'spend': round(totals[field] * (scale if window == 'week' else 1), 2),
+            'receipts': totals['receipts']
+        } for ticker, totals in ranked]
+
+    def summary(self, cohort=GLOBAL):
+        trends = self.load(cohort)
+        if trends is None:
+            return {'receipts': 0, 'spend': 0.0, 'week_spend': 0.0}
+        return {
+            'receipts': trends.receipts,
+            'spend': round(trends.spend, 2),
+            'week_spend': round(trends.decayed_spend * trends.decay_now(), 2)
+        }
+
+
+trends_bp = Blueprint('trends', __name__)
+
+
+def _trend_params():
+    """(cohort id, window, limit) from the query string; raises ValueError"""
+    window = request.args.get('window', 'all')
+    if window not in WINDOWS:
+        raise ValueError(f"window must be one of {', '.join(WINDOWS)}")
+    limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    status = request.args.get('cohort')
+    if status and len(status) > 20:
+        raise ValueError('Unknown cohort')
+    return (cohort_id(status) if status else GLOBAL), window, limit
+
+
+@trends_bp.route('/merchants', methods=['GET'])
+def get_trending_merchants():
+    """Merchants with the most spend across all users, or one immigration-status cohort (?cohort=F-1)"""
+    from database import get_database
+
+    try:
+        cohort, window, limit = _trend_params()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        trends = get_database().trends
+        return jsonify({
+            'success': True,
+            'cohort': cohort,
+            'window': window,
+            'totals': trends.summary(cohort),
+            'merchants': trends.top_merchants(cohort, window, limit)
+        })
+    except Exception as e:
+        log.error("Failed to read merchant trends: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@trends_bp.route('/tickers', methods=['GET'])
+def get_trending_tickers():
+    """Listed companies (catalogue and parent brands) ranked by receipt spend"""
+    from database import get_database
+
+    try:
+        cohort, window, limit = _trend_params()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        trends = get_database().trends
+        return jsonify({
+            'success': True,
+            'cohort': cohort,
+            'window': window,
+            'totals': trends.summary(cohort),
+            'tickers': trends.top_tickers(cohort, window, limit)
+        })
+    except Exception as e:
+        log.error("Failed to read ticker trends: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
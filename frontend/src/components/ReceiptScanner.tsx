@@ -1,6 +1,7 @@
 import { useState } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { Camera, Upload, X, Check, TrendingUp, DollarSign, AlertCircle, Loader2, ShoppingCart, Star, Zap } from 'lucide-react'
+import authService from '../services/authService'
 
 // Types for backend response
 interface ReceiptScanResponse {
@@ -16,6 +17,20 @@ interface ReceiptScanResponse {
   is_popular_company?: boolean
 }
 
+// Returned with 202 by /api/scan-receipt?async=1
+interface ScanJobAccepted {
+  success: boolean
+  job_id: string
+  status_url: string
+  stream_url: string
+}
+
+interface ScanProgress {
+  stage: string
+  current?: number
+  total?: number
+}
+
 interface ScannedReceipt {
   company_name: string
   total_amount: number
@@ -74,11 +89,29 @@ const COMPANY_TICKER_MAP: Record<string, { ticker: string; logo: string; isPremi
 
 const API_BASE_URL = 'http://localhost:5000' // Change this to your backend URL
 
+const STAGE_LABELS: Record<string, string> = {
+  queued: 'Waiting for a scanner...',
+  preprocessed: 'Enhancing image...',
+  ocr_pass: 'Reading text...',
+  text_layer: 'Reading document...',
+  parsed: 'Detecting company...',
+  saved: 'Saving receipt...'
+}
+
+const describeProgress = (progress: ScanProgress | null): string => {
+  if (!progress) return 'Uploading...'
+  const label = STAGE_LABELS[progress.stage] || 'Scanning...'
+  return progress.stage === 'ocr_pass' && progress.total
+    ? `${label} (pass ${progress.current} of ${progress.total})`
+    : label
+}
+
 const ReceiptScanner = () => {
   const [isOpen, setIsOpen] = useState(false)
   const [isScanning, setIsScanning] = useState(false)
   const [scannedReceipt, setScannedReceipt] = useState<ScannedReceipt | null>(null)
   const [error, setError] = useState<string | null>(null)
+  const [progress, setProgress] = useState<ScanProgress | null>(null)
   
   // Investment flow states
   const [showInvestmentModal, setShowInvestmentModal] = useState(false)
@@ -86,10 +119,9 @@ const ReceiptScanner = () => {
   const [isInvesting, setIsInvesting] = useState(false)
   const [investmentSuccess, setInvestmentSuccess] = useState(false)
 
-  // Get user ID - modify this based on your user context
+  // The signed-in user; the backend rejects a user_id that differs from the bearer token's
   const getUserId = () => {
-    // Replace this with your actual user context/auth system
-    return 'demo_user_123' // or get from useUser() hook
+    return authService.getCurrentUser()?.id ?? 'demo_user_123'
   }
 
   const mapCompanyToTicker = (companyName: string, backendTicker?: string, backendLogo?: string): { ticker?: string; logo?: string; isPremium?: boolean } => {
@@ -126,22 +158,71 @@ const ReceiptScanner = () => {
     }
   }
 
+  // Read the job's SSE stream through authFetch (EventSource cannot send the bearer token)
+  const streamScanJob = async (job: ScanJobAccepted): Promise<ReceiptScanResponse | null> => {
+    const response = await authService.authFetch(`${API_BASE_URL}${job.stream_url}`)
+    if (!response.ok || !response.body) return null
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) return null
+      buffer += decoder.decode(value, { stream: true })
+      let boundary: number
+      while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+        const message = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        const event = message.match(/^event: (.*)$/m)?.[1]
+        const data = message.match(/^data: (.*)$/m)?.[1]
+        if (!event || !data) continue
+        const payload = JSON.parse(data)
+        if (event === 'progress') {
+          setProgress(payload)
+        } else if (event === 'done') {
+          reader.cancel()
+          return payload.result
+        }
+      }
+    }
+  }
+
+  // Polling fallback when the stream is unavailable or drops before the job finishes
+  const pollScanJob = async (job: ScanJobAccepted): Promise<ReceiptScanResponse> => {
+    for (;;) {
+      const response = await authService.authFetch(`${API_BASE_URL}${job.status_url}`)
+      const data = await response.json()
+      if (!response.ok) return data
+      if (data.job.result) return data.job.result
+      setProgress({ stage: data.job.status })
+      await new Promise(resolve => setTimeout(resolve, 1000))
+    }
+  }
+
   const scanReceipt = async (file: File) => {
     setIsScanning(true)
     setError(null)
     setScannedReceipt(null)
+    setProgress(null)
 
     try {
       const formData = new FormData()
       formData.append('receipt', file)
       formData.append('user_id', getUserId())
 
-      const response = await fetch(`${API_BASE_URL}/api/scan-receipt`, {
+      const response = await authService.authFetch(`${API_BASE_URL}/api/scan-receipt?async=1`, {
         method: 'POST',
         body: formData,
       })
 
-      const data: ReceiptScanResponse = await response.json()
+      let data: ReceiptScanResponse
+      if (response.status === 202) {
+        const job: ScanJobAccepted = await response.json()
+        data = await streamScanJob(job).catch(() => null) ?? await pollScanJob(job)
+      } else {
+        data = await response.json()
+      }
 
       if (data.success) {
         const { ticker, logo, isPremium } = mapCompanyToTicker(
@@ -173,6 +254,7 @@ const ReceiptScanner = () => {
       setError('Network error. Please check if the backend is running.')
     } finally {
       setIsScanning(false)
+      setProgress(null)
     }
   }
 
@@ -306,14 +388,14 @@ const ReceiptScanner = () => {
                       Scan Your Receipt
                     </h3>
                     <p className="text-gray-600 mb-6">
-                      Upload a photo of your receipt and we'll extract the details automatically
+                      Upload a photo of your receipt, or a PDF or e-mail e-receipt, and we'll extract the details automatically
                     </p>
                     
                     <div className="space-y-3">
                       <label className="block">
                         <input
                           type="file"
-                          accept="image/*"
+                          accept="image/*,application/pdf,.pdf,message/rfc822,.eml,text/html,.html,.htm"
                           onChange={handleFileUpload}
                           className="hidden"
                         />
@@ -347,7 +429,7 @@ const ReceiptScanner = () => {
                       Scanning Receipt...
                     </h3>
                     <p className="text-gray-600">
-                      Using advanced OCR and company detection
+                      {describeProgress(progress)}
                     </p>
                     <div className="mt-4 flex items-center justify-center gap-2">
                       <div className="w-2 h-2 bg-green-500 rounded-full animate-pulse"></div>
@@ -1,6 +1,8 @@
 import { useState, useEffect, useRef } from 'react';
 import { alphaVantageAPI, StockQuote } from '../services/alphaVantageApi';
 
+const BACKEND_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:5000'
+
 export interface UseRealTimeQuotesOptions {
   symbols: string[];
   refreshInterval?: number; // in milliseconds
@@ -17,6 +19,7 @@ export const useRealTimeQuotes = ({
   const [error, setError] = useState<string | null>(null);
   const [lastUpdated, setLastUpdated] = useState<Date | null>(null);
   const intervalRef = useRef<number>();
+  const streamRef = useRef<EventSource | null>(null);
 
   const fetchQuotes = async () => {
     if (!enabled || symbols.length === 0) return;
@@ -40,20 +43,54 @@ export const useRealTimeQuotes = ({
     }
   };
 
+  const startPolling = () => {
+    fetchQuotes();
+    if (refreshInterval > 0 && !intervalRef.current) {
+      intervalRef.current = window.setInterval(fetchQuotes, refreshInterval);
+    }
+  };
+
   useEffect(() => {
-    if (!enabled) return;
+    if (!enabled || symbols.length === 0) return;
 
-    // Initial fetch
-    fetchQuotes();
+    // Prefer server push: one shared upstream refresh on the backend for all clients
+    if (typeof EventSource !== 'undefined') {
+      setIsLoading(true);
+      const stream = new EventSource(
+        `${BACKEND_URL}/api/stream/quotes?symbols=${encodeURIComponent(symbols.join(','))}`
+      );
+      streamRef.current = stream;
 
-    // Set up interval for periodic updates
-    if (refreshInterval > 0) {
-      intervalRef.current = window.setInterval(fetchQuotes, refreshInterval);
+      stream.addEventListener('quote', (event) => {
+        const quote: StockQuote = JSON.parse((event as MessageEvent).data);
+        setQuotes(prev => {
+          const others = prev.filter(q => q.symbol !== quote.symbol);
+          return [...others, quote].sort(
+            (a, b) => symbols.indexOf(a.symbol) - symbols.indexOf(b.symbol)
+          );
+        });
+        setLastUpdated(new Date());
+        setIsLoading(false);
+        setError(null);
+      });
+
+      stream.onerror = () => {
+        // Fall back to polling if the stream cannot be (re)established
+        if (stream.readyState === EventSource.CLOSED) {
+          streamRef.current = null;
+          startPolling();
+        }
+      };
+    } else {
+      startPolling();
     }
 
     return () => {
+      streamRef.current?.close();
+      streamRef.current = null;
       if (intervalRef.current) {
         clearInterval(intervalRef.current);
+        intervalRef.current = undefined;
       }
     };
   }, [symbols.join(','), refreshInterval, enabled]);
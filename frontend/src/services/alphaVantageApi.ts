@@ -1,5 +1,6 @@
 const API_KEY = import.meta.env.VITE_ALPHA_VANTAGE_API_KEY || 'demo'
 const BASE_URL = 'https://www.alphavantage.co/query'
+const BACKEND_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:5000'
 
 // Rate limiting for production use
 class RateLimiter {
@@ -231,6 +232,18 @@ class AlphaVantageAPI {
   }
 
   async getDailyData(symbol: string): Promise<TimeSeriesData[]> {
+    // Prefer the backend's local price store (no Alpha Vantage call per chart)
+    try {
+      const response = await fetch(`${BACKEND_URL}/api/prices/${encodeURIComponent(symbol)}`);
+      const data = await response.json();
+      if (response.ok && data.success) {
+        return data.bars as TimeSeriesData[];
+      }
+      console.warn('Backend price history unavailable, falling back to Alpha Vantage:', data.error);
+    } catch (error) {
+      console.warn('Backend price history unavailable, falling back to Alpha Vantage:', error);
+    }
+
     const params = {
       function: 'TIME_SERIES_DAILY',
       symbol: symbol,
@@ -256,6 +269,18 @@ class AlphaVantageAPI {
   }
 
   async getMultipleQuotes(symbols: string[]): Promise<StockQuote[]> {
+    // Prefer the backend quote service: one request, shared cache and rate limit
+    try {
+      const response = await fetch(`${BACKEND_URL}/api/quotes?symbols=${encodeURIComponent(symbols.join(','))}`);
+      const data = await response.json();
+      if (response.ok && data.success) {
+        return data.quotes as StockQuote[];
+      }
+      console.warn('Backend quote service error, falling back to Alpha Vantage:', data.error);
+    } catch (error) {
+      console.warn('Backend quote service unavailable, falling back to Alpha Vantage:', error);
+    }
+
     const quotes: StockQuote[] = [];
     for (const symbol of symbols) {
       try {
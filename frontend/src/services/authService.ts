@@ -12,6 +12,8 @@ interface GoogleUser {
 interface AuthResponse {
   success: boolean
   user?: GoogleUser
+  access_token?: string
+  refresh_token?: string
   error?: string
 }
 
@@ -72,8 +74,9 @@ class AuthService {
       if (result.success && result.user) {
         console.log('Authentication successful! User:', result.user)
         
-        // Store user data in localStorage
+        // Store user data and API tokens in localStorage
         localStorage.setItem('user', JSON.stringify(result.user))
+        this.storeTokens(result.access_token, result.refresh_token)
         console.log('User data stored in localStorage')
         
         // Redirect to onboarding
@@ -160,7 +163,9 @@ class AuthService {
       if (response.ok && data.success) {
         return {
           success: true,
-          user: data.user
+          user: data.user,
+          access_token: data.access_token,
+          refresh_token: data.refresh_token
         }
       } else {
         return {
@@ -177,6 +182,55 @@ class AuthService {
     }
   }
 
+  private storeTokens(accessToken?: string, refreshToken?: string) {
+    if (accessToken) localStorage.setItem('access_token', accessToken)
+    if (refreshToken) localStorage.setItem('refresh_token', refreshToken)
+  }
+
+  private clearTokens() {
+    localStorage.removeItem('access_token')
+    localStorage.removeItem('refresh_token')
+  }
+
+  // Exchange the refresh token for a new access token
+  private async refreshAccessToken(): Promise<boolean> {
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (!refreshToken) return false
+
+    try {
+      const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: refreshToken })
+      })
+      const data = await response.json()
+      if (response.ok && data.success) {
+        this.storeTokens(data.access_token, data.refresh_token)
+        return true
+      }
+    } catch (error) {
+      console.error('Token refresh failed:', error)
+    }
+    this.clearTokens()
+    return false
+  }
+
+  // fetch() with the bearer token attached, refreshing it once on a 401
+  async authFetch(url: string, init: RequestInit = {}): Promise<Response> {
+    const withToken = (): RequestInit => {
+      const headers = new Headers(init.headers)
+      const accessToken = localStorage.getItem('access_token')
+      if (accessToken) headers.set('Authorization', `Bearer ${accessToken}`)
+      return { ...init, headers }
+    }
+
+    const response = await fetch(url, withToken())
+    if (response.status === 401 && await this.refreshAccessToken()) {
+      return fetch(url, withToken())
+    }
+    return response
+  }
+
   // Get current user from localStorage
   getCurrentUser(): GoogleUser | null {
     try {
@@ -190,14 +244,17 @@ class AuthService {
   // Sign out
   async signOut(): Promise<void> {
     try {
-      // Call backend logout endpoint
+      // Call backend logout endpoint, which revokes the refresh token
       await fetch(`${API_BASE_URL}/auth/logout`, {
         method: 'POST',
-        credentials: 'include'
+        credentials: 'include',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refresh_token: localStorage.getItem('refresh_token') })
       })
       
       // Clear localStorage
       localStorage.removeItem('user')
+      this.clearTokens()
       
       // Sign out from Google
       if (window.google?.accounts.id) {
@@ -210,6 +267,7 @@ class AuthService {
       console.error('Sign out error:', error)
       // Still clear local data even if backend call fails
       localStorage.removeItem('user')
+      this.clearTokens()
       window.location.href = '/'
     }
   }